@@ -4,104 +4,161 @@ iLearnHow Flask Backend
 Universal Lesson Player with User Authentication and Progress Tracking
 """
 
-from flask import Flask, request, jsonify, session, render_template
+from flask import Flask, request, jsonify, session, render_template, g
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
+import time
+import atexit
+import threading
+
+import db_pool
+import sharding
+from ttl_cache import TTLCache
+from metrics import LatencyHistogram, metric_family, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from migrations import migrate
+from session_sweeper import SESSION_LIFETIME
+from write_queue import WriteTimeout
+from lesson_index import (
+    LessonIndex, AGE_GROUPS, TONES, LANGUAGES,
+    DEFAULT_AGE_GROUP, DEFAULT_TONE, DEFAULT_LANGUAGE
+)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production
 app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
+app.config['PERMANENT_SESSION_LIFETIME'] = SESSION_LIFETIME  # session_sweeper.py deletes older rows
+app.config['DATABASE'] = os.environ.get('ILEARNHOW_DB', 'ilearnhow.db')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', db_pool.DEFAULT_POOL_SIZE))
+app.config['DB_SHARDS'] = 1  # read from the database's storage_layout by init_db()
+# Lesson payloads only change with a content deploy, so browsers and the edge may keep them
+app.config['LESSON_BROWSER_MAX_AGE'] = int(os.environ.get('LESSON_BROWSER_MAX_AGE', 3600))
+app.config['LESSON_EDGE_MAX_AGE'] = int(os.environ.get('LESSON_EDGE_MAX_AGE', 86400))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 50000))
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 30))
+# time_spent heartbeats are merged in memory and written at most this often (seconds)
+app.config['HEARTBEAT_FLUSH_INTERVAL'] = float(os.environ.get('HEARTBEAT_FLUSH_INTERVAL', 10))
+app.config['HEARTBEAT_MAX_PENDING'] = int(os.environ.get('HEARTBEAT_MAX_PENDING', 10000))
 
 CORS(app, supports_credentials=True)
 
 # Database setup
 def init_db():
     """Initialize SQLite database with tables"""
-    conn = sqlite3.connect('ilearnhow.db')
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP,
-            preferences TEXT DEFAULT '{}'
-        )
-    ''')
-    
-    # Lesson progress table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS lesson_progress (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            lesson_day INTEGER NOT NULL,
-            phase INTEGER NOT NULL,
-            completed BOOLEAN DEFAULT FALSE,
-            answers TEXT DEFAULT '[]',
-            time_spent INTEGER DEFAULT 0,
-            completed_at TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            UNIQUE(user_id, lesson_day, phase)
-        )
-    ''')
-    
-    # User sessions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_id TEXT UNIQUE NOT NULL,
-            streak_days INTEGER DEFAULT 0,
-            last_lesson_day INTEGER,
-            total_lessons_completed INTEGER DEFAULT 0,
-            total_time_spent INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Habit formation table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS habit_formation (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            streak_days INTEGER DEFAULT 0,
-            longest_streak INTEGER DEFAULT 0,
-            current_streak_start DATE,
-            last_activity_date DATE,
-            daily_goal_met BOOLEAN DEFAULT FALSE,
-            weekly_goal_met BOOLEAN DEFAULT FALSE,
-            monthly_goal_met BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    conn = db_pool.connect(app.config['DATABASE'])
+    try:
+        migrate(conn)
+        # The layout is recorded by sharding.py; the app only follows it
+        app.config['DB_SHARDS'] = sharding.read_shard_count(conn)
+    finally:
+        conn.close()
+    if app.config['DB_SHARDS'] > 1:
+        sharding.migrate_files(sharding.user_data_paths(app.config['DATABASE'], app.config['DB_SHARDS']))
 
 # Initialize database on startup
 init_db()
 
+# Lesson content is parsed once per worker, not per request
+lesson_index = LessonIndex.from_directory(os.path.dirname(os.path.abspath(__file__)))
+
+# Per-user read cache for the endpoints the player polls, keyed (user_id, section).
+# Only that user's own writes change these rows; they invalidate after commit.
+user_cache = TTLCache(
+    max_entries=app.config['USER_CACHE_MAX_ENTRIES'],
+    ttl=app.config['USER_CACHE_TTL']
+)
+
+_shard_router = None
+_shard_router_lock = threading.Lock()
+
+def get_shard_router():
+    """Get the main-database and shard pools for this worker process"""
+    global _shard_router
+    # Concurrent first requests must not each start a writer thread for the same file
+    with _shard_router_lock:
+        if (_shard_router is None
+                or _shard_router.db_path != app.config['DATABASE']
+                or _shard_router.shard_count != app.config['DB_SHARDS']
+                or _shard_router.pid != os.getpid()):
+            if _shard_router is not None and _shard_router.pid == os.getpid():
+                _shard_router.close_writers()
+            # Forked workers must never share the parent's connections
+            _shard_router = sharding.ShardRouter(
+                app.config['DATABASE'],
+                shard_count=app.config['DB_SHARDS'],
+                max_size=app.config['DB_POOL_SIZE']
+            )
+        return _shard_router
+
+def get_db_pool():
+    """Get the main database's connection pool for this worker process"""
+    return get_shard_router().main
+
 def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect('ilearnhow.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get the request-scoped connection to the main database"""
+    if 'db' not in g:
+        g.db = get_db_pool().acquire()
+    return g.db
+
+def get_user_db(user_id):
+    """Get the request-scoped connection holding user_id's progress, habits and sessions"""
+    router = get_shard_router()
+    if router.shard_count == 1:
+        return get_db()
+    index = router.index_for(user_id)
+    shard_dbs = g.setdefault('shard_dbs', {})
+    if index not in shard_dbs:
+        shard_dbs[index] = router.shards[index].acquire()
+    return shard_dbs[index]
+
+def get_writer(user_id=None):
+    """Get the write queue for the main database, or for the file holding user_id's rows"""
+    router = get_shard_router()
+    return router.writer(router.main if user_id is None else router.pool_for(user_id))
+
+@app.errorhandler(WriteTimeout)
+def write_timeout(error):
+    """The writer is saturated; ask the client to retry rather than hang"""
+    response = jsonify({'error': 'Server busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the request's connections to their pools"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_db_pool().release(conn)
+    shard_dbs = g.pop('shard_dbs', None)
+    if shard_dbs:
+        router = get_shard_router()
+        for index, conn in shard_dbs.items():
+            router.shards[index].release(conn)
+
+# Request timing, exported by /metrics
+request_latency = LatencyHistogram(
+    'ilearnhow_request_duration_seconds', 'Request latency by endpoint',
+    ('endpoint', 'method', 'status')
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_latency.observe(
+            (request.endpoint or 'unmatched', request.method, str(response.status_code)),
+            time.perf_counter() - started
+        )
+    return response
 
 @app.route('/')
 def index():
@@ -137,33 +194,36 @@ def register():
     # Check if user already exists
     cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
     if cursor.fetchone():
-        conn.close()
         return jsonify({'error': 'Username already exists'}), 409
     
-    # Create new user
+    # Create new user with its first session and habit formation row
     import hashlib
     password_hash = hashlib.sha256(password.encode()).hexdigest()
-    cursor.execute(
-        'INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
-        (username, email, password_hash)
-    )
-    user_id = cursor.lastrowid
-    
-    # Initialize user session
     session_id = str(uuid.uuid4())
-    cursor.execute(
-        'INSERT INTO user_sessions (user_id, session_id) VALUES (?, ?)',
-        (user_id, session_id)
-    )
-    
-    # Initialize habit formation
-    cursor.execute(
-        'INSERT INTO habit_formation (user_id) VALUES (?)',
-        (user_id,)
-    )
+    sharded = get_shard_router().shard_count > 1
+    try:
+        if sharded:
+            user_id = get_writer().execute(insert_user, username, email, password_hash)
+        else:
+            # One operation: the account exists with its state, or not at all
+            user_id = get_writer().execute(insert_user_with_state, username, email,
+                                           password_hash, session_id)
+    except sqlite3.IntegrityError as e:
+        # Lost a race with a concurrent registration of the same name
+        if 'users.username' not in str(e):
+            raise
+        return jsonify({'error': 'Username already exists'}), 409
     
-    conn.commit()
-    conn.close()
+    if sharded:
+        # The state rows live in another file, so they cannot share the account's transaction
+        try:
+            get_writer(user_id).execute(insert_user_state, user_id, session_id)
+        except Exception:
+            # A timed-out write was cancelled, so only the account row needs taking back
+            # out; an account without its habit row is unusable, so wait for the undo
+            writer = get_writer()
+            writer.wait(writer.submit(delete_user, user_id), timeout=REGISTER_UNDO_TIMEOUT)
+            raise
     
     # Set session
     session['user_id'] = user_id
@@ -176,6 +236,37 @@ def register():
         'username': username
     }), 201
 
+# Seconds register waits for the undo of a half-created sharded account
+REGISTER_UNDO_TIMEOUT = 60.0
+
+def insert_user(conn, username, email, password_hash):
+    """Writer operation: create the account row and return its id"""
+    return conn.execute(
+        'INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+        (username, email, password_hash)
+    ).lastrowid
+
+def insert_user_state(conn, user_id, session_id):
+    """Writer operation: a new user's first session and empty habit row"""
+    conn.execute(
+        'INSERT INTO user_sessions (user_id, session_id) VALUES (?, ?)',
+        (user_id, session_id)
+    )
+    conn.execute(
+        'INSERT INTO habit_formation (user_id) VALUES (?)',
+        (user_id,)
+    )
+
+def insert_user_with_state(conn, username, email, password_hash, session_id):
+    """Writer operation: account, first session and habit row together (unsharded only)"""
+    user_id = insert_user(conn, username, email, password_hash)
+    insert_user_state(conn, user_id, session_id)
+    return user_id
+
+def delete_user(conn, user_id):
+    """Writer operation: remove an account row"""
+    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     """Login user"""
@@ -195,30 +286,19 @@ def login():
     user = cursor.fetchone()
     
     if not user:
-        conn.close()
         return jsonify({'error': 'Invalid credentials'}), 401
     
     # Check password hash
     import hashlib
     password_hash = hashlib.sha256(password.encode()).hexdigest()
     if password_hash != user['password_hash']:
-        conn.close()
         return jsonify({'error': 'Invalid credentials'}), 401
-        conn.close()
-        return jsonify({'error': 'Invalid credentials'}), 401
-    
-    # Update last login
-    cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user['id'],))
     
-    # Get or create session
+    # Update last login and create the session; both writers commit them in parallel
     session_id = str(uuid.uuid4())
-    cursor.execute(
-        'INSERT OR REPLACE INTO user_sessions (user_id, session_id) VALUES (?, ?)',
-        (user['id'], session_id)
-    )
-    
-    conn.commit()
-    conn.close()
+    last_login = get_writer().submit(touch_last_login, user['id'])
+    get_writer(user['id']).execute(replace_session, user['id'], session_id)
+    get_writer().wait(last_login)
     
     # Set session
     session['user_id'] = user['id']
@@ -231,6 +311,17 @@ def login():
         'username': user['username']
     })
 
+def touch_last_login(conn, user_id):
+    """Writer operation: stamp the account's last login"""
+    conn.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user_id,))
+
+def replace_session(conn, user_id, session_id):
+    """Writer operation: record a login session"""
+    conn.execute(
+        'INSERT OR REPLACE INTO user_sessions (user_id, session_id) VALUES (?, ?)',
+        (user_id, session_id)
+    )
+
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
     """Logout user"""
@@ -249,6 +340,38 @@ def auth_status():
     return jsonify({'authenticated': False}), 401
 
 # Lesson Progress Endpoints
+LESSON_PHASES = 5
+MAX_BATCH_UPDATES = 366 * LESSON_PHASES
+
+# Shared by single and batch writes; keeps the row id and created_at stable
+PROGRESS_UPSERT_SQL = '''
+    INSERT INTO lesson_progress
+    (user_id, lesson_day, phase, completed, answers, time_spent, completed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, lesson_day, phase) DO UPDATE SET
+        completed = excluded.completed,
+        answers = excluded.answers,
+        time_spent = excluded.time_spent,
+        completed_at = excluded.completed_at
+'''
+
+# Delta sync: first-time clients page from since=0 with the same query
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+PROGRESS_CHANGES_SQL = '''
+    SELECT lesson_day, phase, completed, answers, time_spent, completed_at,
+           updated_at, change_seq
+    FROM lesson_progress
+    WHERE user_id = ? AND change_seq > ?
+    ORDER BY change_seq
+    LIMIT ?
+'''
+
+PROGRESS_CURSOR_SQL = '''
+    SELECT COALESCE(MAX(change_seq), 0) FROM lesson_progress WHERE user_id = ?
+'''
+
 @app.route('/api/lessons/progress', methods=['GET'])
 def get_lesson_progress():
     """Get user's lesson progress"""
@@ -258,7 +381,10 @@ def get_lesson_progress():
     user_id = session['user_id']
     lesson_day = request.args.get('day', type=int)
     
-    conn = get_db()
+    if 'since' in request.args:
+        return get_lesson_progress_changes(user_id)
+    
+    conn = get_user_db(user_id)
     cursor = conn.cursor()
     
     if lesson_day:
@@ -279,10 +405,46 @@ def get_lesson_progress():
         ''', (user_id,))
     
     progress = cursor.fetchall()
-    conn.close()
+    
+    # Lets a client switch to ?since= after its first full download
+    cursor.execute(PROGRESS_CURSOR_SQL, (user_id,))
+    sync_cursor = cursor.fetchone()[0]
+    
+    return jsonify({
+        'progress': [dict(row) for row in progress],
+        'cursor': sync_cursor
+    })
+
+def get_lesson_progress_changes(user_id):
+    """Rows changed after the client's cursor, one keyset page at a time"""
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', SYNC_PAGE_SIZE, type=int)
+    
+    if since is None or since < 0:
+        return jsonify({'error': 'since must be a non-negative integer cursor'}), 400
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, MAX_SYNC_PAGE_SIZE)
+    
+    conn = get_user_db(user_id)
+    cursor = conn.cursor()
+    
+    # Fetch one extra row to learn whether another page follows
+    cursor.execute(PROGRESS_CHANGES_SQL, (user_id, since, limit + 1))
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    progress = []
+    for row in rows:
+        change = dict(row)
+        del change['change_seq']
+        progress.append(change)
     
     return jsonify({
-        'progress': [dict(row) for row in progress]
+        'progress': progress,
+        'cursor': rows[-1]['change_seq'] if rows else since,
+        'has_more': has_more
     })
 
 @app.route('/api/lessons/progress', methods=['POST'])
@@ -303,61 +465,280 @@ def update_lesson_progress():
     answers = json.dumps(data.get('answers', []))
     time_spent = data.get('time_spent', 0)
     
-    conn = get_db()
-    cursor = conn.cursor()
+    # The posted row carries the full time_spent; buffered increments are stale
+    heartbeats.discard(user_id, lesson_day, phase)
     
-    # Update or insert progress
-    cursor.execute('''
-        INSERT OR REPLACE INTO lesson_progress 
-        (user_id, lesson_day, phase, completed, answers, time_spent, completed_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (user_id, lesson_day, phase, completed, answers, time_spent, 
-          datetime.now().isoformat() if completed else None))
+    # Update or insert progress, and habit formation if lesson completed
+    get_writer(user_id).execute(write_progress, user_id, [(
+        user_id, lesson_day, phase, completed, answers, time_spent,
+        datetime.now().isoformat() if completed else None
+    )], completed)
     
-    # Update habit formation if lesson completed
     if completed:
-        update_habit_formation(user_id, lesson_day, cursor)
-    
-    conn.commit()
-    conn.close()
+        user_cache.invalidate((user_id, 'habit'))
     
     return jsonify({'message': 'Progress updated successfully'})
 
-def update_habit_formation(user_id, lesson_day, cursor):
-    """Update habit formation metrics"""
-    # Get current habit data
-    cursor.execute('SELECT * FROM habit_formation WHERE user_id = ?', (user_id,))
-    habit = cursor.fetchone()
+@app.route('/api/lessons/progress/batch', methods=['POST'])
+def sync_lesson_progress():
+    """Apply a batch of phase updates queued by an offline client"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
     
-    if not habit:
-        return
-    
-    today = datetime.now().date()
-    last_activity = datetime.strptime(habit['last_activity_date'], '%Y-%m-%d').date() if habit['last_activity_date'] else None
-    
-    # Update streak
-    if last_activity is None or (today - last_activity).days == 1:
-        # Continue streak
-        new_streak = habit['streak_days'] + 1
-        streak_start = habit['current_streak_start'] or today.isoformat()
-    elif (today - last_activity).days == 0:
-        # Same day, no change
-        new_streak = habit['streak_days']
-        streak_start = habit['current_streak_start']
-    else:
-        # Break in streak
-        new_streak = 1
-        streak_start = today.isoformat()
+    data = request.get_json()
+    user_id = session['user_id']
+    
+    updates = data.get('updates') if isinstance(data, dict) else None
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'Non-empty updates list required'}), 400
+    if len(updates) > MAX_BATCH_UPDATES:
+        return jsonify({
+            'error': f'At most {MAX_BATCH_UPDATES} updates per batch'
+        }), 413
+    
+    now = datetime.now().isoformat()
+    rows = []
+    any_completed = False
+    for index, update in enumerate(updates):
+        try:
+            lesson_day, phase, completed, answers, time_spent = parse_progress_update(update)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid update at index {index}: {e}'}), 400
+        any_completed = any_completed or completed
+        heartbeats.discard(user_id, lesson_day, phase)
+        rows.append((user_id, lesson_day, phase, completed, answers, time_spent,
+                     now if completed else None))
+    
+    # One transaction and one streak update for the whole batch
+    get_writer(user_id).execute(write_progress, user_id, rows, any_completed)
+    
+    if any_completed:
+        user_cache.invalidate((user_id, 'habit'))
+    
+    return jsonify({
+        'message': 'Progress synced successfully',
+        'updated': len(rows)
+    })
+
+def write_progress(conn, user_id, rows, completed):
+    """Writer operation: upsert progress rows, extending the streak if any completed"""
+    conn.executemany(PROGRESS_UPSERT_SQL, rows)
+    if completed:
+        update_habit_formation(user_id, rows[-1][1], conn)
+
+def parse_progress_update(update):
+    """Validate one batch entry and return its column values"""
+    if not isinstance(update, dict):
+        raise ValueError('update must be an object')
+    
+    lesson_day = update.get('lesson_day')
+    phase = update.get('phase')
+    completed = update.get('completed', False)
+    answers = update.get('answers', [])
+    time_spent = update.get('time_spent', 0)
+    
+    if not isinstance(lesson_day, int) or isinstance(lesson_day, bool) or not 1 <= lesson_day <= 366:
+        raise ValueError('lesson_day must be an integer between 1 and 366')
+    if not isinstance(phase, int) or isinstance(phase, bool) or not 1 <= phase <= LESSON_PHASES:
+        raise ValueError(f'phase must be an integer between 1 and {LESSON_PHASES}')
+    if not isinstance(completed, bool):
+        raise ValueError('completed must be a boolean')
+    if not isinstance(answers, list):
+        raise ValueError('answers must be a list')
+    if not isinstance(time_spent, int) or isinstance(time_spent, bool) or time_spent < 0:
+        raise ValueError('time_spent must be a non-negative integer')
+    
+    return lesson_day, phase, completed, json.dumps(answers), time_spent
+
+# Write-behind time_spent heartbeats
+MAX_HEARTBEAT_SECONDS = 3600
+
+# Adds to the stored total, creating the row on a phase's first heartbeat
+HEARTBEAT_UPSERT_SQL = '''
+    INSERT INTO lesson_progress (user_id, lesson_day, phase, time_spent)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, lesson_day, phase) DO UPDATE SET
+        time_spent = time_spent + excluded.time_spent
+'''
+
+def write_heartbeats(conn, rows):
+    """Writer operation: add merged time_spent increments"""
+    conn.executemany(HEARTBEAT_UPSERT_SQL, rows)
+
+class HeartbeatBuffer:
+    """Per-worker time_spent increments merged by (user_id, lesson_day, phase) until flushed"""
+    
+    def __init__(self, flush_interval, max_pending):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        # Keys discarded while each in-flight flush runs; never merged back by it
+        self._flush_discards = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher_pid = None
+        self.flushes = 0
+        self.flushed_rows = 0
+    
+    def add(self, user_id, lesson_day, phase, seconds):
+        """Merge one increment, waking the flusher once max_pending rows are waiting"""
+        key = (user_id, lesson_day, phase)
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + seconds
+            full = len(self._pending) >= self.max_pending
+            if self._flusher_pid != os.getpid():
+                # Started on first use so forked workers each flush their own buffer
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._run, name='heartbeat-flusher', daemon=True).start()
+        if full:
+            self._wake.set()
+    
+    def discard(self, user_id, lesson_day, phase):
+        """Drop increments superseded by a full progress write"""
+        key = (user_id, lesson_day, phase)
+        with self._lock:
+            self._pending.pop(key, None)
+            for discarded in self._flush_discards:
+                discarded.add(key)
+    
+    def pending(self):
+        return len(self._pending)
+    
+    def flush(self, queued=True):
+        """Write every pending increment; failed groups are merged back for the next flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            discarded = set()
+            self._flush_discards.append(discarded)
+        
+        try:
+            return self._write(pending, discarded, queued)
+        finally:
+            with self._lock:
+                self._flush_discards.remove(discarded)
+    
+    def _write(self, pending, discarded, queued):
+        router = get_shard_router()
+        groups = {}
+        for (user_id, lesson_day, phase), seconds in pending.items():
+            groups.setdefault(router.pool_for(user_id), []).append((user_id, lesson_day, phase, seconds))
+        
+        written = 0
+        failure = None
+        for pool, rows in groups.items():
+            try:
+                if queued:
+                    router.writer(pool).execute(write_heartbeats, rows)
+                else:
+                    # Interpreter shutdown: writer threads may already be gone
+                    with pool.connection() as conn:
+                        write_heartbeats(conn, rows)
+                        conn.commit()
+                written += len(rows)
+            except Exception as e:
+                failure = e
+                self._merge_back(rows, discarded)
+        
+        self.flushes += 1
+        self.flushed_rows += written
+        if failure is not None:
+            raise failure
+        return written
+    
+    def _merge_back(self, rows, discarded):
+        """Return unwritten increments to the buffer without waking the flusher"""
+        with self._lock:
+            for user_id, lesson_day, phase, seconds in rows:
+                key = (user_id, lesson_day, phase)
+                # A full progress write since the flush began already counts this time
+                if key not in discarded:
+                    self._pending[key] = self._pending.get(key, 0) + seconds
+    
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception('Heartbeat flush failed; increments kept for the next flush')
+                # A full buffer keeps waking the flusher; wait out a full interval instead
+                time.sleep(self.flush_interval)
+
+heartbeats = HeartbeatBuffer(
+    flush_interval=app.config['HEARTBEAT_FLUSH_INTERVAL'],
+    max_pending=app.config['HEARTBEAT_MAX_PENDING']
+)
+
+@atexit.register
+def flush_heartbeats_at_exit():
+    """Persist buffered time_spent when a worker shuts down"""
+    try:
+        heartbeats.flush(queued=False)
+    except Exception:
+        app.logger.exception('Heartbeat flush at exit failed')
+
+@app.route('/api/lessons/progress/heartbeat', methods=['POST'])
+def record_heartbeat():
+    """Add seconds of time_spent to a phase; written behind, within HEARTBEAT_FLUSH_INTERVAL"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
     
-    # Update longest streak
-    longest_streak = max(habit['longest_streak'], new_streak)
+    data = request.get_json()
+    user_id = session['user_id']
     
-    cursor.execute('''
-        UPDATE habit_formation 
-        SET streak_days = ?, longest_streak = ?, current_streak_start = ?, 
-            last_activity_date = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE user_id = ?
-    ''', (new_streak, longest_streak, streak_start, today.isoformat(), user_id))
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Lesson day, phase and seconds required'}), 400
+    lesson_day = data.get('lesson_day')
+    phase = data.get('phase')
+    seconds = data.get('seconds')
+    for name, value, upper in (('lesson_day', lesson_day, 366), ('phase', phase, LESSON_PHASES),
+                               ('seconds', seconds, MAX_HEARTBEAT_SECONDS)):
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= upper:
+            return jsonify({'error': f'{name} must be an integer between 1 and {upper}'}), 400
+    
+    heartbeats.add(user_id, lesson_day, phase, seconds)
+    return jsonify({'message': 'Heartbeat recorded'}), 202
+
+# Streak rules in one statement: same day keeps the streak, the day after
+# the last activity (or a first activity) extends it, any gap restarts it
+HABIT_STREAK_SQL = '''
+    UPDATE habit_formation
+    SET streak_days = CASE
+            WHEN last_activity_date = :today THEN streak_days
+            WHEN last_activity_date IS NULL
+                OR last_activity_date = date(:today, '-1 day') THEN streak_days + 1
+            ELSE 1
+        END,
+        longest_streak = MAX(longest_streak, CASE
+            WHEN last_activity_date = :today THEN streak_days
+            WHEN last_activity_date IS NULL
+                OR last_activity_date = date(:today, '-1 day') THEN streak_days + 1
+            ELSE 1
+        END),
+        current_streak_start = CASE
+            WHEN last_activity_date = :today THEN current_streak_start
+            WHEN last_activity_date IS NULL
+                OR last_activity_date = date(:today, '-1 day')
+                THEN COALESCE(current_streak_start, :today)
+            ELSE :today
+        END,
+        last_activity_date = :today,
+        daily_goal_met = TRUE,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE user_id = :user_id
+'''
+
+def update_habit_formation(user_id, lesson_day, cursor):
+    """Update habit formation metrics"""
+    # Weekly/monthly goals are recomputed offline by streak_job.py.
+    # Callers invalidate (user_id, 'habit') in user_cache once they commit.
+    cursor.execute(HABIT_STREAK_SQL, {
+        'today': datetime.now().date().isoformat(),
+        'user_id': user_id
+    })
 
 # Habit Formation Endpoints
 @app.route('/api/habits/status')
@@ -368,27 +749,37 @@ def get_habit_status():
     
     user_id = session['user_id']
     
-    conn = get_db()
+    habit_data = user_cache.get((user_id, 'habit'))
+    if habit_data is not None:
+        return jsonify(habit_data)
+    generation = user_cache.generation()
+    
+    conn = get_user_db(user_id)
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM habit_formation WHERE user_id = ?', (user_id,))
     habit = cursor.fetchone()
     
     if not habit:
-        conn.close()
         return jsonify({'error': 'Habit data not found'}), 404
     
-    conn.close()
+    habit_data = habit_payload(habit)
+    user_cache.set((user_id, 'habit'), habit_data, generation)
     
-    return jsonify({
+    return jsonify(habit_data)
+
+def habit_payload(habit):
+    """Client-facing habit status from a habit_formation row"""
+    return {
         'streak_days': habit['streak_days'],
         'longest_streak': habit['longest_streak'],
         'current_streak_start': habit['current_streak_start'],
         'last_activity_date': habit['last_activity_date'],
-        'daily_goal_met': bool(habit['daily_goal_met']),
+        # The stored flag is only reset nightly; today's goal means activity today
+        'daily_goal_met': habit['last_activity_date'] == datetime.now().date().isoformat(),
         'weekly_goal_met': bool(habit['weekly_goal_met']),
         'monthly_goal_met': bool(habit['monthly_goal_met'])
-    })
+    }
 
 # User Preferences Endpoints
 @app.route('/api/user/preferences', methods=['GET'])
@@ -399,18 +790,22 @@ def get_user_preferences():
     
     user_id = session['user_id']
     
+    preferences = user_cache.get((user_id, 'preferences'))
+    if preferences is not None:
+        return jsonify(preferences)
+    generation = user_cache.generation()
+    
     conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT preferences FROM users WHERE id = ?', (user_id,))
     user = cursor.fetchone()
     
-    conn.close()
-    
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
     preferences = json.loads(user['preferences']) if user['preferences'] else {}
+    user_cache.set((user_id, 'preferences'), preferences, generation)
     
     return jsonify(preferences)
 
@@ -426,16 +821,191 @@ def update_user_preferences():
     if not data:
         return jsonify({'error': 'Preferences data required'}), 400
     
+    get_writer().execute(write_preferences, user_id, json.dumps(data))
+    user_cache.invalidate((user_id, 'preferences'))
+    
+    return jsonify({'message': 'Preferences updated successfully'})
+
+def write_preferences(conn, user_id, preferences):
+    """Writer operation: store a user's preferences JSON"""
+    conn.execute('UPDATE users SET preferences = ? WHERE id = ?', (preferences, user_id))
+
+# Player Startup Endpoint
+BOOTSTRAP_USER_SQL = '''
+    SELECT u.username, u.preferences,
+           h.user_id AS habit_user_id, h.streak_days, h.longest_streak,
+           h.current_streak_start, h.last_activity_date,
+           h.daily_goal_met, h.weekly_goal_met, h.monthly_goal_met,
+           (SELECT COALESCE(MAX(change_seq), 0)
+            FROM lesson_progress WHERE user_id = u.id) AS sync_cursor
+    FROM users u
+    LEFT JOIN habit_formation h ON h.user_id = u.id
+    WHERE u.id = ?
+    LIMIT 1
+'''
+
+# Sharded layout: the account comes from the main database, the rest from the user's shard
+BOOTSTRAP_ACCOUNT_SQL = 'SELECT username, preferences FROM users WHERE id = ?'
+
+BOOTSTRAP_HABIT_SQL = '''
+    SELECT h.user_id AS habit_user_id, h.streak_days, h.longest_streak,
+           h.current_streak_start, h.last_activity_date,
+           h.daily_goal_met, h.weekly_goal_met, h.monthly_goal_met,
+           (SELECT COALESCE(MAX(change_seq), 0)
+            FROM lesson_progress WHERE user_id = :user_id) AS sync_cursor
+    FROM (SELECT 1)
+    LEFT JOIN habit_formation h ON h.user_id = :user_id
+    LIMIT 1
+'''
+
+BOOTSTRAP_PROGRESS_SQL = '''
+    SELECT lesson_day, phase, completed, answers, time_spent, completed_at
+    FROM lesson_progress
+    WHERE user_id = ? AND lesson_day = ?
+    ORDER BY phase
+'''
+
+@app.route('/api/bootstrap')
+def bootstrap():
+    """Everything the player needs at launch in one round trip"""
+    if 'user_id' not in session:
+        return jsonify({'authenticated': False}), 401
+    
+    user_id = session['user_id']
+    lesson_day = request.args.get('day', datetime.now().timetuple().tm_yday, type=int)
+    if lesson_day < 1 or lesson_day > 366:
+        return jsonify({'error': 'Invalid lesson day'}), 400
+    include_lesson = request.args.get('include_lesson', '').lower() in ('1', 'true', 'yes')
+    
+    generation = user_cache.generation()
     conn = get_db()
-    cursor = conn.cursor()
+    user_conn = get_user_db(user_id)
     
-    cursor.execute('UPDATE users SET preferences = ? WHERE id = ?', 
-                  (json.dumps(data), user_id))
+    if user_conn is conn:
+        # User, preferences, habits and sync cursor in one statement
+        user = conn.execute(BOOTSTRAP_USER_SQL, (user_id,)).fetchone()
+    else:
+        user = conn.execute(BOOTSTRAP_ACCOUNT_SQL, (user_id,)).fetchone()
+        if user:
+            habit = user_conn.execute(BOOTSTRAP_HABIT_SQL, {'user_id': user_id}).fetchone()
+            user = dict(dict(user), **dict(habit))
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
     
-    conn.commit()
-    conn.close()
+    progress = [dict(row) for row in user_conn.execute(BOOTSTRAP_PROGRESS_SQL, (user_id, lesson_day))]
     
-    return jsonify({'message': 'Preferences updated successfully'})
+    preferences = json.loads(user['preferences']) if user['preferences'] else {}
+    habits = habit_payload(user) if user['habit_user_id'] is not None else None
+    
+    # Warm the caches the player polls next
+    user_cache.set((user_id, 'preferences'), preferences, generation)
+    if habits is not None:
+        user_cache.set((user_id, 'habit'), habits, generation)
+    
+    data = {
+        'authenticated': True,
+        'user_id': user_id,
+        'username': user['username'],
+        'preferences': preferences,
+        'habits': habits,
+        'today': {
+            'lesson_day': lesson_day,
+            'progress': progress,
+            'cursor': user['sync_cursor']
+        }
+    }
+    
+    if include_lesson:
+        variant = (
+            preferences.get('age_group') if preferences.get('age_group') in AGE_GROUPS else DEFAULT_AGE_GROUP,
+            preferences.get('tone') if preferences.get('tone') in TONES else DEFAULT_TONE,
+            preferences.get('language') if preferences.get('language') in LANGUAGES else DEFAULT_LANGUAGE
+        )
+        encoded = lesson_index.render_encoded(lesson_day, *variant)
+        data['lesson'] = lesson_index.render(lesson_day, *variant)
+        data['lesson_etag'] = encoded.etag if encoded else None
+    
+    return jsonify(data)
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """Hit/miss counters for this worker's caches"""
+    return jsonify({
+        'user_cache': user_cache.stats(),
+        'lesson_index': lesson_index.stats()
+    })
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition: trigger-maintained counters plus this worker's timings"""
+    # Counters are per file; the main database and every shard each hold their share
+    counters = {}
+    completions_today = 0
+    for pool in get_shard_router().pools():
+        with pool.connection() as conn:
+            for name, value in conn.execute('SELECT name, value FROM stat_counters'):
+                counters[name] = counters.get(name, 0) + value
+            # completed_at is stamped in server local time, so the buckets are local days
+            today = conn.execute(
+                "SELECT completions FROM daily_completions WHERE day = date('now', 'localtime')"
+            ).fetchone()
+            completions_today += today[0] if today else 0
+    
+    lines = []
+    for name, counter, help_text in (
+        ('ilearnhow_users', 'users', 'Registered users'),
+        ('ilearnhow_lesson_progress_rows', 'progress_entries', 'Rows in lesson_progress'),
+        ('ilearnhow_habit_rows', 'habit_entries', 'Rows in habit_formation'),
+        ('ilearnhow_lesson_variants', 'variants', 'Materialized lesson variants'),
+        ('ilearnhow_streak_days_sum', 'streak_days_total', 'Sum of current streaks'),
+    ):
+        lines += metric_family(name, 'gauge', help_text, [({}, counters.get(counter, 0))])
+    lines += metric_family('ilearnhow_lesson_completions_total', 'counter',
+                           'Lesson phases completed', [({}, counters.get('completions', 0))])
+    lines += metric_family('ilearnhow_lesson_completions_today', 'gauge',
+                           'Lesson phases completed today (server local time)', [({}, completions_today)])
+    
+    cache = user_cache.stats()
+    for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+        lines += metric_family(f'ilearnhow_user_cache_{key}_total', 'counter',
+                               f'User cache {key} in this worker', [({}, cache[key])])
+    lines += metric_family('ilearnhow_user_cache_entries', 'gauge',
+                           'User cache entries in this worker', [({}, cache['entries'])])
+    
+    render = lesson_index.stats()
+    lines += metric_family('ilearnhow_lesson_render_cache_total', 'counter',
+                           'Lesson render cache lookups in this worker',
+                           [({'result': 'hit'}, render['render_cache_hits']),
+                            ({'result': 'miss'}, render['render_cache_misses'])])
+    
+    pools = [pool.stats() for pool in get_shard_router().pools()]
+    lines += metric_family('ilearnhow_db_connections', 'gauge', 'Pooled connections in this worker',
+                           [({'state': 'idle'}, sum(pool['idle'] for pool in pools)),
+                            ({'state': 'in_use'}, sum(pool['in_use'] for pool in pools))])
+    writers = [writer.stats() for writer in get_shard_router().writers()]
+    lines += metric_family('ilearnhow_db_writes_total', 'counter',
+                           'Queued writes committed by this worker',
+                           [({}, sum(writer['operations'] for writer in writers))])
+    lines += metric_family('ilearnhow_db_write_failures_total', 'counter',
+                           'Queued writes that raised or were rolled back in this worker',
+                           [({}, sum(writer['failed'] for writer in writers))])
+    lines += metric_family('ilearnhow_db_write_batches_total', 'counter',
+                           'Group commits by this worker\'s writer threads',
+                           [({}, sum(writer['batches'] for writer in writers))])
+    lines += metric_family('ilearnhow_db_write_queue_depth', 'gauge',
+                           'Writes waiting for a writer thread in this worker',
+                           [({}, sum(writer['pending'] for writer in writers))])
+    lines += metric_family('ilearnhow_heartbeat_pending_rows', 'gauge',
+                           'Merged time_spent increments waiting to be written by this worker',
+                           [({}, heartbeats.pending())])
+    lines += metric_family('ilearnhow_heartbeat_flushed_rows_total', 'counter',
+                           'time_spent increments written by this worker',
+                           [({}, heartbeats.flushed_rows)])
+    lines += metric_family('ilearnhow_db_shards', 'gauge', 'Files holding per-user tables',
+                           [({}, app.config['DB_SHARDS'])])
+    
+    lines += request_latency.exposition()
+    return app.response_class('\n'.join(lines) + '\n', content_type=METRICS_CONTENT_TYPE)
 
 # Lesson Data Endpoints (for 5-phase system)
 @app.route('/api/lessons/<int:day>')
@@ -444,25 +1014,38 @@ def get_lesson_data(day):
     if day < 1 or day > 366:
         return jsonify({'error': 'Invalid lesson day'}), 400
     
-    # This would integrate with your existing curriculum system
-    # For now, return basic structure for 5-phase system
-    lesson_data = {
-        'day': day,
-        'phases': {
-            1: {'type': 'welcome', 'content': 'Welcome to today\'s lesson'},
-            2: {'type': 'question_1', 'content': 'First question content', 'choices': ['A', 'B']},
-            3: {'type': 'question_2', 'content': 'Second question content', 'choices': ['A', 'B']},
-            4: {'type': 'question_3', 'content': 'Third question content', 'choices': ['A', 'B']},
-            5: {'type': 'daily_fortune', 'content': 'Your daily fortune'}
-        },
-        'variants': {
-            'age_groups': ['age_2', 'age_5', 'age_8', 'age_12', 'age_16', 'age_25', 'age_40', 'age_60', 'age_80', 'age_102'],
-            'tones': ['grandmother', 'fun', 'neutral'],
-            'languages': ['english', 'spanish', 'french', 'german', 'chinese', 'japanese']
-        }
-    }
+    age_group = request.args.get('age_group', DEFAULT_AGE_GROUP)
+    tone = request.args.get('tone', DEFAULT_TONE)
+    language = request.args.get('language', DEFAULT_LANGUAGE)
     
-    return jsonify(lesson_data)
+    for name, value, allowed in (('age_group', age_group, AGE_GROUPS),
+                                 ('tone', tone, TONES),
+                                 ('language', language, LANGUAGES)):
+        if value not in allowed:
+            return jsonify({'error': f'Unsupported {name}', 'allowed': allowed}), 400
+    
+    encoded = lesson_index.render_encoded(day, age_group, tone, language)
+    if encoded is None:
+        return jsonify({'error': 'Lesson not found'}), 404
+    
+    return cacheable_json_response(encoded)
+
+@app.route('/api/curriculum')
+def get_curriculum():
+    """Get the full-year curriculum calendar"""
+    return cacheable_json_response(lesson_index.curriculum_encoded)
+
+def cacheable_json_response(encoded):
+    """Serve a pre-serialized payload with validators, answering 304 when unchanged"""
+    response = app.response_class(encoded.body, mimetype='application/json')
+    response.set_etag(encoded.etag)
+    response.last_modified = lesson_index.content_modified
+    # Each variant has its own query string, which Cloudflare uses as the cache key
+    response.headers['Cache-Control'] = (
+        f"public, max-age={app.config['LESSON_BROWSER_MAX_AGE']}, "
+        f"s-maxage={app.config['LESSON_EDGE_MAX_AGE']}"
+    )
+    return response.make_conditional(request)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
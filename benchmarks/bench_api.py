@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+API Load Benchmark
+Throughput and p50/p95/p99 per endpoint for a synthetic mix of player traffic
+
+Synthetic users register through the API, then issue a weighted mix of
+login, progress, habit, preference, bootstrap and lesson calls. By default
+requests go through the Flask test client in-process; --server runs the app
+behind a real threaded WSGI server and drives it over HTTP instead.
+
+Results are written as JSON. When a previous result exists it is used as the
+baseline, and any endpoint whose p95 or throughput regressed beyond
+--tolerance makes the run exit non-zero.
+
+Usage:
+    python benchmarks/bench_api.py --users 2000 --clients 16 --requests 500 --profile mixed
+    python benchmarks/bench_api.py --server --output benchmarks/results/api-server.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the import-time init_db() away from the real ilearnhow.db
+os.environ.setdefault('ILEARNHOW_DB', os.path.join(tempfile.gettempdir(), 'ilearnhow_bench.db'))
+
+import app as backend
+from bench_db_pool import percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+PASSWORD = 'bench-password'
+
+# Relative weight of each operation after a user has registered
+PROFILES = {
+    'mixed': {
+        'login': 2, 'progress_read': 25, 'progress_delta': 10, 'progress_write': 20,
+        'progress_batch': 3, 'habit_status': 15, 'preferences': 5, 'bootstrap': 10, 'lesson': 10
+    },
+    'read_heavy': {
+        'login': 1, 'progress_read': 30, 'progress_delta': 15, 'progress_write': 4,
+        'habit_status': 20, 'preferences': 10, 'bootstrap': 10, 'lesson': 10
+    },
+    'write_heavy': {
+        'login': 1, 'progress_read': 10, 'progress_write': 55, 'progress_batch': 10,
+        'habit_status': 10, 'bootstrap': 4, 'preferences_write': 10
+    }
+}
+
+class HttpClient:
+    """requests.Session with the test client's get/post/put(path, json=...) shape"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def get(self, path, **kwargs):
+        return self.session.get(self.base_url + path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.session.post(self.base_url + path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.session.put(self.base_url + path, **kwargs)
+
+class SyntheticUser:
+    """One learner: its own cookie jar and a position in the curriculum"""
+
+    def __init__(self, index, client, rng):
+        self.username = f'bench{index}'
+        self.client = client
+        self.day = rng.randint(1, 30)
+        self.phase = 1
+        self.cursor = 0
+
+    def next_phase(self):
+        """Advance through the five phases, moving to the next day after the last"""
+        day, phase = self.day, self.phase
+        self.phase += 1
+        if self.phase > 5:
+            self.phase = 1
+            self.day = self.day % 366 + 1
+        return day, phase
+
+def json_body(response):
+    """Decoded JSON from either a test client or a requests response"""
+    return response.get_json() if hasattr(response, 'get_json') else response.json()
+
+def perform(user, operation, rng):
+    """Issue one request for operation; returns the response"""
+    client = user.client
+    if operation == 'register':
+        return client.post('/api/auth/register', json={
+            'username': user.username, 'email': f'{user.username}@example.com', 'password': PASSWORD
+        })
+    if operation == 'login':
+        return client.post('/api/auth/login', json={'username': user.username, 'password': PASSWORD})
+    if operation == 'progress_read':
+        return client.get('/api/lessons/progress')
+    if operation == 'progress_delta':
+        response = client.get(f'/api/lessons/progress?since={user.cursor}')
+        if response.status_code == 200:
+            user.cursor = json_body(response).get('cursor', user.cursor)
+        return response
+    if operation == 'progress_write':
+        day, phase = user.next_phase()
+        return client.post('/api/lessons/progress', json={
+            'lesson_day': day, 'phase': phase, 'completed': True,
+            'answers': [rng.choice('AB')], 'time_spent': rng.randint(20, 240)
+        })
+    if operation == 'progress_batch':
+        updates = []
+        for _ in range(5):
+            day, phase = user.next_phase()
+            updates.append({'lesson_day': day, 'phase': phase, 'completed': True,
+                            'time_spent': rng.randint(20, 240)})
+        return client.post('/api/lessons/progress/batch', json={'updates': updates})
+    if operation == 'habit_status':
+        return client.get('/api/habits/status')
+    if operation == 'preferences':
+        return client.get('/api/user/preferences')
+    if operation == 'preferences_write':
+        return client.put('/api/user/preferences', json={'tone': rng.choice(['fun', 'neutral'])})
+    if operation == 'bootstrap':
+        return client.get(f'/api/bootstrap?day={user.day}&include_lesson=1')
+    if operation == 'lesson':
+        return client.get(f'/api/lessons/{rng.choice([1, 15, 24])}?tone={rng.choice(["fun", "neutral"])}')
+    raise ValueError(f'Unknown operation: {operation}')
+
+def start_server(port):
+    """Serve the app from a threaded WSGI server in a daemon thread"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', port, backend.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def run_load(args, make_client):
+    """Register every user, then drive the profile mix; returns raw latencies per operation"""
+    weights = PROFILES[args.profile]
+    operations = list(weights)
+    operation_weights = list(weights.values())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.clients + 1)
+    wall = {}
+
+    def worker(worker_id):
+        rng = random.Random(args.seed + worker_id)
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+
+        def timed(user, operation):
+            started = time.perf_counter()
+            try:
+                status = perform(user, operation, rng).status_code
+            except Exception:
+                status = 599
+            local_latencies[operation].append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                local_errors[operation] += 1
+
+        # Each worker owns every clients-th user
+        users = [SyntheticUser(index, make_client(), rng)
+                 for index in range(worker_id, args.users, args.clients)]
+        for user in users:
+            timed(user, 'register')
+
+        start_barrier.wait()
+        for _ in range(args.requests):
+            timed(rng.choice(users), rng.choices(operations, operation_weights)[0])
+
+        with lock:
+            for operation, values in local_latencies.items():
+                latencies[operation].extend(values)
+            for operation, count in local_errors.items():
+                errors[operation] += count
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    wall['started'] = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall['seconds'] = time.perf_counter() - wall['started']
+    return latencies, errors, wall['seconds']
+
+def summarize(latencies, errors, seconds):
+    """Per-operation throughput and latency percentiles"""
+    endpoints = {}
+    mixed_requests = 0
+    for operation in sorted(latencies):
+        values = sorted(latencies[operation])
+        if operation != 'register':
+            mixed_requests += len(values)
+        endpoints[operation] = {
+            'requests': len(values),
+            'errors': errors.get(operation, 0),
+            # Registration happens before the timed window, so it has no rate
+            'throughput_rps': round(len(values) / seconds, 1) if operation != 'register' else None,
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3)
+        }
+    return {
+        'seconds': round(seconds, 2),
+        'throughput_rps': round(mixed_requests / seconds, 1) if seconds else 0.0,
+        'endpoints': endpoints
+    }
+
+def compare(current, baseline, tolerance):
+    """Endpoints whose p95 grew or throughput fell by more than tolerance"""
+    regressions = []
+    for operation, now in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(operation)
+        if not before:
+            continue
+        if before['p95_ms'] and now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{operation}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if before.get('throughput_rps') and now['throughput_rps'] is not None \
+                and now['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{operation}: {before['throughput_rps']} -> {now['throughput_rps']} rps")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000, help='synthetic users to register')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client threads')
+    parser.add_argument('--requests', type=int, default=500, help='mixed requests per client')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='mixed')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--server', action='store_true', help='go over HTTP to a real WSGI server')
+    parser.add_argument('--port', type=int, default=0, help='server port (default: any free port)')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'bench_api.json'),
+                        help='where to write results')
+    parser.add_argument('--baseline', help='results to compare against (default: previous --output)')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed regression fraction')
+    args = parser.parse_args()
+    args.clients = min(args.clients, args.users)
+
+    baseline_path = args.baseline or args.output
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend.app.config['DATABASE'] = os.path.join(tmp, 'bench_api.db')
+        backend.get_db_pool().close_all()
+        backend.init_db()
+        backend.user_cache.clear()
+
+        server = None
+        if args.server:
+            server, base_url = start_server(args.port)
+            make_client = lambda: HttpClient(base_url)
+        else:
+            make_client = backend.app.test_client
+
+        print(f"🔧 {args.users:,} users, {args.clients} clients x {args.requests} requests, "
+              f"profile '{args.profile}' ({'HTTP' if args.server else 'test client'})")
+        try:
+            latencies, errors, seconds = run_load(args, make_client)
+        finally:
+            if server:
+                server.shutdown()
+            backend.get_db_pool().close_all()
+
+    results = summarize(latencies, errors, seconds)
+    results.update({
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'transport': 'http' if args.server else 'test_client',
+        'python': platform.python_version(),
+        'args': {key: value for key, value in vars(args).items()
+                 if key not in ('output', 'baseline', 'tolerance', 'port')}
+    })
+
+    print(f"\n📊 {results['throughput_rps']} requests/sec over {results['seconds']}s")
+    print(f"{'endpoint':<18} {'requests':>9} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'errors':>7}")
+    for operation, result in results['endpoints'].items():
+        rps = result['throughput_rps'] if result['throughput_rps'] is not None else '-'
+        print(f"{operation:<18} {result['requests']:>9} {rps:>8} {result['p50_ms']:>8} "
+              f"{result['p95_ms']:>8} {result['p99_ms']:>8} {result['errors']:>7}")
+
+    regressions = []
+    if baseline and baseline.get('args') == results['args']:
+        regressions = compare(results, baseline, args.tolerance)
+    elif baseline:
+        print(f"\n⏭️  Baseline {baseline_path} used different settings; not compared")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written: {args.output}")
+
+    if regressions:
+        print(f"\n❌ Regressions beyond {args.tolerance:.0%} against {baseline_path}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Connection Pool Benchmark
+p50/p99 latency of /api/lessons/progress under concurrent clients,
+per-request sqlite3.connect() (legacy) versus pooled WAL connections
+
+Usage:
+    python benchmarks/bench_db_pool.py --clients 16 --requests 200 --write-ratio 0.1
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the import-time init_db() away from the real ilearnhow.db
+os.environ.setdefault('ILEARNHOW_DB', os.path.join(tempfile.gettempdir(), 'ilearnhow_bench.db'))
+
+import app as backend
+
+class LegacyConnections:
+    """Pre-pool behaviour: a fresh rollback-journal connection per request"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def acquire(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        conn.close()
+
+def prepare_database(db_path, users, days, journal_mode):
+    """Create a database with `users` users and `days` x 5 progress rows each"""
+    backend.app.config['DATABASE'] = db_path
+    backend.init_db()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+    conn.executemany(
+        'INSERT INTO users (id, username, password_hash) VALUES (?, ?, ?)',
+        [(user_id, f'bench{user_id}', 'x') for user_id in range(1, users + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO habit_formation (user_id) VALUES (?)',
+        [(user_id,) for user_id in range(1, users + 1)]
+    )
+    conn.executemany('''
+        INSERT INTO lesson_progress (user_id, lesson_day, phase, completed, time_spent)
+        VALUES (?, ?, ?, 1, 60)
+    ''', [
+        (user_id, day, phase)
+        for user_id in range(1, users + 1)
+        for day in range(1, days + 1)
+        for phase in range(1, 6)
+    ])
+    conn.commit()
+    conn.close()
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+def run_clients(clients, requests_per_client, write_ratio, days):
+    """Drive the progress endpoints from `clients` threads, one user each"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients)
+
+    def worker(user_id):
+        client = backend.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = f'bench{user_id}'
+
+        local_latencies = []
+        local_errors = 0
+        write_every = int(1 / write_ratio) if write_ratio > 0 else 0
+        start_barrier.wait()
+
+        for i in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                if write_every and i % write_every == 0:
+                    response = client.post('/api/lessons/progress', json={
+                        'lesson_day': (i % days) + 1,
+                        'phase': (i % 5) + 1,
+                        'completed': True,
+                        'time_spent': 90
+                    })
+                else:
+                    response = client.get('/api/lessons/progress')
+                if response.status_code >= 400:
+                    local_errors += 1
+            except sqlite3.OperationalError:
+                local_errors += 1
+            local_latencies.append((time.perf_counter() - started) * 1000)
+
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker, args=(n + 1,)) for n in range(clients)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p99_ms': round(percentile(latencies, 99), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per client')
+    parser.add_argument('--days', type=int, default=30, help='lesson days of history per user')
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    pooled_get_db_pool = backend.get_db_pool
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, journal_mode in (('legacy', 'DELETE'), ('pooled', 'WAL')):
+            db_path = os.path.join(tmp, f'{mode}.db')
+            prepare_database(db_path, args.clients, args.days, journal_mode)
+
+            if mode == 'legacy':
+                legacy = LegacyConnections(db_path)
+                backend.get_db_pool = lambda: legacy
+            else:
+                backend.get_db_pool = pooled_get_db_pool
+
+            results[mode] = run_clients(args.clients, args.requests, args.write_ratio, args.days)
+
+        backend.get_db_pool = pooled_get_db_pool
+        backend.get_db_pool().close_all()
+
+    print(f"\n📊 /api/lessons/progress — {args.clients} clients x {args.requests} requests, "
+          f"{args.write_ratio:.0%} writes")
+    print(f"{'mode':<8} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, result in results.items():
+        print(f"{mode:<8} {result['throughput_rps']:>8} {result['p50_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['errors']:>7}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\n✅ Results written: {args.json}")
+
+if __name__ == '__main__':
+    main()
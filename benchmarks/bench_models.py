@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+ORM Helper Benchmark
+Per-call cost of the models.py helpers, engine-per-call (legacy) versus the
+shared engine and session factory
+
+Usage:
+    python benchmarks/bench_models.py --calls 500
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+import models
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+def legacy_session_registry(database_url=None):
+    """Pre-change behaviour: a brand-new engine and pool for every helper call"""
+    engine = create_engine(database_url or models.DATABASE_URL)
+    return scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+
+def prepare(database_url, users):
+    models.init_database(database_url)
+    for n in range(users):
+        user = models.create_user(f'bench{n}', 'x', database_url=database_url)
+        for phase in range(1, 6):
+            models.update_lesson_progress(user.id, 1, phase, completed=True, time_spent=60,
+                                          database_url=database_url)
+        models.update_habit_formation(user.id, 1, database_url=database_url)
+
+def time_helpers(database_url, calls, users):
+    """Microseconds per call for each helper"""
+    helpers = {
+        'get_user_by_username': lambda n: models.get_user_by_username(f'bench{n % users}',
+                                                                      database_url=database_url),
+        'get_user_progress': lambda n: models.get_user_progress(n % users + 1, database_url=database_url),
+        'get_habit_status': lambda n: models.get_habit_status(n % users + 1, database_url=database_url),
+        'update_lesson_progress': lambda n: models.update_lesson_progress(
+            n % users + 1, 2, n % 5 + 1, completed=True, time_spent=n, database_url=database_url
+        ),
+    }
+    results = {}
+    for name, helper in helpers.items():
+        timings = []
+        for n in range(calls):
+            started = time.perf_counter()
+            helper(n)
+            timings.append((time.perf_counter() - started) * 1e6)
+        timings.sort()
+        results[name] = {
+            'mean_us': round(sum(timings) / len(timings), 1),
+            'p50_us': round(percentile(timings, 50), 1),
+            'p99_us': round(percentile(timings, 99), 1)
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=500, help='calls per helper')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    shared_registry = models.get_session_registry
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench_models.db')}"
+        prepare(database_url, args.users)
+
+        for mode in ('legacy', 'shared'):
+            models.get_session_registry = legacy_session_registry if mode == 'legacy' else shared_registry
+            results[mode] = time_helpers(database_url, args.calls, args.users)
+
+        models.get_session_registry = shared_registry
+        models.dispose_engines()
+
+    print(f"\n📊 models.py helpers — {args.calls} calls each")
+    print(f"{'helper':<24} {'legacy p50 us':>14} {'shared p50 us':>14} {'speedup':>8}")
+    for name in results['shared']:
+        legacy, shared = results['legacy'][name], results['shared'][name]
+        print(f"{name:<24} {legacy['p50_us']:>14} {shared['p50_us']:>14} "
+              f"{legacy['p50_us'] / shared['p50_us']:>7.1f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\n✅ Results written: {args.json}")
+
+if __name__ == '__main__':
+    main()
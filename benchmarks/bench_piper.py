@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Piper Synthesis Benchmark
+Per-utterance latency of a fresh `piper` process per request (legacy),
+the resident --json-input pool and the raw-PCM pool, with the WAV
+hand-off directory on real disk versus tmpfs
+
+Needs the piper binary and the voice models on this machine.
+
+Usage:
+    python benchmarks/bench_piper.py --requests 20 --speaker kelly --disk-dir /var/tmp
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from piper_pool import PiperPool, RawPiperPool, PIPER_COMMAND
+
+VOICE_MODELS = {
+    'kelly': 'en_US-amy-medium',
+    'ken': 'en_US-ryan-medium'
+}
+
+SENTENCE = 'Today we are going to learn how the moon changes shape over a month.'
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+def spawn_per_request(voice_model, text, output_path):
+    """Pre-pool behaviour: process start and model load on every call"""
+    subprocess.run([PIPER_COMMAND, '--model', voice_model, '--output_file', output_path],
+                   input=text.encode('utf-8'), capture_output=True, check=True)
+    with open(output_path, 'rb') as f:
+        return f.read()
+
+def time_calls(call, requests):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'mean_ms': round(sum(timings) / len(timings), 1),
+        'p50_ms': round(percentile(timings, 50), 1),
+        'p99_ms': round(percentile(timings, 99), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--speaker', default='kelly', choices=sorted(VOICE_MODELS))
+    parser.add_argument('--text', default=SENTENCE)
+    parser.add_argument('--disk-dir', default=os.getcwd(), help='directory on a real disk')
+    parser.add_argument('--tmpfs-dir', default='/dev/shm', help='directory on tmpfs')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    voice_model = VOICE_MODELS[args.speaker]
+    results = {}
+
+    for storage, directory in (('disk', args.disk_dir), ('tmpfs', args.tmpfs_dir)):
+        if not os.path.isdir(directory):
+            print(f"⏭️  Skipping {storage}: {directory} does not exist")
+            continue
+
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            output_path = os.path.join(tmp, 'legacy.wav')
+            results[f'spawn/{storage}'] = time_calls(
+                lambda: spawn_per_request(voice_model, args.text, output_path), args.requests
+            )
+
+        pool = PiperPool({args.speaker: voice_model}, workers_per_voice=1,
+                         health_check_interval=0, output_dir=directory)
+        try:
+            pool.synthesize(args.speaker, 'Warm up.')
+            results[f'json/{storage}'] = time_calls(
+                lambda: pool.synthesize(args.speaker, args.text), args.requests
+            )
+        finally:
+            pool.close()
+
+    # No files at all: PCM over stdout into memory
+    raw_pool = RawPiperPool({args.speaker: voice_model}, spares_per_voice=1)
+    try:
+        raw_pool.synthesize(args.speaker, 'Warm up.')
+        results['raw/memory'] = time_calls(
+            lambda: raw_pool.synthesize(args.speaker, args.text), args.requests
+        )
+    finally:
+        raw_pool.close()
+
+    print(f"\n📊 Piper {args.speaker} ({voice_model}) — {args.requests} utterances")
+    print(f"{'mode':<14} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for mode, result in results.items():
+        print(f"{mode:<14} {result['mean_ms']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\n✅ Results written: {args.json}")
+
+if __name__ == '__main__':
+    main()
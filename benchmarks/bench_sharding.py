@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Shard Write Benchmark
+Progress-write throughput from concurrent worker processes as the shard count grows
+
+Every write is the API's own progress upsert plus streak update, committed
+individually as a request would, against a database resharded with
+sharding.reshard().
+
+Usage:
+    python benchmarks/bench_sharding.py --workers 8 --seconds 5 --shards 1,2,4,8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the import-time init_db() away from the real ilearnhow.db
+os.environ.setdefault('ILEARNHOW_DB', os.path.join(tempfile.gettempdir(), 'ilearnhow_bench.db'))
+
+import app as backend
+import database
+import sharding
+
+def write_worker(db_path, shard_count, users, seconds, seed, start_event, results):
+    """Upsert progress rows for random users until the time budget runs out"""
+    router = sharding.ShardRouter(db_path, shard_count, max_size=1)
+    rng = random.Random(seed)
+    writes = busy = 0
+    today = time.strftime('%Y-%m-%d')
+    start_event.wait()
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, users)
+        lesson_day = rng.randint(1, 366)
+        try:
+            with router.pool_for(user_id).connection() as conn:
+                conn.execute(backend.PROGRESS_UPSERT_SQL, (
+                    user_id, lesson_day, rng.randint(1, 5), True, '["A"]', 60, today
+                ))
+                conn.execute(backend.HABIT_STREAK_SQL, {'user_id': user_id, 'today': today})
+                conn.commit()
+            writes += 1
+        except sqlite3.OperationalError:
+            busy += 1
+
+    router.close_all()
+    results.put((writes, busy))
+
+def run(db_path, shard_count, workers, users, seconds):
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=write_worker, args=(
+            db_path, shard_count, users, seconds, n, start_event, results
+        ))
+        for n in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(0.2)
+    start_event.set()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    writes = sum(result[0] for result in totals)
+    return {
+        'writes': writes,
+        'busy_errors': sum(result[1] for result in totals),
+        'writes_per_second': round(writes / seconds, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8, help='writer processes')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration per shard count')
+    parser.add_argument('--shards', default='1,2,4,8', help='comma-separated shard counts')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench_sharding.db')
+        database.generate_synthetic_data(db_path, users=args.users, days=30)
+
+        for shard_count in [int(value) for value in args.shards.split(',')]:
+            sharding.reshard(db_path, shard_count, report=lambda line: None)
+            results[shard_count] = run(db_path, shard_count, args.workers, args.users, args.seconds)
+            print(f"  🔀 {shard_count} shard(s): {results[shard_count]['writes_per_second']:,} writes/sec")
+
+    print(f"\n📊 Progress writes — {args.workers} processes, {os.cpu_count()} CPUs")
+    print(f"{'shards':>6} {'writes/sec':>11} {'busy':>6} {'scaling':>8}")
+    base = next(iter(results.values()))['writes_per_second'] or 1
+    for shard_count, result in results.items():
+        print(f"{shard_count:>6} {result['writes_per_second']:>11} {result['busy_errors']:>6} "
+              f"{result['writes_per_second'] / base:>7.2f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+        print(f"\n✅ Results written: {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Write Queue Benchmark
+Sustained progress-write throughput under bursts of concurrent writers,
+each thread committing on its own pooled connection (legacy) versus the
+single-writer group-commit queue
+
+Usage:
+    python benchmarks/bench_write_queue.py --threads 32 --writes 200 --busy-timeout 50
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the import-time init_db() away from the real ilearnhow.db
+os.environ.setdefault('ILEARNHOW_DB', os.path.join(tempfile.gettempdir(), 'ilearnhow_bench.db'))
+
+import app as backend
+import database
+import db_pool
+from write_queue import WriteQueue
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+def progress_write(rng, users):
+    user_id = rng.randint(1, users)
+    row = (user_id, rng.randint(1, 366), rng.randint(1, 5), True, '["A"]', 60,
+           time.strftime('%Y-%m-%dT%H:%M:%S'))
+    return user_id, [row]
+
+def run(mode, db_path, threads, writes, users, busy_timeout):
+    pragmas = [(name, busy_timeout if name == 'busy_timeout' else value)
+               for name, value in db_pool.CONNECTION_PRAGMAS]
+    writer = WriteQueue(db_path)
+    timings, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(threads + 1)
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = db_pool.connect(db_path, pragmas) if mode == 'direct' else None
+        local, failed = [], 0
+        start.wait()
+        for _ in range(writes):
+            user_id, rows = progress_write(rng, users)
+            started = time.perf_counter()
+            try:
+                if mode == 'direct':
+                    backend.write_progress(conn, user_id, rows, True)
+                    conn.commit()
+                else:
+                    writer.execute(backend.write_progress, user_id, rows, True)
+            except sqlite3.OperationalError:
+                # "database is locked" once busy_timeout runs out
+                if conn is not None:
+                    conn.rollback()
+                failed += 1
+                continue
+            local.append((time.perf_counter() - started) * 1000)
+        if conn is not None:
+            conn.close()
+        with lock:
+            timings.extend(local)
+            errors.append(failed)
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    writer.close()
+
+    timings.sort()
+    return {
+        'writes_per_second': round(len(timings) / elapsed, 1),
+        'lock_errors': sum(errors),
+        'p50_ms': round(percentile(timings, 50), 2) if timings else None,
+        'p99_ms': round(percentile(timings, 99), 2) if timings else None,
+        'batches': writer.stats()['batches'] if mode == 'queued' else len(timings)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32, help='concurrent writers')
+    parser.add_argument('--writes', type=int, default=200, help='writes per thread')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--busy-timeout', type=int, default=50,
+                        help='ms a direct writer waits for the lock before "database is locked"')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench_write_queue.db')
+        database.generate_synthetic_data(db_path, users=args.users, days=30)
+        conn = db_pool.connect(db_path)  # switches the file to WAL
+        conn.close()
+        for mode in ('direct', 'queued'):
+            results[mode] = run(mode, db_path, args.threads, args.writes, args.users, args.busy_timeout)
+
+    print(f"\n📊 Progress writes — {args.threads} threads x {args.writes} writes")
+    print(f"{'mode':<8} {'writes/sec':>11} {'lock errors':>12} {'p50 ms':>8} {'p99 ms':>8} {'commits':>8}")
+    for mode, result in results.items():
+        print(f"{mode:<8} {result['writes_per_second']:>11} {result['lock_errors']:>12} "
+              f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['batches']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\n✅ Results written: {args.json}")
+
+if __name__ == '__main__':
+    main()
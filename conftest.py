@@ -0,0 +1,58 @@
+"""
+Pytest configuration
+Point the backend at a throwaway database before app.py is imported
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault(
+    'ILEARNHOW_DB', os.path.join(tempfile.mkdtemp(prefix='ilearnhow-test-'), 'ilearnhow.db')
+)
+
+import sys
+
+import pytest
+
+# Speaks Piper's --json-input and --output-raw protocols without a voice model.
+# Special texts: "crash" exits mid-utterance, "crash once" only on its first
+# run, "hang" stalls. Audio is a tenth of a second of samples per word.
+STAND_IN_PIPER = '''
+import argparse, json, os, sys, time, wave
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model')
+parser.add_argument('--json-input', action='store_true')
+parser.add_argument('--output-raw', action='store_true')
+args = parser.parse_args()
+crash_flag = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crashed-once')
+
+def pcm(text):
+    if text == 'crash' or (text == 'crash once' and not os.path.exists(crash_flag)):
+        open(crash_flag, 'w').close()
+        sys.exit(3)
+    if text == 'hang':
+        time.sleep(60)
+    return b'\\1\\0' * (2205 * len(text.split()))
+
+if args.json_input:
+    for line in sys.stdin:
+        request = json.loads(line)
+        samples = pcm(request['text'])
+        with wave.open(request['output_file'], 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(22050)
+            wav.writeframes(samples)
+        print(request['output_file'], flush=True)
+elif args.output_raw:
+    sys.stdout.buffer.write(pcm(sys.stdin.read()))
+'''
+
+@pytest.fixture
+def piper_command(tmp_path):
+    """Path of an executable stand-in for the piper binary"""
+    path = tmp_path / 'piper'
+    path.write_text(f'#!{sys.executable}\n{STAND_IN_PIPER}')
+    path.chmod(0o755)
+    return str(path)
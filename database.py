@@ -5,152 +5,43 @@ Handles database initialization, migrations, and data seeding
 
 import sqlite3
 import os
+import itertools
+import time
 from datetime import datetime
 import json
 
+from migrations import (
+    MIGRATIONS_TABLE_SQL, apply_migration, migrate, add_stat_counters, drop_stat_triggers
+)
+
 def init_database(db_path='ilearnhow.db'):
     """Initialize SQLite database with all required tables"""
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP,
-            preferences TEXT DEFAULT '{}'
-        )
-    ''')
-    
-    # Lesson progress table (for 5-phase system)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS lesson_progress (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            lesson_day INTEGER NOT NULL,
-            phase INTEGER NOT NULL,
-            completed BOOLEAN DEFAULT FALSE,
-            answers TEXT DEFAULT '[]',
-            time_spent INTEGER DEFAULT 0,
-            completed_at TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            UNIQUE(user_id, lesson_day, phase)
-        )
-    ''')
-    
-    # User sessions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_id TEXT UNIQUE NOT NULL,
-            streak_days INTEGER DEFAULT 0,
-            last_lesson_day INTEGER,
-            total_lessons_completed INTEGER DEFAULT 0,
-            total_time_spent INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Habit formation table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS habit_formation (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            streak_days INTEGER DEFAULT 0,
-            longest_streak INTEGER DEFAULT 0,
-            current_streak_start DATE,
-            last_activity_date DATE,
-            daily_goal_met BOOLEAN DEFAULT FALSE,
-            weekly_goal_met BOOLEAN DEFAULT FALSE,
-            monthly_goal_met BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Lesson variants table (for 3,285 variants per lesson)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS lesson_variants (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            lesson_day INTEGER NOT NULL,
-            age_group TEXT NOT NULL,
-            tone TEXT NOT NULL,
-            language TEXT NOT NULL,
-            avatar TEXT NOT NULL,
-            phase INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            choices TEXT DEFAULT '[]',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(lesson_day, age_group, tone, language, avatar, phase)
-        )
-    ''')
-    
-    # User preferences table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_preferences (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            age_group TEXT DEFAULT 'age_25',
-            tone TEXT DEFAULT 'neutral',
-            language TEXT DEFAULT 'english',
-            avatar TEXT DEFAULT 'kelly',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
+    applied = migrate(conn)
     conn.close()
+    for name in applied:
+        print(f"✅ Migration applied: {name}")
     print(f"✅ Database initialized: {db_path}")
 
 def create_migration_table(db_path='ilearnhow.db'):
     """Create migrations table to track database schema changes"""
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS migrations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            migration_name TEXT UNIQUE NOT NULL,
-            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
+    conn.execute(MIGRATIONS_TABLE_SQL)
     conn.commit()
     conn.close()
 
 def run_migration(migration_name, sql_commands, db_path='ilearnhow.db'):
-    """Run a database migration"""
+    """Run a database migration in a single transaction"""
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Check if migration already applied
-    cursor.execute('SELECT id FROM migrations WHERE migration_name = ?', (migration_name,))
-    if cursor.fetchone():
-        print(f"⏭️  Migration already applied: {migration_name}")
+    try:
+        applied = apply_migration(conn, migration_name, sql_commands)
+    finally:
         conn.close()
-        return
     
-    # Run migration
-    for command in sql_commands:
-        cursor.execute(command)
-    
-    # Record migration
-    cursor.execute('INSERT INTO migrations (migration_name) VALUES (?)', (migration_name,))
-    
-    conn.commit()
-    conn.close()
-    print(f"✅ Migration applied: {migration_name}")
+    if applied:
+        print(f"✅ Migration applied: {migration_name}")
+    else:
+        print(f"⏭️  Migration already applied: {migration_name}")
 
 def seed_test_data(db_path='ilearnhow.db'):
     """Seed database with test data"""
@@ -219,18 +110,302 @@ def seed_test_data(db_path='ilearnhow.db'):
     conn.close()
     print("✅ Test data seeded")
 
-def backup_database(db_path='ilearnhow.db'):
-    """Create a backup of the database"""
-    import shutil
-    from datetime import datetime
+# Synthetic load shape: signups skew early in the year, each user has a daily
+# dropout hazard (most churn within weeks, a long tail stays all year) and a
+# per-user chance of showing up on any day while still engaged.
+SYNTHETIC_SIGNUP_BETA = (1.0, 2.0)
+SYNTHETIC_DROPOUT_BETA = (0.6, 12.0)
+SYNTHETIC_ATTENDANCE_BETA = (4.0, 1.5)
+SYNTHETIC_FINISH_RATE = 0.88
+SYNTHETIC_TRANSACTION_ROWS = 500000
+
+def generate_synthetic_data(db_path='ilearnhow.db', users=10000, days=366, seed=0,
+                            start_date='2025-01-01', transaction_rows=SYNTHETIC_TRANSACTION_ROWS):
+    """Bulk-load users x days x 5 phases of realistic progress for capacity testing"""
+    import hashlib
+    import numpy as np
+    import sharding
+    from lesson_index import AGE_GROUPS, TONES, LANGUAGES, AVATARS
+    from streak_job import compute_streaks, day_number, iso_day
+
+    days = max(1, min(days, 366))
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    # Per-user rows go to the file the app reads them from: the shards once resharded
+    shard_count = sharding.read_shard_count(conn)
+    if shard_count == 1:
+        shards = [conn]
+    else:
+        shard_paths = sharding.user_data_paths(db_path, shard_count)
+        sharding.migrate_files(shard_paths)
+        shards = [sqlite3.connect(path) for path in shard_paths]
+    files = [conn] + [shard for shard in shards if shard is not conn]
+    
+    # Nothing here is worth an fsync: a crashed load is simply rerun. The journal stays,
+    # since the load may be appending to a database with real rows, and a failed load
+    # must roll back cleanly instead of leaving a half-written file.
+    journal_modes = [file.execute('PRAGMA journal_mode').fetchone()[0] for file in files]
+    for file in files:
+        file.execute('PRAGMA journal_mode = WAL')
+        file.execute('PRAGMA synchronous = OFF')
+        file.execute('PRAGMA cache_size = -200000')
+    first_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+
+    # Per-user engagement
+    signup = np.floor(days * rng.beta(*SYNTHETIC_SIGNUP_BETA, users)).astype(np.int64)
+    lifetime = rng.geometric(np.clip(rng.beta(*SYNTHETIC_DROPOUT_BETA, users), 1e-4, 1.0))
+    span = np.minimum(lifetime, days - signup)
+    attendance = rng.beta(*SYNTHETIC_ATTENDANCE_BETA, users)
+
+    # Every (user, day) while engaged, thinned to the days the user showed up
+    owner = np.repeat(np.arange(users), span)
+    day = signup[owner] + np.arange(len(owner)) - np.repeat(np.cumsum(span) - span, span)
+    showed_up = rng.random(len(owner)) < attendance[owner]
+    owner, day = owner[showed_up], day[showed_up]
+
+    # Most sessions finish all five phases; the rest stop partway with the last phase open
+    phases = np.where(rng.random(len(day)) < SYNTHETIC_FINISH_RATE, 5, rng.integers(1, 5, len(day)))
+    seconds_into_day = rng.integers(6 * 3600, 23 * 3600, len(day))
+
+    row_owner = np.repeat(owner, phases)
+    row_day = np.repeat(day, phases)
+    row_phases = np.repeat(phases, phases)
+    row_phase = np.arange(len(row_owner)) - np.repeat(np.cumsum(phases) - phases, phases) + 1
+    completed = ~((row_phase == row_phases) & (row_phases < 5))
+
+    # Rows are ordered by user, so each user's change_seq is simply 1..n
+    rows_per_user = np.bincount(row_owner, minlength=users)
+    change_seq = np.arange(len(row_owner)) - np.repeat(np.cumsum(rows_per_user) - rows_per_user,
+                                                        rows_per_user) + 1
+
+    start = np.datetime64(start_date, 'D')
+    stamps = np.datetime_as_string(
+        (start + day).astype('datetime64[s]') + seconds_into_day, unit='s'
+    )
+    stamps = np.char.replace(stamps, 'T', ' ')
+    row_stamp = np.repeat(stamps, phases)
+    completed_at = np.where(completed, row_stamp, None)
+    answers = np.where(completed & (row_phase >= 2) & (row_phase <= 4),
+                       np.where(rng.random(len(row_owner)) < 0.5, '["A"]', '["B"]'), '[]')
+
+    user_ids = first_id + np.arange(users)
+    row_user_id = user_ids[row_owner]
+    password_hash = hashlib.sha256(b'synthetic').hexdigest()
+
+    # Streaks as the nightly job would compute them on the last simulated day
+    active_day = phases > 1
+    as_of = day_number(start_date) + days - 1
+    streaks = compute_streaks(user_ids[owner[active_day]], day_number(start_date) + day[active_day], as_of)
+    habit = {int(user_id): index for index, user_id in enumerate(streaks['user_id'])}
+
+    def user_rows():
+        last_seen = signup.copy()
+        np.maximum.at(last_seen, owner, day)
+        for index, user_id in enumerate(user_ids.tolist()):
+            yield (user_id, f'synthetic_{user_id}', f'synthetic_{user_id}@example.com', password_hash,
+                   str(start + signup[index]), str(start + last_seen[index]))
+
+    def habit_rows():
+        for user_id in user_ids.tolist():
+            index = habit.get(user_id)
+            if index is None:
+                yield (user_id, 0, 0, None, None, False, False, False)
+                continue
+            streak_start = streaks['streak_start'][index]
+            yield (
+                user_id, int(streaks['streak_days'][index]), int(streaks['longest_streak'][index]),
+                iso_day(streak_start) if streak_start >= 0 else None,
+                iso_day(streaks['last_day'][index]),
+                bool(streaks['daily_goal_met'][index]), bool(streaks['weekly_goal_met'][index]),
+                bool(streaks['monthly_goal_met'][index])
+            )
+
+    def preference_rows():
+        choices = [rng.integers(0, len(values), users)
+                   for values in (AGE_GROUPS, TONES, LANGUAGES, AVATARS)]
+        for index, user_id in enumerate(user_ids.tolist()):
+            yield (user_id, AGE_GROUPS[choices[0][index]], TONES[choices[1][index]],
+                   LANGUAGES[choices[2][index]], AVATARS[choices[3][index]])
+
+    progress_rows = zip(
+        row_user_id.tolist(), (row_day % 366 + 1).tolist(), row_phase.tolist(),
+        completed.tolist(), answers.tolist(), rng.integers(20, 300, len(row_owner)).tolist(),
+        completed_at.tolist(), row_stamp.tolist(), row_stamp.tolist(), change_seq.tolist()
+    )
+
+    def insert_user_rows(sql, rows):
+        """Insert rows keyed by user_id (first column) into each user's file"""
+        if shard_count == 1:
+            conn.executemany(sql, rows)
+            return
+        routed = [[] for _ in shards]
+        for row in rows:
+            routed[sharding.shard_index(row[0], shard_count)].append(row)
+        for shard, batch in zip(shards, routed):
+            shard.executemany(sql, batch)
+
+    def commit_all():
+        for file in files:
+            file.commit()
+
+    # Per-row counter triggers would double the load time; recount once at the end instead
+    for file in files:
+        with file:
+            drop_stat_triggers(file.cursor())
+    try:
+        conn.executemany('''
+            INSERT INTO users (id, username, email, password_hash, created_at, last_login)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', user_rows())
+        conn.executemany('''
+            INSERT INTO user_preferences (user_id, age_group, tone, language, avatar)
+            VALUES (?, ?, ?, ?, ?)
+        ''', preference_rows())
+        insert_user_rows('''
+            INSERT INTO user_sessions (user_id, session_id) VALUES (?, ?)
+        ''', ((user_id, f'synthetic-{user_id}') for user_id in user_ids.tolist()))
+        insert_user_rows('''
+            INSERT INTO habit_formation
+            (user_id, streak_days, longest_streak, current_streak_start, last_activity_date,
+             daily_goal_met, weekly_goal_met, monthly_goal_met)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', habit_rows())
+        commit_all()
+
+        # change_seq is supplied, so the per-row cursor trigger never fires
+        for _ in range(0, len(row_owner), transaction_rows):
+            insert_user_rows('''
+                INSERT INTO lesson_progress
+                (user_id, lesson_day, phase, completed, answers, time_spent,
+                 completed_at, created_at, updated_at, change_seq)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', itertools.islice(progress_rows, transaction_rows))
+            commit_all()
+    except BaseException:
+        for file in files:
+            file.rollback()
+        raise
+    finally:
+        for file in files:
+            with file:
+                add_stat_counters(file.cursor())
+
+    for file, journal_mode in zip(files, journal_modes):
+        file.execute('ANALYZE')
+        file.execute(f'PRAGMA journal_mode = {journal_mode}')
+        file.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'users': users,
+        'active_users': len(habit),
+        'progress_rows': len(row_owner),
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(len(row_owner) / elapsed, 1) if elapsed else 0.0
+    }
+
+# Online backup I/O budget: copy this many pages, then pause
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.05
+
+def backup_database(db_path='ilearnhow.db', backup_dir='.', pages_per_step=BACKUP_PAGES_PER_STEP,
+                    step_sleep=BACKUP_STEP_SLEEP, compress=False, keep=None):
+    """Create a consistent backup of the live database and its shards without blocking writers"""
+    import sharding
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_path = f'ilearnhow_backup_{timestamp}.db'
+    prefix = os.path.splitext(os.path.basename(db_path))[0]
+    backup_path = os.path.join(backup_dir, f'{prefix}_backup_{timestamp}.db')
+    os.makedirs(backup_dir, exist_ok=True)
+    
+    # Shard backups sit beside the main one under the names its storage_layout expects:
+    # ilearnhow_backup_<stamp>.db + ilearnhow_backup_<stamp>.shard0of4.db ...
+    shard_paths = [path for path in sharding.user_data_paths(db_path) if path != db_path]
+    copies = [(db_path, backup_path)] + [
+        (path, sharding.shard_path(backup_path, index, len(shard_paths)))
+        for index, path in enumerate(shard_paths)
+    ]
     
-    shutil.copy2(db_path, backup_path)
-    print(f"✅ Database backed up: {backup_path}")
+    def throttle(status, remaining, total):
+        # Rate-limits the copy's I/O; the snapshot stays pinned across the pause
+        time.sleep(step_sleep)
+    
+    sources = []
+    partial_paths = []
+    try:
+        # A step that opens its own read transaction restarts the copy whenever
+        # another connection has committed since the last step, so under steady
+        # writes it never finishes. One read transaction per file for the whole
+        # copy keeps every step on the same snapshot; in WAL mode it does not
+        # block writers. All files are pinned up front so the set is near-simultaneous.
+        for source_path, _ in copies:
+            source = sqlite3.connect(source_path, isolation_level=None)
+            sources.append(source)
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        
+        for source, (_, target_path) in zip(sources, copies):
+            partial_paths.append(target_path + '.partial')
+            target = sqlite3.connect(partial_paths[-1])
+            try:
+                source.backup(target, pages=pages_per_step, progress=throttle)
+                # The copy inherits WAL mode; a backup should be one self-contained file
+                target.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                target.close()
+            source.execute('COMMIT')
+    except BaseException:
+        for partial_path in partial_paths:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        raise
+    finally:
+        for source in sources:
+            source.close()
+    
+    final_paths = [target_path for _, target_path in copies]
+    if compress:
+        import gzip
+        import shutil
+        for index, partial_path in enumerate(partial_paths):
+            packed_path = final_paths[index] + '.gz.partial'
+            with open(partial_path, 'rb') as raw, gzip.open(packed_path, 'wb') as packed:
+                shutil.copyfileobj(raw, packed, 1024 * 1024)
+            os.remove(partial_path)
+            partial_paths[index] = packed_path
+            final_paths[index] += '.gz'
+    
+    # Only complete backups ever carry the final name; the main file goes last
+    for partial_path, final_path in reversed(list(zip(partial_paths, final_paths))):
+        os.replace(partial_path, final_path)
+    backup_path = final_paths[0]
+    print(f"✅ Database backed up: {backup_path}" +
+          (f" (+{len(shard_paths)} shard files)" if shard_paths else ""))
+    
+    if keep:
+        rotate_backups(db_path, backup_dir, keep)
     return backup_path
 
+def rotate_backups(db_path='ilearnhow.db', backup_dir='.', keep=7):
+    """Delete all but the newest `keep` backup sets of db_path; returns the removed paths"""
+    prefix = os.path.splitext(os.path.basename(db_path))[0] + '_backup_'
+    # A set is the main backup plus its shard files, all sharing one timestamp
+    backup_sets = {}
+    for name in os.listdir(backup_dir):
+        if name.startswith(prefix) and name.endswith(('.db', '.db.gz')):
+            backup_sets.setdefault(name[len(prefix):].split('.')[0], []).append(name)
+    removed = []
+    for stamp in sorted(backup_sets)[:-keep]:
+        for name in sorted(backup_sets[stamp]):
+            path = os.path.join(backup_dir, name)
+            os.remove(path)
+            removed.append(path)
+            print(f"🗑️  Rotated out old backup: {path}")
+    return removed
+
 def reset_database(db_path='ilearnhow.db'):
     """Reset database (delete and recreate)"""
     if os.path.exists(db_path):
@@ -242,53 +417,79 @@ def reset_database(db_path='ilearnhow.db'):
     print("✅ Database reset complete")
 
 def get_database_stats(db_path='ilearnhow.db'):
-    """Get database statistics"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    stats = {}
-    
-    # Count users
-    cursor.execute('SELECT COUNT(*) FROM users')
-    stats['users'] = cursor.fetchone()[0]
-    
-    # Count lesson progress entries
-    cursor.execute('SELECT COUNT(*) FROM lesson_progress')
-    stats['progress_entries'] = cursor.fetchone()[0]
-    
-    # Count habit formation entries
-    cursor.execute('SELECT COUNT(*) FROM habit_formation')
-    stats['habit_entries'] = cursor.fetchone()[0]
-    
-    # Count lesson variants
-    cursor.execute('SELECT COUNT(*) FROM lesson_variants')
-    stats['variants'] = cursor.fetchone()[0]
-    
-    # Get average streak
-    cursor.execute('SELECT AVG(streak_days) FROM habit_formation')
-    avg_streak = cursor.fetchone()[0]
-    stats['average_streak'] = round(avg_streak, 1) if avg_streak else 0
+    """Get database statistics from the trigger-maintained counters"""
+    import sharding
+    
+    # Each file counts its own rows; shards hold the per-user tables
+    paths = [db_path] + [path for path in sharding.user_data_paths(db_path) if path != db_path]
+    counters = {}
+    completions_today = 0
+    for path in paths:
+        conn = sqlite3.connect(path)
+        for name, value in conn.execute('SELECT name, value FROM stat_counters'):
+            counters[name] = counters.get(name, 0) + value
+        today = conn.execute(
+            "SELECT completions FROM daily_completions WHERE day = date('now')"
+        ).fetchone()
+        completions_today += today[0] if today else 0
+        conn.close()
     
-    conn.close()
-    return stats
+    habit_entries = counters.get('habit_entries', 0)
+    return {
+        'users': counters.get('users', 0),
+        'progress_entries': counters.get('progress_entries', 0),
+        'habit_entries': habit_entries,
+        'variants': counters.get('variants', 0),
+        'completions': counters.get('completions', 0),
+        'completions_today': completions_today,
+        'average_streak': round(counters.get('streak_days_total', 0) / habit_entries, 1)
+                          if habit_entries else 0
+    }
 
 if __name__ == '__main__':
     """Run database setup"""
+    import argparse
+    parser = argparse.ArgumentParser(description='Set up the iLearnHow database')
+    parser.add_argument('--db', default='ilearnhow.db', help='database path')
+    parser.add_argument('--seed', action='store_true', help='add the two demo users')
+    parser.add_argument('--synthetic', type=int, metavar='USERS',
+                        help='bulk-load this many synthetic users for capacity testing')
+    parser.add_argument('--days', type=int, default=366, help='days of synthetic history')
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--backup', action='store_true', help='take an online backup and exit')
+    parser.add_argument('--backup-dir', default='.')
+    parser.add_argument('--compress', action='store_true', help='gzip the backup')
+    parser.add_argument('--keep', type=int, help='backups to retain after rotation')
+    parser.add_argument('--pages-per-step', type=int, default=BACKUP_PAGES_PER_STEP)
+    parser.add_argument('--step-sleep', type=float, default=BACKUP_STEP_SLEEP,
+                        help='seconds to pause between backup steps')
+    args = parser.parse_args()
+    
+    if args.backup:
+        backup_database(args.db, args.backup_dir, args.pages_per_step, args.step_sleep,
+                        args.compress, args.keep)
+        raise SystemExit(0)
+    
     print("🔧 Setting up iLearnHow database...")
     
     # Initialize database
-    init_database()
-    create_migration_table()
+    init_database(args.db)
+    create_migration_table(args.db)
     
     # Seed test data (optional)
-    import sys
-    if len(sys.argv) > 1 and sys.argv[1] == '--seed':
-        seed_test_data()
+    if args.seed:
+        seed_test_data(args.db)
+    
+    # Synthetic capacity-test data (optional)
+    if args.synthetic:
+        summary = generate_synthetic_data(args.db, args.synthetic, args.days, args.random_seed)
+        print(f"✅ {summary['progress_rows']:,} progress rows for {summary['users']:,} users in "
+              f"{summary['seconds']}s ({summary['rows_per_second']:,.0f} rows/sec)")
     
     # Show stats
-    stats = get_database_stats()
+    stats = get_database_stats(args.db)
     print("\n📊 Database Statistics:")
     for key, value in stats.items():
         print(f"  {key}: {value}")
     
-    print("\n✅ Database setup complete!") 
\ No newline at end of file
+    print("\n✅ Database setup complete!")
@@ -0,0 +1,131 @@
+"""
+iLearnHow SQLite Connection Pool
+Reusable WAL-mode connections shared across requests and worker threads
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Pragmas applied to every connection we hand out
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),       # readers never block behind the writer
+    ('synchronous', 'NORMAL'),     # WAL-safe, fsync only at checkpoints
+    ('cache_size', -20000),        # ~20 MB page cache per connection
+    ('mmap_size', 268435456),      # 256 MB of memory-mapped reads
+    ('busy_timeout', 5000),        # wait up to 5s for the write lock
+    ('temp_store', 'MEMORY'),
+)
+
+# Compiled statements kept per connection (sqlite3 reuses them by SQL text)
+STATEMENT_CACHE_SIZE = 256
+
+DEFAULT_POOL_SIZE = 8
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+def connect(db_path, pragmas=CONNECTION_PRAGMAS):
+    """Open a tuned SQLite connection"""
+    conn = sqlite3.connect(
+        db_path,
+        timeout=5.0,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE
+    )
+    conn.row_factory = sqlite3.Row
+    for name, value in pragmas:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived connections to one database file"""
+
+    def __init__(self, db_path, max_size=DEFAULT_POOL_SIZE, acquire_timeout=10.0):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.pid = os.getpid()
+        # LIFO keeps the hottest connections (and their page caches) in use
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def acquire(self):
+        """Check out a connection, opening a new one while under max_size"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return connect(self.db_path)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f'No database connection free after {self.acquire_timeout}s'
+            )
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """Close a broken connection and free its slot"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """Context-managed checkout that always returns the connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def stats(self):
+        """Pool occupancy snapshot"""
+        idle = self._idle.qsize()
+        return {
+            'size': self._created,
+            'idle': idle,
+            'in_use': self._created - idle,
+            'max_size': self.max_size
+        }
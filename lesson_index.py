@@ -0,0 +1,289 @@
+"""
+iLearnHow Lesson Index
+Resolves lesson content for a day and variant from the JSON lesson sources
+
+Everything is parsed once at startup into flat lookup tables:
+day -> Lesson, and per lesson (age_group, tone, field) -> text.
+Rendered variant payloads are memoized in an LRU cache.
+"""
+
+import functools
+import glob
+import hashlib
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# Variant dimensions offered to the player
+AGE_GROUPS = ['age_2', 'age_5', 'age_8', 'age_12', 'age_16', 'age_25', 'age_40', 'age_60', 'age_80', 'age_102']
+TONES = ['grandmother', 'fun', 'neutral']
+LANGUAGES = ['english', 'spanish', 'french', 'german', 'chinese', 'japanese']
+AVATARS = ['kelly', 'ken']
+
+# Matches the user_preferences column defaults
+DEFAULT_AGE_GROUP = 'age_25'
+DEFAULT_TONE = 'neutral'
+DEFAULT_LANGUAGE = 'english'
+
+PHASE_TYPES = {1: 'welcome', 2: 'question_1', 3: 'question_2', 4: 'question_3', 5: 'daily_fortune'}
+
+# Loaded in increasing precedence: a later file replaces an earlier one for the same day
+LESSON_SOURCES = ('lessons/*.json', 'dna-templates/*.json', 'data/*_normalized.json')
+CURRICULUM_SOURCE = 'data/*_curriculum.json'
+
+RENDER_CACHE_SIZE = 4096
+
+# A payload serialized once, with the content hash used as its ETag
+EncodedPayload = namedtuple('EncodedPayload', ['body', 'etag'])
+
+
+def encode_payload(payload):
+    """Serialize deterministically and hash the bytes"""
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return EncodedPayload(body, hashlib.sha256(body).hexdigest()[:32])
+
+
+class Lesson:
+    """One day's content flattened to (age_group, tone, field) -> text"""
+
+    __slots__ = ('day', 'lesson_id', 'title', 'source', 'texts', 'phrases')
+
+    def __init__(self, day, lesson_id, title, source):
+        self.day = day
+        self.lesson_id = lesson_id
+        self.title = title
+        self.source = source
+        self.texts = {}
+        self.phrases = {}
+
+    def text(self, age_group, tone, field):
+        """Most specific text for a field, falling back to age- or tone-neutral copies"""
+        texts = self.texts
+        for key in ((age_group, tone, field), (age_group, None, field),
+                    (None, tone, field), (None, None, field)):
+            if key in texts:
+                return texts[key]
+        return None
+
+
+def load_dna_lesson(data, source):
+    """Flatten a DNA template (lesson_metadata / age_expressions / ...)"""
+    metadata = data['lesson_metadata']
+    lesson = Lesson(metadata.get('day'), metadata.get('lesson_id'), None, source)
+    texts = lesson.texts
+
+    for age, expression in data.get('age_expressions', {}).items():
+        age_group = f'age_{age}'
+        for tone, concept in expression.get('concept_name', {}).items():
+            texts[(age_group, tone, 'concept_name')] = concept.get('display_text')
+            texts[(age_group, tone, 'concept_name.voice')] = concept.get('voice_over_script')
+
+    for number in (1, 2, 3):
+        field = f'question_{number}'
+        question = data.get('core_lesson_structure', {}).get(field, {})
+        for age, content in question.get('ages', {}).items():
+            age_group = f'age_{age}'
+            for tone, text in content.get('question', {}).items():
+                texts[(age_group, tone, field)] = text.get('display_text')
+            for option in ('option_a', 'option_b'):
+                if option in content:
+                    texts[(age_group, None, f'{field}.{option}')] = content[option].get('display_text')
+            for key, response in content.get('teaching_moments', {}).items():
+                texts[(age_group, None, f'{field}.{key}')] = response
+            if 'correct_option' in content:
+                texts[(age_group, None, f'{field}.correct_option')] = content['correct_option']
+
+    for tone, fortune in data.get('wisdom_phase_content', {}).get('fortune', {}).items():
+        texts[(None, tone, 'fortune')] = fortune.get('display_text')
+        texts[(None, tone, 'fortune.voice')] = fortune.get('voice_over_script')
+
+    for tone, delivery in data.get('tone_delivery_dna', {}).items():
+        patterns = delivery.get('language_patterns', {})
+        for key, field in (('openings', 'opening'), ('encouragements', 'encouragement'),
+                           ('closings', 'closing')):
+            if patterns.get(key):
+                texts[(None, tone, field)] = patterns[key][0]
+
+    for language, translation in data.get('language_translations', {}).items():
+        lesson.phrases[language] = translation.get('key_phrases', {})
+
+    return lesson
+
+
+def load_phased_lesson(data, source):
+    """Flatten a phased lesson (day / title / phases with age_adaptations)"""
+    phases = data['phases']
+    if not isinstance(phases, dict) or set(phases) != {'1', '2', '3', '4', '5'}:
+        raise ValueError('expected phases 1-5 keyed by number')
+
+    lesson = Lesson(data.get('day'), None, data.get('title'), source)
+    texts = lesson.texts
+
+    def add_phase(age_group, number, phase):
+        content = phase.get('content')
+        if number == 1 and isinstance(content, dict):
+            welcome = ' '.join(filter(None, [content.get('welcome_message'), content.get('lesson_preview')]))
+            texts[(age_group, None, 'welcome')] = welcome
+        elif number in (2, 3, 4):
+            field = f'question_{number - 1}'
+            if isinstance(content, str):
+                texts[(age_group, None, field)] = content
+            for option, choice in (phase.get('choices') or {}).items():
+                texts[(age_group, None, f'{field}.{option}')] = choice.get('text')
+                texts[(age_group, None, f'{field}.{option}_response')] = choice.get('teaching_moment')
+        elif number == 5 and isinstance(content, dict):
+            texts[(age_group, None, 'fortune')] = content.get('daily_fortune')
+
+    for key, phase in phases.items():
+        number = int(key)
+        add_phase(None, number, phase)
+        for age_group, adaptation in (phase.get('age_adaptations') or {}).items():
+            add_phase(age_group, number, adaptation)
+
+    return lesson
+
+
+def load_lesson(path):
+    """Parse one lesson file in whichever format it uses"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if 'lesson_metadata' in data:
+        return load_dna_lesson(data, path)
+    return load_phased_lesson(data, path)
+
+
+class LessonIndex:
+    """In-memory index of every lesson and its rendered variants"""
+
+    def __init__(self, lessons, curriculum, cache_size=RENDER_CACHE_SIZE, content_modified=None):
+        self.lessons = lessons
+        self.curriculum = curriculum
+        # Newest source file; serves as Last-Modified for every payload
+        self.content_modified = content_modified or datetime.now(timezone.utc)
+        # Memoized per (day, age_group, tone, language); payloads are shared, never mutate them
+        self.render = functools.lru_cache(maxsize=cache_size)(self._render)
+        self.render_encoded = functools.lru_cache(maxsize=cache_size)(self._render_encoded)
+
+    @classmethod
+    def from_directory(cls, root, cache_size=RENDER_CACHE_SIZE, quiet=False):
+        """Load all lesson and curriculum sources below root"""
+        lessons = {}
+        newest = 0
+        for pattern in LESSON_SOURCES:
+            for path in sorted(glob.glob(os.path.join(root, pattern))):
+                newest = max(newest, os.path.getmtime(path))
+                try:
+                    lesson = load_lesson(path)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    if not quiet:
+                        print(f"⚠️  Skipping lesson source {path}: {e}")
+                    continue
+                if isinstance(lesson.day, int) and 1 <= lesson.day <= 366:
+                    replaced = lessons.get(lesson.day)
+                    if replaced is not None and not quiet:
+                        print(f"⚠️  Day {lesson.day} is claimed by both {replaced.source} and "
+                              f"{lesson.source}; serving {lesson.source}")
+                    lessons[lesson.day] = lesson
+
+        curriculum = {}
+        for path in sorted(glob.glob(os.path.join(root, CURRICULUM_SOURCE))):
+            newest = max(newest, os.path.getmtime(path))
+            with open(path, encoding='utf-8') as f:
+                for entry in json.load(f).get('days', []):
+                    curriculum[entry['day']] = entry
+
+        content_modified = datetime.fromtimestamp(int(newest), timezone.utc) if newest else None
+        return cls(lessons, curriculum, cache_size, content_modified)
+
+    def _render_encoded(self, day, age_group, tone, language):
+        """Serialized variant payload and its ETag, or None"""
+        payload = self.render(day, age_group, tone, language)
+        return encode_payload(payload) if payload is not None else None
+
+    @functools.cached_property
+    def curriculum_encoded(self):
+        """The full-year curriculum, serialized once"""
+        return encode_payload({
+            'days': [dict(self.curriculum[day], content_available=day in self.lessons)
+                     for day in sorted(self.curriculum)]
+        })
+
+    def _render(self, day, age_group, tone, language):
+        """Build the full payload for one variant, or None if the day has no content"""
+        lesson = self.lessons.get(day)
+        entry = self.curriculum.get(day)
+        if lesson is None and entry is None:
+            return None
+
+        payload = {
+            'day': day,
+            'title': (lesson.title if lesson and lesson.title
+                      else entry['title'] if entry else lesson.lesson_id),
+            'learning_objective': entry.get('learning_objective') if entry else None,
+            'date': entry.get('date') if entry else None,
+            'variant': {'age_group': age_group, 'tone': tone, 'language': language},
+            'variants': {'age_groups': AGE_GROUPS, 'tones': TONES, 'languages': LANGUAGES}
+        }
+
+        if lesson is None:
+            # Scheduled in the curriculum but not authored yet
+            payload['content_status'] = 'curriculum_only'
+            payload['phases'] = {}
+            return payload
+
+        def text(field):
+            return lesson.text(age_group, tone, field)
+
+        # Untranslated languages keep the English framing phrases
+        phrases = lesson.phrases.get(language) or lesson.phrases.get('english', {})
+
+        phases = {
+            1: {
+                'type': PHASE_TYPES[1],
+                'content': ' '.join(filter(None, [
+                    phrases.get('greeting'), text('opening'), text('welcome')
+                ])),
+                'concept_name': text('concept_name'),
+                'voice_over': text('concept_name.voice')
+            }
+        }
+        for number in (2, 3, 4):
+            field = f'question_{number - 1}'
+            phases[number] = {
+                'type': PHASE_TYPES[number],
+                'question_intro': phrases.get('question_intro'),
+                'content': text(field),
+                'choices': [text(f'{field}.option_a'), text(f'{field}.option_b')],
+                'correct_option': text(f'{field}.correct_option'),
+                'teaching_moments': {
+                    'option_a': text(f'{field}.option_a_response'),
+                    'option_b': text(f'{field}.option_b_response')
+                }
+            }
+        phases[5] = {
+            'type': PHASE_TYPES[5],
+            'content': text('fortune'),
+            'voice_over': text('fortune.voice'),
+            'closing': text('closing')
+        }
+
+        for phase in phases.values():
+            for key in [key for key, value in phase.items() if value is None]:
+                del phase[key]
+
+        payload['lesson_id'] = lesson.lesson_id
+        payload['content_status'] = 'available'
+        payload['phases'] = phases
+        return payload
+
+    def stats(self):
+        """Index size and render cache counters"""
+        info = self.render.cache_info()
+        return {
+            'lessons': len(self.lessons),
+            'curriculum_days': len(self.curriculum),
+            'render_cache_hits': info.hits,
+            'render_cache_misses': info.misses,
+            'render_cache_size': info.currsize
+        }
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+iLearnHow Lesson Variant Materializer
+Pre-renders every (day, age_group, tone, language, avatar, phase) row of lesson_variants
+
+Rendering fans out over a process pool, one work unit per (day, age_group).
+Rows stream back into SQLite through chunked executemany calls inside large
+transactions. Each finished unit is checkpointed in the same transaction as
+its rows, so an interrupted run resumes where it stopped:
+    python materialize_variants.py --db ilearnhow.db [--workers 8] [--days 1-31]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import db_pool
+from lesson_index import LessonIndex, AGE_GROUPS, TONES, LANGUAGES, AVATARS
+from migrations import migrate
+
+DEFAULT_CHUNK_ROWS = 5000
+DEFAULT_TRANSACTION_ROWS = 100000
+
+VARIANT_UPSERT_SQL = '''
+    INSERT INTO lesson_variants
+    (lesson_day, age_group, tone, language, avatar, phase, content, choices)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(lesson_day, age_group, tone, language, avatar, phase) DO UPDATE SET
+        content = excluded.content,
+        choices = excluded.choices
+'''
+
+CHECKPOINT_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS variant_materialization (
+        lesson_day INTEGER NOT NULL,
+        age_group TEXT NOT NULL,
+        content_version TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (lesson_day, age_group)
+    )
+'''
+
+CHECKPOINT_UPSERT_SQL = '''
+    INSERT INTO variant_materialization (lesson_day, age_group, content_version, row_count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(lesson_day, age_group) DO UPDATE SET
+        content_version = excluded.content_version,
+        row_count = excluded.row_count,
+        completed_at = CURRENT_TIMESTAMP
+'''
+
+# Each worker process keeps its own index for the whole run
+_worker_index = None
+
+def _init_worker(root):
+    global _worker_index
+    _worker_index = LessonIndex.from_directory(root, quiet=True)
+
+def expand_unit(unit):
+    """Render every variant row for one (day, age_group)"""
+    day, age_group = unit
+    rows = []
+    for tone in TONES:
+        for language in LANGUAGES:
+            payload = _worker_index.render(day, age_group, tone, language)
+            for phase_number, phase in payload['phases'].items():
+                content = phase.get('content') or ''
+                choices = json.dumps(phase.get('choices', []))
+                for avatar in AVATARS:
+                    rows.append((day, age_group, tone, language, avatar,
+                                 phase_number, content, choices))
+    return unit, rows
+
+def parse_days(spec):
+    """'1-31,60' -> {1, ..., 31, 60}"""
+    days = set()
+    for part in spec.split(','):
+        start, _, end = part.partition('-')
+        days.update(range(int(start), int(end or start) + 1))
+    return days
+
+def pending_units(conn, index, content_version, days=None):
+    """Work units not yet materialized for this content version"""
+    done = {
+        (row[0], row[1])
+        for row in conn.execute(
+            'SELECT lesson_day, age_group FROM variant_materialization WHERE content_version = ?',
+            (content_version,)
+        )
+    }
+    return [
+        (day, age_group)
+        for day in sorted(index.lessons)
+        if days is None or day in days
+        for age_group in AGE_GROUPS
+        if (day, age_group) not in done
+    ]
+
+def materialize(db_path, root, workers=None, days=None, chunk_rows=DEFAULT_CHUNK_ROWS,
+                transaction_rows=DEFAULT_TRANSACTION_ROWS, restart=False, report=print):
+    """Materialize all pending variants; returns a summary dict"""
+    index = LessonIndex.from_directory(root, quiet=True)
+    content_version = index.content_modified.isoformat()
+
+    conn = db_pool.connect(db_path)
+    # lesson_variants comes from the migrations; a fresh file has none of it yet
+    migrate(conn)
+    conn.execute(CHECKPOINT_TABLE_SQL)
+    if restart:
+        conn.execute('DELETE FROM variant_materialization')
+    conn.commit()
+
+    units = pending_units(conn, index, content_version, days)
+    if not units:
+        conn.close()
+        return {'units': 0, 'rows': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+
+    started = time.perf_counter()
+    total_rows = 0
+    batch = []
+    finished_units = []
+    rows_in_transaction = 0
+
+    def commit():
+        nonlocal rows_in_transaction
+        if batch:
+            conn.executemany(VARIANT_UPSERT_SQL, batch)
+            batch.clear()
+        conn.executemany(CHECKPOINT_UPSERT_SQL, finished_units)
+        conn.commit()
+        finished_units.clear()
+        rows_in_transaction = 0
+        elapsed = time.perf_counter() - started
+        report(f"  💾 {total_rows:,} rows committed ({total_rows / elapsed:,.0f} rows/sec)")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(root,)) as executor:
+        for (day, age_group), rows in executor.map(expand_unit, units, chunksize=4):
+            batch.extend(rows)
+            if len(batch) >= chunk_rows:
+                conn.executemany(VARIANT_UPSERT_SQL, batch)
+                batch.clear()
+            total_rows += len(rows)
+            rows_in_transaction += len(rows)
+            finished_units.append((day, age_group, content_version, len(rows)))
+            if rows_in_transaction >= transaction_rows:
+                commit()
+        commit()
+
+    conn.close()
+    elapsed = time.perf_counter() - started
+    return {
+        'units': len(units),
+        'rows': total_rows,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(total_rows / elapsed, 1) if elapsed else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-render lesson variants into lesson_variants')
+    parser.add_argument('--db', default='ilearnhow.db', help='database path')
+    parser.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directory holding lessons/, dna-templates/ and data/')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--days', type=parse_days, help='e.g. 1-31,60 (default: every authored day)')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--transaction-rows', type=int, default=DEFAULT_TRANSACTION_ROWS)
+    parser.add_argument('--restart', action='store_true', help='ignore checkpoints and redo everything')
+    args = parser.parse_args()
+
+    print(f"🔧 Materializing lesson variants into {args.db} with {args.workers} workers...")
+    summary = materialize(
+        args.db, args.root, workers=args.workers, days=args.days,
+        chunk_rows=args.chunk_rows, transaction_rows=args.transaction_rows,
+        restart=args.restart
+    )
+
+    if not summary['units']:
+        print("⏭️  Nothing to do: every variant is already materialized")
+        return
+    print(f"\n✅ {summary['rows']:,} rows from {summary['units']} units in "
+          f"{summary['seconds']}s ({summary['rows_per_second']:,.0f} rows/sec)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+iLearnHow Metrics
+Request latency histograms and Prometheus text exposition
+
+Histograms are per worker process, like the caches; scrape each worker
+(or aggregate in Prometheus) to see the whole fleet.
+"""
+
+import threading
+
+# Seconds; tuned for API calls that are usually a few milliseconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label_value(value):
+    """Escape backslashes, quotes and newlines as the text format requires"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """{'a': 'x'} -> '{a="x"}'"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+def metric_family(name, metric_type, help_text, samples):
+    """Exposition lines for one metric; samples are (labels dict, value) pairs"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+    for labels, value in samples:
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    return lines
+
+
+class LatencyHistogram:
+    """Thread-safe cumulative histogram with one series per label set"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, seconds):
+        """Record one duration for the series identified by label_values"""
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def exposition(self):
+        """Prometheus text lines for every series"""
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(snapshot.items()):
+            labels = dict(zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{format_labels(dict(labels, le=repr(bound)))} {count}')
+            lines.append(f'{self.name}_bucket{format_labels(dict(labels, le="+Inf"))} {series[-2]}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {series[-2]}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {series[-1]:.6f}')
+        return lines
@@ -0,0 +1,335 @@
+"""
+iLearnHow Schema Migrations
+Ordered, transactional schema changes shared by app.py and database.py
+
+Each migration runs inside its own BEGIN IMMEDIATE transaction together with
+the row recording it in the migrations table, so a failed step leaves no
+partial schema behind and concurrent workers apply it exactly once.
+Append new migrations to MIGRATIONS with the next version number.
+"""
+
+from collections import namedtuple
+
+# `apply` is a list of SQL statements or a function taking a cursor
+Migration = namedtuple('Migration', ['version', 'name', 'apply'])
+
+MIGRATIONS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS migrations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        migration_name TEXT UNIQUE NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+INITIAL_SCHEMA = [
+    # Users table
+    '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            preferences TEXT DEFAULT '{}'
+        )
+    ''',
+    # Lesson progress table (for 5-phase system)
+    '''
+        CREATE TABLE IF NOT EXISTS lesson_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            lesson_day INTEGER NOT NULL,
+            phase INTEGER NOT NULL,
+            completed BOOLEAN DEFAULT FALSE,
+            answers TEXT DEFAULT '[]',
+            time_spent INTEGER DEFAULT 0,
+            completed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            change_seq INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE(user_id, lesson_day, phase)
+        )
+    ''',
+    # User sessions table
+    '''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_id TEXT UNIQUE NOT NULL,
+            streak_days INTEGER DEFAULT 0,
+            last_lesson_day INTEGER,
+            total_lessons_completed INTEGER DEFAULT 0,
+            total_time_spent INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''',
+    # Habit formation table
+    '''
+        CREATE TABLE IF NOT EXISTS habit_formation (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            streak_days INTEGER DEFAULT 0,
+            longest_streak INTEGER DEFAULT 0,
+            current_streak_start DATE,
+            last_activity_date DATE,
+            daily_goal_met BOOLEAN DEFAULT FALSE,
+            weekly_goal_met BOOLEAN DEFAULT FALSE,
+            monthly_goal_met BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''',
+    # Lesson variants table (for 3,285 variants per lesson)
+    '''
+        CREATE TABLE IF NOT EXISTS lesson_variants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lesson_day INTEGER NOT NULL,
+            age_group TEXT NOT NULL,
+            tone TEXT NOT NULL,
+            language TEXT NOT NULL,
+            avatar TEXT NOT NULL,
+            phase INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            choices TEXT DEFAULT '[]',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(lesson_day, age_group, tone, language, avatar, phase)
+        )
+    ''',
+    # User preferences table
+    '''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            age_group TEXT DEFAULT 'age_25',
+            tone TEXT DEFAULT 'neutral',
+            language TEXT DEFAULT 'english',
+            avatar TEXT DEFAULT 'kelly',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''',
+]
+
+def add_progress_change_cursor(cursor):
+    """Add the per-user change cursor used for delta progress sync"""
+    cursor.execute('PRAGMA table_info(lesson_progress)')
+    columns = {row[1] for row in cursor.fetchall()}
+    
+    # Databases created before delta sync lack the cursor columns
+    if 'updated_at' not in columns:
+        cursor.execute('ALTER TABLE lesson_progress ADD COLUMN updated_at TIMESTAMP')
+    if 'change_seq' not in columns:
+        cursor.execute('ALTER TABLE lesson_progress ADD COLUMN change_seq INTEGER')
+    
+    # Row ids are already monotonic, so they make a valid starting cursor
+    cursor.execute('''
+        UPDATE lesson_progress
+        SET change_seq = id, updated_at = COALESCE(updated_at, created_at)
+        WHERE change_seq IS NULL
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lesson_progress_user_change
+        ON lesson_progress (user_id, change_seq)
+    ''')
+    
+    # Every write bumps the row to the user's next sequence number.
+    # Bulk loaders may supply change_seq themselves to skip the trigger.
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS lesson_progress_change_seq_insert
+        AFTER INSERT ON lesson_progress
+        WHEN NEW.change_seq IS NULL
+        BEGIN
+            UPDATE lesson_progress
+            SET change_seq = (
+                    SELECT COALESCE(MAX(change_seq), 0) + 1
+                    FROM lesson_progress WHERE user_id = NEW.user_id
+                ),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS lesson_progress_change_seq_update
+        AFTER UPDATE OF completed, answers, time_spent, completed_at ON lesson_progress
+        BEGIN
+            UPDATE lesson_progress
+            SET change_seq = (
+                    SELECT COALESCE(MAX(change_seq), 0) + 1
+                    FROM lesson_progress WHERE user_id = NEW.user_id
+                ),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.id;
+        END
+    ''')
+
+# Lookups by user_id were full scans. users.email needs no index of its own:
+# its UNIQUE constraint already created sqlite_autoindex_users_2.
+HOT_PATH_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_habit_formation_user ON habit_formation (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_user_preferences_user ON user_preferences (user_id)',
+]
+
+# Aggregates kept current by triggers so stats and /metrics never scan a table.
+# Each entry: counter name, table, and the amount a row contributes.
+COUNTED_TABLES = [
+    ('users', 'users', '1'),
+    ('progress_entries', 'lesson_progress', '1'),
+    ('habit_entries', 'habit_formation', '1'),
+    ('variants', 'lesson_variants', '1'),
+    ('streak_days_total', 'habit_formation', 'COALESCE({row}.streak_days, 0)'),
+]
+
+def add_stat_counters(cursor):
+    """Counter tables, their triggers, and a one-time backfill"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_completions (
+            day DATE PRIMARY KEY,
+            completions INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    
+    for name, table, amount in COUNTED_TABLES:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO stat_counters (name, value) "
+            f"SELECT '{name}', COALESCE(SUM({amount.format(row=table)}), 0) FROM {table}"
+        )
+        for event, row, sign in (('INSERT', 'NEW', '+'), ('DELETE', 'OLD', '-')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS stat_{name}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE stat_counters SET value = value {sign} {amount.format(row=row)}
+                    WHERE name = '{name}';
+                END
+            ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS stat_streak_days_total_update
+        AFTER UPDATE OF streak_days ON habit_formation
+        BEGIN
+            UPDATE stat_counters
+            SET value = value + COALESCE(NEW.streak_days, 0) - COALESCE(OLD.streak_days, 0)
+            WHERE name = 'streak_days_total';
+        END
+    ''')
+    
+    # A completion is a phase row becoming completed, counted on the day it happened
+    cursor.execute('DELETE FROM daily_completions')
+    cursor.execute('''
+        INSERT OR REPLACE INTO daily_completions (day, completions)
+        SELECT date(COALESCE(completed_at, updated_at, created_at)), COUNT(*)
+        FROM lesson_progress WHERE completed
+        GROUP BY 1
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO stat_counters (name, value)
+        SELECT 'completions', COALESCE(SUM(completions), 0) FROM daily_completions
+    ''')
+    for event, condition in (('INSERT', 'NEW.completed'),
+                             ('UPDATE OF completed', 'NEW.completed AND NOT OLD.completed')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS stat_completions_{event.split()[0].lower()}
+            AFTER {event} ON lesson_progress
+            WHEN {condition}
+            BEGIN
+                INSERT INTO daily_completions (day, completions)
+                VALUES (date(COALESCE(NEW.completed_at, datetime('now', 'localtime'))), 1)
+                ON CONFLICT(day) DO UPDATE SET completions = completions + 1;
+                UPDATE stat_counters SET value = value + 1 WHERE name = 'completions';
+            END
+        ''')
+
+def drop_stat_triggers(cursor):
+    """Remove the counter triggers ahead of a bulk load; add_stat_counters restores them"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stat!_%' ESCAPE '!'")
+    for (name,) in cursor.fetchall():
+        cursor.execute(f'DROP TRIGGER {name}')
+
+# Shard count for the per-user tables; see sharding.py
+STORAGE_LAYOUT = [
+    '''
+        CREATE TABLE IF NOT EXISTS storage_layout (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            shard_count INTEGER NOT NULL DEFAULT 1
+        )
+    ''',
+    'INSERT OR IGNORE INTO storage_layout (id, shard_count) VALUES (1, 1)',
+]
+
+# Lets session_sweeper.py find expired sessions without scanning the table
+SESSION_SWEEP_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_user_sessions_updated ON user_sessions (updated_at)',
+]
+
+MIGRATIONS = [
+    Migration(1, 'initial_schema', INITIAL_SCHEMA),
+    Migration(2, 'progress_change_cursor', add_progress_change_cursor),
+    Migration(3, 'hot_path_indexes', HOT_PATH_INDEXES),
+    Migration(4, 'stat_counters', add_stat_counters),
+    Migration(5, 'storage_layout', STORAGE_LAYOUT),
+    Migration(6, 'session_sweep_indexes', SESSION_SWEEP_INDEXES),
+]
+
+def migration_name(migration):
+    """Name recorded in the migrations table, e.g. 0002_progress_change_cursor"""
+    return f'{migration.version:04d}_{migration.name}'
+
+def applied_migrations(conn):
+    """Names of every migration already recorded"""
+    conn.execute(MIGRATIONS_TABLE_SQL)
+    conn.commit()
+    return {row[0] for row in conn.execute('SELECT migration_name FROM migrations')}
+
+def apply_migration(conn, name, apply):
+    """Run one migration atomically; returns False if it was already applied"""
+    # Take the write lock first so two workers cannot both apply it
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM migrations WHERE migration_name = ?', (name,))
+        if cursor.fetchone():
+            conn.rollback()
+            return False
+        
+        if callable(apply):
+            apply(cursor)
+        else:
+            for statement in apply:
+                cursor.execute(statement)
+        
+        cursor.execute('INSERT INTO migrations (migration_name) VALUES (?)', (name,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return True
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply every pending migration in version order; returns the names applied"""
+    versions = [migration.version for migration in migrations]
+    if versions != sorted(set(versions)):
+        raise ValueError('Migration versions must be unique and ascending')
+    
+    done = applied_migrations(conn)
+    applied = []
+    for migration in migrations:
+        name = migration_name(migration)
+        if name in done:
+            continue
+        if apply_migration(conn, name, migration.apply):
+            applied.append(name)
+    return applied
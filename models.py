@@ -4,10 +4,19 @@ SQLAlchemy models for user authentication, lesson progress, and habit formation
 """
 
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import UniqueConstraint, select, update, case, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, joinedload, selectinload
+from typing import Optional
 import json
+import os
+import threading
+
+import db_pool
 
 Base = declarative_base()
 
@@ -24,7 +33,8 @@ class User(Base):
     preferences = Column(Text, default='{}')
     
     # Relationships
-    progress = relationship("LessonProgress", back_populates="user")
+    progress = relationship("LessonProgress", back_populates="user",
+                            order_by="(LessonProgress.lesson_day, LessonProgress.phase)")
     sessions = relationship("UserSession", back_populates="user")
     habit = relationship("HabitFormation", back_populates="user", uselist=False)
     
@@ -39,6 +49,7 @@ class User(Base):
 class LessonProgress(Base):
     """Lesson progress tracking for 5-phase system"""
     __tablename__ = 'lesson_progress'
+    __table_args__ = (UniqueConstraint('user_id', 'lesson_day', 'phase'),)
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -97,129 +108,311 @@ class HabitFormation(Base):
     # Relationships
     user = relationship("User", back_populates="habit", uselist=False)
 
+# Plain, immutable copies of rows, safe to use after the session is gone
+@dataclass(frozen=True)
+class UserSnapshot:
+    id: int
+    username: str
+    email: Optional[str]
+    created_at: Optional[datetime]
+    last_login: Optional[datetime]
+    preferences: Optional[str]
+    
+    def get_preferences(self):
+        """Get user preferences as dict"""
+        return json.loads(self.preferences) if self.preferences else {}
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    id: int
+    user_id: int
+    lesson_day: int
+    phase: int
+    completed: bool
+    answers: str
+    time_spent: int
+    completed_at: Optional[datetime]
+    
+    def get_answers(self):
+        """Get answers as list"""
+        return json.loads(self.answers) if self.answers else []
+
+@dataclass(frozen=True)
+class HabitSnapshot:
+    user_id: int
+    streak_days: int
+    longest_streak: int
+    current_streak_start: Optional[datetime]
+    last_activity_date: Optional[datetime]
+    daily_goal_met: bool
+    weekly_goal_met: bool
+    monthly_goal_met: bool
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    user: UserSnapshot
+    habit: Optional[HabitSnapshot]
+    progress: list
+
+def snapshot(snapshot_class, row):
+    """Copy the snapshot's fields off an ORM object (None stays None)"""
+    if row is None:
+        return None
+    return snapshot_class(**{field.name: getattr(row, field.name) for field in fields(snapshot_class)})
+
 # Database setup functions
-def init_database(database_url="sqlite:///ilearnhow.db"):
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///ilearnhow.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', db_pool.DEFAULT_POOL_SIZE))
+
+_engines = {}
+_sessions = {}
+_engines_lock = threading.Lock()
+
+def create_shared_engine(database_url):
+    """Engine with a bounded pool and the same pragmas as the raw sqlite3 pool"""
+    if not database_url.startswith('sqlite'):
+        return create_engine(database_url, pool_size=DB_POOL_SIZE, pool_pre_ping=True)
+    
+    engine = create_engine(
+        database_url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_POOL_SIZE,
+        connect_args={'check_same_thread': False, 'timeout': 5.0}
+    )
+    
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in db_pool.CONNECTION_PRAGMAS:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    
+    return engine
+
+def get_engine(database_url=None):
+    """Process-wide engine for database_url, rebuilt after a fork"""
+    database_url = database_url or DATABASE_URL
+    with _engines_lock:
+        entry = _engines.get(database_url)
+        if entry is None or entry[0] != os.getpid():
+            # Forked workers must never share the parent's connections
+            if entry is not None:
+                entry[1].dispose(close=False)
+            entry = _engines[database_url] = (os.getpid(), create_shared_engine(database_url))
+            _sessions.pop(database_url, None)
+        return entry[1]
+
+def get_session_registry(database_url=None):
+    """Thread-local session registry bound to the shared engine"""
+    database_url = database_url or DATABASE_URL
+    engine = get_engine(database_url)
+    with _engines_lock:
+        registry = _sessions.get(database_url)
+        if registry is None:
+            # Objects keep their loaded values after commit instead of re-querying
+            registry = _sessions[database_url] = scoped_session(
+                sessionmaker(bind=engine, expire_on_commit=False)
+            )
+        return registry
+
+def dispose_engines():
+    """Close every pooled connection (tests, shutdown)"""
+    with _engines_lock:
+        for registry in _sessions.values():
+            registry.remove()
+        for _, engine in _engines.values():
+            engine.dispose()
+        _sessions.clear()
+        _engines.clear()
+
+def init_database(database_url=None):
     """Initialize database with all tables"""
-    engine = create_engine(database_url)
+    engine = get_engine(database_url)
     Base.metadata.create_all(engine)
     return engine
 
-def get_session(database_url="sqlite:///ilearnhow.db"):
-    """Get database session"""
-    engine = create_engine(database_url)
-    Session = sessionmaker(bind=engine)
-    return Session()
+def get_session(database_url=None):
+    """Get this thread's database session (call .close() or use session_scope)"""
+    return get_session_registry(database_url)()
+
+@contextmanager
+def session_scope(database_url=None):
+    """Unit of work: commit on success, roll back on error, always release the session"""
+    # A fresh session per unit of work, so scopes nest without sharing a transaction
+    session = get_session_registry(database_url).session_factory()
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
 # Model utility functions
-def create_user(username, password_hash, email=None):
+def create_user(username, password_hash, email=None, database_url=None):
     """Create a new user"""
-    from werkzeug.security import generate_password_hash
-    
-    session = get_session()
-    user = User(
-        username=username,
-        password_hash=password_hash,
-        email=email
-    )
-    session.add(user)
-    session.commit()
-    session.close()
-    return user
+    with session_scope(database_url) as session:
+        user = User(
+            username=username,
+            password_hash=password_hash,
+            email=email
+        )
+        session.add(user)
+        session.flush()
+        return snapshot(UserSnapshot, user)
 
-def get_user_by_username(username):
+def get_user_by_username(username, database_url=None):
     """Get user by username"""
-    session = get_session()
-    user = session.query(User).filter_by(username=username).first()
-    session.close()
-    return user
+    with session_scope(database_url) as session:
+        return snapshot(UserSnapshot, session.query(User).filter_by(username=username).first())
 
-def get_user_progress(user_id, lesson_day=None):
+def get_user_progress(user_id, lesson_day=None, database_url=None):
     """Get user's lesson progress"""
-    session = get_session()
-    query = session.query(LessonProgress).filter_by(user_id=user_id)
-    
-    if lesson_day:
-        query = query.filter_by(lesson_day=lesson_day)
-    
-    progress = query.order_by(LessonProgress.lesson_day, LessonProgress.phase).all()
-    session.close()
-    return progress
+    with session_scope(database_url) as session:
+        query = session.query(LessonProgress).filter_by(user_id=user_id)
+        
+        if lesson_day:
+            query = query.filter_by(lesson_day=lesson_day)
+        
+        progress = query.order_by(LessonProgress.lesson_day, LessonProgress.phase).all()
+        return [snapshot(ProgressSnapshot, row) for row in progress]
 
-def update_lesson_progress(user_id, lesson_day, phase, completed=False, answers=None, time_spent=0):
+def update_lesson_progress(user_id, lesson_day, phase, completed=False, answers=None, time_spent=0,
+                           database_url=None):
     """Update lesson progress"""
-    session = get_session()
-    
-    # Find existing progress or create new
-    progress = session.query(LessonProgress).filter_by(
-        user_id=user_id, 
-        lesson_day=lesson_day, 
-        phase=phase
-    ).first()
-    
-    if not progress:
-        progress = LessonProgress(
-            user_id=user_id,
-            lesson_day=lesson_day,
+    with session_scope(database_url) as session:
+        # Find existing progress or create new
+        progress = session.query(LessonProgress).filter_by(
+            user_id=user_id, 
+            lesson_day=lesson_day, 
             phase=phase
-        )
-        session.add(progress)
-    
-    # Update progress
-    progress.completed = completed
-    if answers:
-        progress.set_answers(answers)
-    progress.time_spent = time_spent
-    
-    if completed:
-        progress.completed_at = datetime.utcnow()
+        ).first()
+        
+        if not progress:
+            progress = LessonProgress(
+                user_id=user_id,
+                lesson_day=lesson_day,
+                phase=phase
+            )
+            session.add(progress)
+        
+        # Update progress
+        progress.completed = completed
+        if answers:
+            progress.set_answers(answers)
+        progress.time_spent = time_spent
+        
+        if completed:
+            progress.completed_at = datetime.utcnow()
+        
+        session.flush()
+        return snapshot(ProgressSnapshot, progress)
+
+# Rows per INSERT statement; keeps bound parameters well under SQLite's limit
+BULK_UPSERT_CHUNK = 500
+
+def bulk_upsert_progress(updates, database_url=None):
+    """Insert or update many progress rows with set-based INSERT ... ON CONFLICT DO UPDATE
+
+    `updates` are dicts with user_id, lesson_day, phase and optionally
+    completed, answers (list or JSON string) and time_spent. Returns the row count.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for item in updates:
+        answers = item.get('answers', [])
+        completed = bool(item.get('completed', False))
+        rows.append({
+            'user_id': item['user_id'],
+            'lesson_day': item['lesson_day'],
+            'phase': item['phase'],
+            'completed': completed,
+            'answers': answers if isinstance(answers, str) else json.dumps(answers),
+            'time_spent': item.get('time_spent', 0),
+            'completed_at': now if completed else None
+        })
     
-    session.commit()
-    session.close()
-    return progress
+    with session_scope(database_url) as session:
+        for start in range(0, len(rows), BULK_UPSERT_CHUNK):
+            statement = sqlite_insert(LessonProgress).values(rows[start:start + BULK_UPSERT_CHUNK])
+            session.execute(statement.on_conflict_do_update(
+                index_elements=['user_id', 'lesson_day', 'phase'],
+                set_={
+                    'completed': statement.excluded.completed,
+                    'answers': statement.excluded.answers,
+                    'time_spent': statement.excluded.time_spent,
+                    'completed_at': statement.excluded.completed_at
+                }
+            ))
+    return len(rows)
+
+def load_user_dashboard(user_id, database_url=None):
+    """User, habit and all progress in two queries: joined habit, then selectin progress"""
+    with session_scope(database_url) as session:
+        user = session.execute(
+            select(User)
+            .options(joinedload(User.habit), selectinload(User.progress))
+            .where(User.id == user_id)
+        ).unique().scalar_one_or_none()
+        if user is None:
+            return None
+        return DashboardSnapshot(
+            user=snapshot(UserSnapshot, user),
+            habit=snapshot(HabitSnapshot, user.habit),
+            progress=[snapshot(ProgressSnapshot, row) for row in user.progress]
+        )
 
-def get_habit_status(user_id):
+def get_habit_status(user_id, database_url=None):
     """Get user's habit formation status"""
-    session = get_session()
-    habit = session.query(HabitFormation).filter_by(user_id=user_id).first()
-    session.close()
-    return habit
+    with session_scope(database_url) as session:
+        return snapshot(HabitSnapshot, session.query(HabitFormation).filter_by(user_id=user_id).first())
 
-def update_habit_formation(user_id, lesson_day):
+def update_habit_formation(user_id, lesson_day, database_url=None):
     """Update habit formation metrics"""
-    session = get_session()
-    habit = session.query(HabitFormation).filter_by(user_id=user_id).first()
+    now = datetime.utcnow()
+    today = now.date().isoformat()
     
-    if not habit:
-        habit = HabitFormation(user_id=user_id)
-        session.add(habit)
+    last_day = func.date(HabitFormation.last_activity_date)
+    same_day = last_day == today
+    next_day = last_day == func.date(today, '-1 day')
     
-    today = datetime.utcnow().date()
+    new_streak = case(
+        (same_day, HabitFormation.streak_days),
+        (next_day, HabitFormation.streak_days + 1),
+        else_=1
+    )
     
-    if habit.last_activity_date:
-        last_activity = habit.last_activity_date.date()
-        days_diff = (today - last_activity).days
+    with session_scope(database_url) as session:
+        # One UPDATE computes the streak from the row's own values
+        result = session.execute(
+            update(HabitFormation)
+            .where(HabitFormation.user_id == user_id)
+            .values(
+                streak_days=new_streak,
+                longest_streak=func.max(HabitFormation.longest_streak, new_streak),
+                current_streak_start=case(
+                    (same_day, HabitFormation.current_streak_start),
+                    (next_day, func.coalesce(HabitFormation.current_streak_start, now)),
+                    else_=now
+                ),
+                last_activity_date=now,
+                daily_goal_met=True,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        
+        if result.rowcount == 0:
+            # First activity
+            session.add(HabitFormation(
+                user_id=user_id,
+                streak_days=1,
+                longest_streak=1,
+                current_streak_start=now,
+                last_activity_date=now,
+                daily_goal_met=True
+            ))
         
-        if days_diff == 1:
-            # Continue streak
-            habit.streak_days += 1
-            if not habit.current_streak_start:
-                habit.current_streak_start = datetime.utcnow()
-        elif days_diff == 0:
-            # Same day, no change
-            pass
-        else:
-            # Break in streak
-            habit.streak_days = 1
-            habit.current_streak_start = datetime.utcnow()
-    else:
-        # First activity
-        habit.streak_days = 1
-        habit.current_streak_start = datetime.utcnow()
-    
-    # Update longest streak
-    habit.longest_streak = max(habit.longest_streak, habit.streak_days)
-    habit.last_activity_date = datetime.utcnow()
-    
-    session.commit()
-    session.close()
-    return habit 
\ No newline at end of file
+        session.flush()
+        return snapshot(HabitSnapshot, session.query(HabitFormation).filter_by(user_id=user_id).first())
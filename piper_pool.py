@@ -0,0 +1,481 @@
+"""
+iLearnHow Piper Worker Pool
+Warm Piper processes per voice, so a request pays only for synthesis
+
+Starting `piper --model ...` costs process startup plus an ONNX model
+load before the first sample. Two pools avoid paying that per request:
+
+PiperPool keeps workers resident with --json-input: each request writes
+{"text": ..., "output_file": ...} to a worker's stdin, and Piper prints
+the file path on stdout when that WAV is complete. Crashed or hung
+workers are restarted, both on the request path and by a background
+health check.
+
+RawPiperPool never touches the filesystem: it keeps one-shot
+--output-raw processes started ahead of demand (model already loaded),
+reads the PCM from stdout into a preallocated buffer until EOF and
+builds the WAV header in memory.
+
+Both return (wav_bytes, duration_seconds).
+"""
+
+import collections
+import json
+import os
+import queue
+import select
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+
+PIPER_COMMAND = os.environ.get('PIPER_COMMAND', 'piper')
+
+# Seconds one utterance may take before the worker is presumed hung
+SYNTHESIS_TIMEOUT = float(os.environ.get('PIPER_SYNTHESIS_TIMEOUT', 60))
+
+# Seconds a request waits for a free worker of its voice
+ACQUIRE_TIMEOUT = float(os.environ.get('PIPER_ACQUIRE_TIMEOUT', 30))
+
+HEALTH_CHECK_INTERVAL = float(os.environ.get('PIPER_HEALTH_CHECK_INTERVAL', 15))
+
+# stderr lines kept per worker for error messages
+STDERR_TAIL_LINES = 20
+
+# Piper's raw output: mono signed 16-bit little-endian PCM
+PCM_SAMPLE_WIDTH = 2
+DEFAULT_SAMPLE_RATE = 22050  # every *-medium voice
+
+# Where voice models and their .onnx.json configs live
+PIPER_DATA_DIR = os.environ.get('PIPER_DATA_DIR', '.')
+
+# Failed utterances in a row after which a raw-mode voice reports unhealthy
+RAW_UNHEALTHY_FAILURES = 3
+
+# Per-thread PCM buffer; 4 MB holds ~95s of 22.05 kHz audio and grows if needed
+PCM_BUFFER_BYTES = 4 * 1024 * 1024
+
+# Shared memory keeps the JSON pool's WAV hand-off off the disk where available
+DEFAULT_OUTPUT_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class PiperError(Exception):
+    """Raised when a worker fails, exits or times out mid-utterance"""
+
+
+class PoolTimeout(PiperError):
+    """Raised when every worker for a voice stays busy past the acquire timeout"""
+
+
+def default_workers_per_voice(voice_count):
+    """Spread the cores across voices, at least one worker each"""
+    return max(1, (os.cpu_count() or 1) // max(voice_count, 1))
+
+
+def voice_sample_rate(voice_model, data_dir=PIPER_DATA_DIR):
+    """Sample rate from the voice's .onnx.json config, or the medium-voice default"""
+    for path in (os.path.join(data_dir, f'{voice_model}.onnx.json'), f'{voice_model}.onnx.json'):
+        try:
+            with open(path) as f:
+                return int(json.load(f)['audio']['sample_rate'])
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    return DEFAULT_SAMPLE_RATE
+
+
+def wav_header(data_bytes, sample_rate, channels=1, sample_width=PCM_SAMPLE_WIDTH):
+    """44-byte PCM WAV header for data_bytes of audio"""
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_bytes, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b'data', data_bytes
+    )
+
+
+def wav_duration(wav_bytes):
+    """Seconds of audio in a PCM WAV, from its header alone"""
+    byte_rate, = struct.unpack_from('<I', wav_bytes, 28)
+    data_bytes, = struct.unpack_from('<I', wav_bytes, 40)
+    return data_bytes / float(byte_rate)
+
+
+def _drain_stderr(stream, tail):
+    for line in stream:
+        tail.append(line.decode('utf-8', 'replace').rstrip())
+
+
+class PiperWorker:
+    """One resident Piper process for one voice model"""
+
+    def __init__(self, voice_model, index, output_dir, command=PIPER_COMMAND):
+        self.voice_model = voice_model
+        self.index = index
+        self.output_path = os.path.join(output_dir, f'{voice_model}.{index}.wav')
+        self.command = command
+        self.process = None
+        self.stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+        self.requests = 0
+        self.failures = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+
+    def start(self):
+        """Launch the process; the model loads once here instead of per request"""
+        self.process = subprocess.Popen(
+            [self.command, '--model', self.voice_model, '--json-input'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self.started_at = time.time()
+        # An undrained stderr pipe would eventually block Piper mid-utterance
+        threading.Thread(target=_drain_stderr, args=(self.process.stderr, self.stderr_tail),
+                         daemon=True).start()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def restart(self):
+        # Only exited or failed workers are restarted: nothing is worth waiting for
+        self.stop(grace=0)
+        self.restarts += 1
+        self.start()
+
+    def stop(self, grace=2):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=grace)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def synthesize(self, text, timeout=SYNTHESIS_TIMEOUT):
+        """WAV bytes for text; raises PiperError if the process dies or stalls"""
+        started = time.perf_counter()
+        self.requests += 1
+        try:
+            if not self.alive():
+                raise PiperError(f'{self.describe()} is not running')
+            line = json.dumps({'text': text, 'output_file': self.output_path}) + '\n'
+            try:
+                self.process.stdin.write(line.encode('utf-8'))
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                raise PiperError(f'{self.describe()} closed its input: {e}')
+
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if not ready:
+                raise PiperError(f'{self.describe()} produced nothing within {timeout}s')
+            if not self.process.stdout.readline():
+                raise PiperError(f'{self.describe()} exited: {" | ".join(self.stderr_tail)}')
+
+            with open(self.output_path, 'rb') as f:
+                return f.read()
+        except PiperError:
+            self.failures += 1
+            raise
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+
+    def describe(self):
+        return f'Piper worker {self.voice_model}#{self.index}'
+
+    def stats(self):
+        return {
+            'voice_model': self.voice_model,
+            'index': self.index,
+            'alive': self.alive(),
+            'pid': self.process.pid if self.process else None,
+            'requests': self.requests,
+            'failures': self.failures,
+            'restarts': self.restarts,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'uptime_seconds': round(time.time() - self.started_at, 1) if self.alive() else 0
+        }
+
+
+class PiperPool:
+    """Warm workers for every voice, checked out one request at a time"""
+
+    def __init__(self, voice_models, workers_per_voice=None, command=PIPER_COMMAND,
+                 acquire_timeout=ACQUIRE_TIMEOUT, health_check_interval=HEALTH_CHECK_INTERVAL,
+                 output_dir=DEFAULT_OUTPUT_DIR):
+        self.voice_models = dict(voice_models)
+        self.workers_per_voice = workers_per_voice or default_workers_per_voice(len(self.voice_models))
+        self.acquire_timeout = acquire_timeout
+        self.pid = os.getpid()
+        self._output_dir = tempfile.mkdtemp(prefix='piper-pool-', dir=output_dir)
+        self._workers = {}
+        self._idle = {}
+        for speaker, voice_model in self.voice_models.items():
+            workers = [PiperWorker(voice_model, index, self._output_dir, command)
+                       for index in range(self.workers_per_voice)]
+            self._workers[speaker] = workers
+            self._idle[speaker] = queue.Queue()
+            for worker in workers:
+                worker.start()
+                self._idle[speaker].put(worker)
+
+        self._closed = threading.Event()
+        if health_check_interval:
+            threading.Thread(target=self._health_check_loop, args=(health_check_interval,),
+                             name='piper-health', daemon=True).start()
+
+    def synthesize(self, speaker, text, timeout=SYNTHESIS_TIMEOUT):
+        """(WAV bytes, seconds) from a warm worker; a crashed worker is restarted and the text retried once"""
+        try:
+            worker = self._idle[speaker].get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise PoolTimeout(f'No {speaker} Piper worker free after {self.acquire_timeout}s')
+        try:
+            try:
+                audio = worker.synthesize(text, timeout)
+            except PiperError:
+                worker.restart()
+                audio = worker.synthesize(text, timeout)
+            return audio, wav_duration(audio)
+        except PiperError:
+            # A stalled worker would answer this request's line later, in the next request's place
+            worker.restart()
+            raise
+        finally:
+            self._idle[speaker].put(worker)
+
+    def check_health(self):
+        """Restart idle workers whose process has exited; returns how many were restarted"""
+        restarted = 0
+        for speaker, idle in self._idle.items():
+            # Only idle workers are inspected, so a request never sees a restart underneath it
+            checked = []
+            while True:
+                try:
+                    worker = idle.get_nowait()
+                except queue.Empty:
+                    break
+                if not worker.alive():
+                    print(f"⚠️  {worker.describe()} exited; restarting")
+                    worker.restart()
+                    restarted += 1
+                checked.append(worker)
+            for worker in checked:
+                idle.put(worker)
+        return restarted
+
+    def _health_check_loop(self, interval):
+        while not self._closed.wait(interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"❌ Piper health check failed: {e}")
+
+    def healthy(self):
+        return all(worker.alive() for workers in self._workers.values() for worker in workers)
+
+    def stats(self):
+        return {
+            'mode': 'json',
+            'workers_per_voice': self.workers_per_voice,
+            'voices': {
+                speaker: {
+                    'idle': self._idle[speaker].qsize(),
+                    'workers': [worker.stats() for worker in workers]
+                }
+                for speaker, workers in self._workers.items()
+            }
+        }
+
+    def close(self):
+        self._closed.set()
+        for workers in self._workers.values():
+            for worker in workers:
+                worker.stop()
+        shutil.rmtree(self._output_dir, ignore_errors=True)
+
+
+class RawPiperPool:
+    """One-shot `piper --output-raw` processes per voice, started before they are needed"""
+
+    def __init__(self, voice_models, spares_per_voice=None, command=PIPER_COMMAND,
+                 data_dir=PIPER_DATA_DIR):
+        self.voice_models = dict(voice_models)
+        self.spares_per_voice = spares_per_voice or default_workers_per_voice(len(self.voice_models))
+        self.command = command
+        self.sample_rates = {speaker: voice_sample_rate(model, data_dir)
+                             for speaker, model in self.voice_models.items()}
+        self.pid = os.getpid()
+        self._buffers = threading.local()
+        self._lock = threading.Lock()
+        self._spares = {speaker: queue.Queue() for speaker in self.voice_models}
+        self._refilling = {speaker: 0 for speaker in self.voice_models}
+        self._counters = {speaker: {'requests': 0, 'failures': 0, 'consecutive_failures': 0,
+                                    'cold_starts': 0, 'spawned': 0, 'spawn_failures': 0}
+                          for speaker in self.voice_models}
+        # Whether the last attempt to start a process for the voice failed
+        self._spawn_failing = {speaker: False for speaker in self.voice_models}
+        for speaker in self.voice_models:
+            for _ in range(self.spares_per_voice):
+                self._spares[speaker].put(self._spawn(speaker))
+
+    def _spawn(self, speaker):
+        try:
+            process = subprocess.Popen(
+                [self.command, '--model', self.voice_models[speaker], '--output-raw'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0
+            )
+        except OSError as e:
+            with self._lock:
+                self._counters[speaker]['spawn_failures'] += 1
+                self._spawn_failing[speaker] = True
+            raise PiperError(f'Could not start Piper {self.voice_models[speaker]}: {e}') from e
+        process.stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+        threading.Thread(target=_drain_stderr, args=(process.stderr, process.stderr_tail),
+                         daemon=True).start()
+        with self._lock:
+            self._counters[speaker]['spawned'] += 1
+            self._spawn_failing[speaker] = False
+        return process
+
+    def _take(self, speaker):
+        """A warmed-up process, topping the spares back up to spares_per_voice"""
+        try:
+            process = self._spares[speaker].get_nowait()
+        except queue.Empty:
+            process = None
+        if process is None or process.poll() is not None:
+            with self._lock:
+                self._counters[speaker]['cold_starts'] += 1
+            process = self._spawn(speaker)
+
+        # Each spare holds a loaded model, so a burst of cold starts must not leave a surplus
+        with self._lock:
+            refill = self._spares[speaker].qsize() + self._refilling[speaker] < self.spares_per_voice
+            if refill:
+                self._refilling[speaker] += 1
+        if refill:
+            try:
+                self._spares[speaker].put(self._spawn(speaker))
+            except PiperError:
+                # The request already has its process; the next one cold-starts
+                pass
+            finally:
+                with self._lock:
+                    self._refilling[speaker] -= 1
+        return process
+
+    def _buffer(self):
+        buffer = getattr(self._buffers, 'pcm', None)
+        if buffer is None:
+            buffer = self._buffers.pcm = bytearray(PCM_BUFFER_BYTES)
+        return buffer
+
+    def _read_pcm(self, stream):
+        """Read stdout to EOF into this thread's buffer; returns (buffer, bytes read)"""
+        buffer = self._buffer()
+        view = memoryview(buffer)
+        size = 0
+        while True:
+            if size == len(buffer):
+                # A resize needs the view released first
+                view.release()
+                buffer.extend(bytes(len(buffer)))
+                view = memoryview(buffer)
+            read = stream.readinto(view[size:])
+            if not read:
+                break
+            size += read
+        view.release()
+        return buffer, size
+
+    def synthesize(self, speaker, text, timeout=SYNTHESIS_TIMEOUT):
+        """(WAV bytes, seconds) with no disk I/O; duration comes from the sample count"""
+        with self._lock:
+            self._counters[speaker]['requests'] += 1
+        try:
+            process = self._take(speaker)
+        except PiperError:
+            self._record(speaker, failed=True)
+            raise
+        # readinto() cannot time out, so a stalled process is killed from outside
+        watchdog = threading.Timer(timeout, process.kill)
+        watchdog.start()
+        try:
+            try:
+                process.stdin.write(text.encode('utf-8'))
+                process.stdin.close()
+            except (BrokenPipeError, OSError) as e:
+                raise PiperError(f'Piper {self.voice_models[speaker]} closed its input: {e}')
+            buffer, size = self._read_pcm(process.stdout)
+            returncode = process.wait()
+        except BaseException as e:
+            # Reap the process whatever went wrong, so no zombie is left behind
+            process.kill()
+            process.wait()
+            if isinstance(e, PiperError):
+                self._record(speaker, failed=True)
+            raise
+        finally:
+            watchdog.cancel()
+
+        if returncode != 0 or not size:
+            self._record(speaker, failed=True)
+            raise PiperError(f'Piper {self.voice_models[speaker]} exited with {returncode}: '
+                             f'{" | ".join(process.stderr_tail)}')
+        self._record(speaker, failed=False)
+
+        size -= size % PCM_SAMPLE_WIDTH
+        sample_rate = self.sample_rates[speaker]
+        audio = b''.join((wav_header(size, sample_rate), memoryview(buffer)[:size]))
+        return audio, size / PCM_SAMPLE_WIDTH / sample_rate
+
+    def _record(self, speaker, failed):
+        """Count one utterance's outcome; a success ends any failure streak"""
+        with self._lock:
+            counters = self._counters[speaker]
+            if failed:
+                counters['failures'] += 1
+                counters['consecutive_failures'] += 1
+            else:
+                counters['consecutive_failures'] = 0
+
+    def healthy(self):
+        """Every voice can start Piper and has not failed RAW_UNHEALTHY_FAILURES times running"""
+        with self._lock:
+            return not any(self._spawn_failing.values()) and all(
+                counters['consecutive_failures'] < RAW_UNHEALTHY_FAILURES
+                for counters in self._counters.values()
+            )
+
+    def stats(self):
+        with self._lock:
+            counters = {speaker: dict(values) for speaker, values in self._counters.items()}
+        return {
+            'mode': 'raw',
+            'spares_per_voice': self.spares_per_voice,
+            'voices': {
+                speaker: dict(counters[speaker], sample_rate=self.sample_rates[speaker],
+                              warm=self._spares[speaker].qsize())
+                for speaker in self.voice_models
+            }
+        }
+
+    def close(self):
+        for spares in self._spares.values():
+            while True:
+                try:
+                    process = spares.get_nowait()
+                except queue.Empty:
+                    break
+                process.kill()
+                process.wait()
@@ -4,13 +4,16 @@ iLearn How Production TTS Server
 The ONE server that handles everything correctly
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import base64
+import json
 import numpy as np
 import io
 import os
 
+from tts_cache import TTSCache, cache_key, PRODUCTION_SERVER_CACHE_DIR
+
 app = Flask(__name__)
 
 # Enable CORS for production with Cloudflare Pages support
@@ -24,6 +27,14 @@ CORS(app, origins=[
     "http://127.0.0.1:*"
 ])
 
+# Whole responses cached by content; bump when the generated audio or timing changes
+TTS_ENGINE_VERSION = "mock-silence-1"
+tts_cache = TTSCache(
+    directory=os.environ.get("TTS_CACHE_DIR", PRODUCTION_SERVER_CACHE_DIR),
+    memory_bytes=int(os.environ.get("TTS_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_bytes=int(os.environ.get("TTS_CACHE_DISK_MB", "1024")) * 1024 * 1024
+)
+
 print("🚀 iLearn How TTS Server Starting...")
 print("✅ This is the ONLY server we need")
 print("✅ Returns mock audio with phoneme timing")
@@ -39,7 +50,8 @@ def health():
         "version": "1.0.0",
         "voices": ["ken", "kelly"],
         "cors_enabled": True,
-        "cloudflare_pages_support": True
+        "cloudflare_pages_support": True,
+        "tts_cache": tts_cache.stats()
     })
 
 @app.route('/debug/cors', methods=['GET'])
@@ -72,6 +84,12 @@ def generate_speech():
         # Validate speaker
         if speaker not in ['ken', 'kelly']:
             speaker = 'kelly'
+        
+        # Identical requests get the identical response body
+        key = cache_key(text, speaker, TTS_ENGINE_VERSION, 'json')
+        body, cache_status = tts_cache.get(key)
+        if body is not None:
+            return Response(body, mimetype='application/json', headers={'X-TTS-Cache': cache_status})
             
         print(f"🎤 Generating speech for {speaker}: '{text[:50]}...'")
         
@@ -132,7 +150,9 @@ def generate_speech():
         }
         
         print(f"✅ Generated {len(phonemes)} phonemes, {duration:.1f}s duration")
-        return jsonify(response)
+        body = json.dumps(response).encode('utf-8')
+        tts_cache.set(key, body)
+        return Response(body, mimetype='application/json', headers={'X-TTS-Cache': cache_status})
         
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -4,16 +4,18 @@ Railway TTS Server using Piper - Lightweight and Fast
 Real voice synthesis without heavy models
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-import subprocess
-import tempfile
 import os
+import re
 import base64
 import json
 import time
-import wave
-import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from piper_pool import PiperPool, RawPiperPool, PoolTimeout, wav_duration
+from tts_cache import TTSCache, SingleFlight, cache_key, PIPER_SERVER_CACHE_DIR, COALESCED
 
 app = Flask(__name__)
 
@@ -72,11 +74,64 @@ VOICE_MODELS = {
     "ken": "en_US-ryan-medium"     # Male voice
 }
 
+# Warm Piper processes, one pool per server process (gunicorn workers each get their own).
+# "json" keeps resident --json-input workers handing WAVs over /dev/shm; "raw" streams PCM
+# over stdout from pre-started one-shot processes with no files at all, which suits light
+# traffic but pays any unfinished model load when requests arrive back to back.
+PIPER_OUTPUT = os.environ.get("PIPER_OUTPUT", "json").lower()
+PIPER_WORKERS_PER_VOICE = int(os.environ.get("PIPER_WORKERS_PER_VOICE", "0")) or None
+
+_piper_pool = None
+_piper_pool_lock = threading.Lock()
+
+# Synthesized audio by content; bump TTS_ENGINE_VERSION when a Piper upgrade changes output
+TTS_ENGINE_VERSION = os.environ.get("TTS_ENGINE_VERSION", "piper-1")
+tts_cache = TTSCache(
+    directory=os.environ.get("TTS_CACHE_DIR", PIPER_SERVER_CACHE_DIR),
+    memory_bytes=int(os.environ.get("TTS_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_bytes=int(os.environ.get("TTS_CACHE_DISK_MB", "1024")) * 1024 * 1024
+)
+
+# Concurrent misses for the same key (a new lesson going live) share one synthesis
+inflight_synthesis = SingleFlight()
+
+def get_piper_pool():
+    """Get this process's warm Piper workers, starting them on first use"""
+    global _piper_pool
+    with _piper_pool_lock:
+        if _piper_pool is None or _piper_pool.pid != os.getpid():
+            if PIPER_OUTPUT == "json":
+                _piper_pool = PiperPool(VOICE_MODELS, workers_per_voice=PIPER_WORKERS_PER_VOICE)
+            else:
+                _piper_pool = RawPiperPool(VOICE_MODELS, spares_per_voice=PIPER_WORKERS_PER_VOICE)
+        return _piper_pool
+
+def synthesize_cached(speaker, text):
+    """(WAV bytes, seconds, X-TTS-Cache value); Piper runs once per missing key, however many callers wait"""
+    key = cache_key(text, VOICE_MODELS[speaker], TTS_ENGINE_VERSION)
+    audio_data, cache_status = tts_cache.get(key)
+    if audio_data is None:
+        audio_data, shared = inflight_synthesis.do(key, synthesize_and_store, speaker, text, key,
+                                                   recheck=lambda: tts_cache.get(key)[0])
+        if shared:
+            cache_status = COALESCED
+    return audio_data, wav_duration(audio_data), cache_status
+
+def synthesize_and_store(speaker, text, key):
+    """Run Piper once and cache the WAV for everyone waiting on key"""
+    audio_data, _ = get_piper_pool().synthesize(speaker, text)
+    tts_cache.set(key, audio_data)
+    return audio_data
+
 @app.route('/health', methods=['GET'])
 def health():
+    pool = get_piper_pool()
     return jsonify({
         "server": "iLearnHow Production TTS",
-        "status": "healthy",
+        "status": "healthy" if pool.healthy() else "degraded",
+        "piper_pool": pool.stats(),
+        "tts_cache": tts_cache.stats(),
+        "tts_inflight": inflight_synthesis.stats(),
         "version": "1.0.0",
         "engine": "piper_tts",
         "message": "Piper TTS Server Running",
@@ -105,116 +160,90 @@ def tts_options():
     return ("", 204)
 
 
+def parse_tts_request():
+    """Validate a TTS request body; returns ((text, speaker, include_phonemes), None) or (None, error response)"""
+    # Content-Type validation
+    content_type = request.headers.get('Content-Type', '')
+    if 'application/json' not in content_type:
+        return None, (jsonify({
+            "error": "Unsupported Media Type: Content-Type must be application/json"
+        }), 415)
+
+    # JSON body parsing
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, (jsonify({"error": "Invalid JSON body"}), 400)
+
+    # Required fields and constraints
+    text = data.get('text')
+    if not isinstance(text, str) or not text.strip():
+        return None, (jsonify({
+            "error": "Field 'text' is required and must be a non-empty string"
+        }), 422)
+    if len(text) > MAX_TTS_TEXT_CHARS:
+        return None, (jsonify({
+            "error": f"Text exceeds maximum allowed length of {MAX_TTS_TEXT_CHARS} characters"
+        }), 413)
+
+    speaker = str(data.get('speaker', 'kelly')).lower()
+    if speaker not in VOICE_MODELS:
+        return None, (jsonify({
+            "error": "Unsupported speaker",
+            "allowed": list(VOICE_MODELS.keys())
+        }), 422)
+
+    requested_format = str(data.get('format', 'wav')).lower()
+    if requested_format != 'wav':
+        return None, (jsonify({
+            "error": "Unsupported format",
+            "allowed": ["wav"],
+        }), 415)
+
+    return (text, speaker, bool(data.get('include_phonemes', False))), None
+
 @app.route('/api/tts', methods=['POST'])
 def tts():
     try:
-        # Content-Type validation
-        content_type = request.headers.get('Content-Type', '')
-        if 'application/json' not in content_type:
-            return jsonify({
-                "error": "Unsupported Media Type: Content-Type must be application/json"
-            }), 415
-
-        # JSON body parsing
-        data = request.get_json(silent=True)
-        if not isinstance(data, dict):
-            return jsonify({"error": "Invalid JSON body"}), 400
-
-        # Required fields and constraints
-        text = data.get('text')
-        if not isinstance(text, str) or not text.strip():
-            return jsonify({
-                "error": "Field 'text' is required and must be a non-empty string"
-            }), 422
-        if len(text) > MAX_TTS_TEXT_CHARS:
-            return jsonify({
-                "error": f"Text exceeds maximum allowed length of {MAX_TTS_TEXT_CHARS} characters"
-            }), 413
-
-        speaker = str(data.get('speaker', 'kelly')).lower()
-        if speaker not in VOICE_MODELS:
-            return jsonify({
-                "error": "Unsupported speaker",
-                "allowed": list(VOICE_MODELS.keys())
-            }), 422
-
-        requested_format = str(data.get('format', 'wav')).lower()
-        if requested_format != 'wav':
-            return jsonify({
-                "error": "Unsupported format",
-                "allowed": ["wav"],
-            }), 415
-
-        include_phonemes = bool(data.get('include_phonemes', False))
+        params, error = parse_tts_request()
+        if error:
+            return error
+        text, speaker, include_phonemes = params
         
         # Map speaker to Piper voice
         voice_model = VOICE_MODELS[speaker]
         
         print(f"🎤 Piper TTS: {speaker} ({voice_model}) - '{text[:50]}...'")
         
-        # Create temporary file for output
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-            output_path = tmp_file.name
-        
+        # Serve from the cache, or synthesize on a warm process
         try:
-            # Use Piper to generate speech
-            cmd = [
-                'piper',
-                '--model', voice_model,
-                '--output_file', output_path
-            ]
-            
-            # Run Piper
-            process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            stdout, stderr = process.communicate(input=text)
-            
-            if process.returncode != 0:
-                raise Exception(f"Piper failed: {stderr}")
-            
-            # Read the generated audio
-            with open(output_path, 'rb') as audio_file:
-                audio_data = audio_file.read()
-            
-            # Get audio duration
-            with wave.open(output_path, 'rb') as wav_file:
-                frames = wav_file.getnframes()
-                rate = wav_file.getframerate()
-                duration = frames / float(rate)
-            
-            # Encode to base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-            # Generate simple phonemes for avatar sync
-            phonemes = []
-            if include_phonemes:
-                phonemes = generate_phonemes(text, duration)
-            
-            response_data = {
-                "audio": audio_base64,
-                "audio_format": "wav",
-                "duration": duration,
-                "speaker": speaker,
-                "text": text,
-                "engine": "piper"
-            }
-            
-            if include_phonemes:
-                response_data["phonemes"] = phonemes
-            
-            print(f"✅ Piper TTS: Generated {duration:.2f}s of audio")
-            return jsonify(response_data)
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+            audio_data, duration, cache_status = synthesize_cached(speaker, text)
+        except PoolTimeout as e:
+            return jsonify({"error": str(e)}), 503
+        
+        # Encode to base64
+        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        
+        # Generate simple phonemes for avatar sync
+        phonemes = []
+        if include_phonemes:
+            phonemes = generate_phonemes(text, duration)
+        
+        response_data = {
+            "audio": audio_base64,
+            "audio_format": "wav",
+            "duration": duration,
+            "speaker": speaker,
+            "text": text,
+            "engine": "piper"
+        }
+        
+        if include_phonemes:
+            response_data["phonemes"] = phonemes
+        
+        print(f"✅ Piper TTS: Generated {duration:.2f}s of audio ({cache_status})")
+        response = jsonify(response_data)
+        response.headers['X-TTS-Cache'] = cache_status
+        return response
         
     except Exception as e:
         print(f"❌ Piper TTS Error: {e}")
@@ -222,7 +251,9 @@ def tts():
 
 def generate_phonemes(text, duration):
     """Generate simple phoneme timing for avatar sync"""
-    words = text.split()
+    # Bare punctuation such as "..." has no mouth shape of its own
+    words = [word.lower().strip('.,!?') for word in text.split()]
+    words = [word for word in words if word]
     phonemes = []
     
     if not words:
@@ -232,9 +263,7 @@ def generate_phonemes(text, duration):
     current_time = 0.0
     
     # Simple phoneme patterns
-    for i, word in enumerate(words):
-        word_lower = word.lower().strip('.,!?')
-        
+    for i, word_lower in enumerate(words):
         # Opening mouth movement
         if word_lower[0] in 'aeiou':
             phonemes.append({
@@ -273,6 +302,128 @@ def generate_phonemes(text, duration):
     
     return phonemes
 
+# Sentence-chunked streaming: playback starts after the first sentence, not the whole text
+SENTENCE_PATTERN = re.compile(r'.+?(?:[.!?]+["\')\]]*(?=\s|$)|$)', re.S)
+MIN_CHUNK_CHARS = 12   # short sentences ride along with the next one
+MAX_CHUNK_CHARS = 300  # long sentences are split at clause breaks, then spaces
+# Chunks of one stream synthesized ahead of the one being sent; keeps one long
+# text from queueing in front of every other learner's first sentence
+STREAM_LOOKAHEAD = int(os.environ.get("PIPER_STREAM_LOOKAHEAD", "3"))
+STREAM_THREADS = int(os.environ.get("PIPER_STREAM_THREADS", str(max(4, (os.cpu_count() or 1) * 2))))
+
+_stream_executor = None
+_stream_executor_pid = None
+
+def get_stream_executor():
+    """Threads that wait on the Piper pool for streamed chunks"""
+    global _stream_executor, _stream_executor_pid
+    with _piper_pool_lock:
+        if _stream_executor is None or _stream_executor_pid != os.getpid():
+            _stream_executor = ThreadPoolExecutor(max_workers=STREAM_THREADS,
+                                                  thread_name_prefix='tts-stream')
+            _stream_executor_pid = os.getpid()
+        return _stream_executor
+
+def split_long_chunk(chunk):
+    """Break a chunk over MAX_CHUNK_CHARS at commas/semicolons/colons, else at spaces"""
+    pieces = []
+    while len(chunk) > MAX_CHUNK_CHARS:
+        cut = max(chunk.rfind(mark, 0, MAX_CHUNK_CHARS) for mark in (', ', '; ', ': '))
+        if cut <= 0:
+            cut = chunk.rfind(' ', 0, MAX_CHUNK_CHARS)
+        if cut <= 0:
+            cut = MAX_CHUNK_CHARS - 1
+        pieces.append(chunk[:cut + 1].strip())
+        chunk = chunk[cut + 1:].strip()
+    if chunk:
+        pieces.append(chunk)
+    return pieces
+
+def split_sentences(text):
+    """Synthesis chunks in reading order, one or more sentences each"""
+    chunks = []
+    pending = ''
+    for sentence in SENTENCE_PATTERN.findall(text):
+        pending = f"{pending} {sentence.strip()}".strip()
+        if len(pending) >= MIN_CHUNK_CHARS:
+            chunks.extend(split_long_chunk(pending))
+            pending = ''
+    if pending:
+        if chunks and not any(char.isalnum() for char in pending):
+            # A trailing "..." would be synthesized as silence on its own
+            chunks[-1] = f"{chunks[-1]} {pending}"
+        else:
+            chunks.extend(split_long_chunk(pending))
+    return chunks
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/tts/stream', methods=['OPTIONS'])
+def tts_stream_options():
+    return ("", 204)
+
+@app.route('/api/tts/stream', methods=['POST'])
+def tts_stream():
+    """Same body as /api/tts; answers with server-sent events, one `chunk` per sentence group, in order"""
+    params, error = parse_tts_request()
+    if error:
+        return error
+    text, speaker, include_phonemes = params
+    
+    chunks = split_sentences(text)
+    executor = get_stream_executor()
+    print(f"🎤 Piper TTS stream: {speaker} - {len(chunks)} chunks - '{text[:50]}...'")
+    
+    def events():
+        futures = {}
+        offset = 0.0
+        try:
+            for index, chunk in enumerate(chunks):
+                # Headers are already sent, so every failure has to end the stream as an event
+                try:
+                    # Keep up to STREAM_LOOKAHEAD chunks synthesizing in parallel
+                    for ahead in range(index, min(index + STREAM_LOOKAHEAD, len(chunks))):
+                        if ahead not in futures:
+                            futures[ahead] = executor.submit(synthesize_cached, speaker, chunks[ahead])
+                    audio_data, duration, cache_status = futures.pop(index).result()
+                    
+                    event = {
+                        "index": index,
+                        "text": chunk,
+                        "audio": base64.b64encode(audio_data).decode('utf-8'),
+                        "audio_format": "wav",
+                        "start": round(offset, 3),
+                        "duration": duration,
+                        "cache": cache_status
+                    }
+                    if include_phonemes:
+                        # Timings are relative to this chunk's own audio
+                        event["phonemes"] = generate_phonemes(chunk, duration)
+                except Exception as e:
+                    print(f"❌ Piper TTS stream error at chunk {index}: {e}")
+                    yield sse_event("error", {"index": index, "error": str(e)})
+                    return
+                yield sse_event("chunk", event)
+                offset += duration
+            
+            yield sse_event("done", {
+                "chunks": len(chunks),
+                "duration": round(offset, 3),
+                "speaker": speaker,
+                "engine": "piper"
+            })
+            print(f"✅ Piper TTS stream: {len(chunks)} chunks, {offset:.2f}s of audio")
+        finally:
+            # Client went away or a chunk failed: drop work nobody will hear
+            for future in futures.values():
+                future.cancel()
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # let proxies pass each event through immediately
+    })
+
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({
@@ -281,7 +432,8 @@ def root():
         "voices": list(VOICE_MODELS.keys()),
         "endpoints": {
             "health": "/health",
-            "tts": "/api/tts"
+            "tts": "/api/tts",
+            "tts_stream": "/api/tts/stream"
         }
     })
 
@@ -292,6 +444,7 @@ if __name__ == '__main__':
     print("=" * 70)
     print(f"✅ Port: {port}")
     print(f"✅ Voices: {list(VOICE_MODELS.keys())}")
+    print(f"✅ Piper output: {PIPER_OUTPUT}")
     print(f"✅ CORS enabled for ilearnhow.com")
     print("=" * 70)
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+iLearnHow Session Sweeper
+Deletes expired and surplus login sessions so user_sessions stays bounded
+
+Every login adds a user_sessions row. Rows untouched for longer than
+SESSION_LIFETIME (the app's PERMANENT_SESSION_LIFETIME) are deleted, and
+each user keeps only their SESSIONS_PER_USER newest. Deletes run in small
+transactions with a pause between them, so the app's writers never queue
+behind a long lock. Run from cron, or as a sidecar with --interval:
+    python session_sweeper.py --db ilearnhow.db [--interval 3600]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import db_pool
+import sharding
+
+SESSION_LIFETIME = timedelta(days=30)
+
+# Newest sessions kept per user (a handful of devices, with headroom)
+SESSIONS_PER_USER = 10
+
+# Rows deleted, or users trimmed, per transaction, and the pause between them
+SWEEP_BATCH_ROWS = 500
+SWEEP_BATCH_USERS = 100
+SWEEP_BATCH_PAUSE = 0.01
+
+EXPIRED_BATCH_SQL = '''
+    DELETE FROM user_sessions WHERE id IN (
+        SELECT id FROM user_sessions WHERE updated_at < ? LIMIT ?
+    )
+'''
+
+OVER_CAP_USERS_SQL = '''
+    SELECT user_id FROM user_sessions GROUP BY user_id HAVING COUNT(*) > ?
+'''
+
+OVER_CAP_DELETE_SQL = '''
+    DELETE FROM user_sessions
+    WHERE user_id = :user_id AND id NOT IN (
+        SELECT id FROM user_sessions WHERE user_id = :user_id ORDER BY id DESC LIMIT :keep
+    )
+'''
+
+def session_cutoff(max_age, now=None):
+    """UTC time, formatted like CURRENT_TIMESTAMP, before which sessions have expired"""
+    now = now or datetime.now(timezone.utc)
+    return (now - max_age).strftime('%Y-%m-%d %H:%M:%S')
+
+def _delete_in_transaction(conn, sql, params_list):
+    """Run deletes in one short write transaction; returns rows deleted"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        deleted = sum(conn.execute(sql, params).rowcount for params in params_list)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return deleted
+
+def sweep_sessions(conn, max_age=SESSION_LIFETIME, keep_per_user=SESSIONS_PER_USER,
+                   batch_rows=SWEEP_BATCH_ROWS, pause=SWEEP_BATCH_PAUSE, now=None):
+    """Delete expired sessions, then trim each user to keep_per_user; returns a report"""
+    started = time.perf_counter()
+    cutoff = session_cutoff(max_age, now)
+    expired = trimmed = batches = 0
+
+    while True:
+        deleted = _delete_in_transaction(conn, EXPIRED_BATCH_SQL, [(cutoff, batch_rows)])
+        expired += deleted
+        batches += 1
+        if deleted < batch_rows:
+            break
+        time.sleep(pause)
+
+    users = [row[0] for row in conn.execute(OVER_CAP_USERS_SQL, (keep_per_user,))]
+    for start in range(0, len(users), SWEEP_BATCH_USERS):
+        trimmed += _delete_in_transaction(conn, OVER_CAP_DELETE_SQL, [
+            {'user_id': user_id, 'keep': keep_per_user}
+            for user_id in users[start:start + SWEEP_BATCH_USERS]
+        ])
+        batches += 1
+        time.sleep(pause)
+
+    return {
+        'expired': expired,
+        'over_cap': trimmed,
+        'reclaimed': expired + trimmed,
+        'remaining': conn.execute('SELECT COUNT(*) FROM user_sessions').fetchone()[0],
+        # Freed pages are reused by later inserts, so the file stops growing
+        'free_pages': conn.execute('PRAGMA freelist_count').fetchone()[0],
+        'batches': batches,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+def sweep_database(db_path, **options):
+    """Sweep the main database or every shard; returns {path: report}"""
+    reports = {}
+    for path in sharding.user_data_paths(db_path):
+        conn = db_pool.connect(path)
+        try:
+            reports[path] = sweep_sessions(conn, **options)
+        finally:
+            conn.close()
+    return reports
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete expired and surplus login sessions')
+    parser.add_argument('--db', default='ilearnhow.db', help='database path')
+    parser.add_argument('--max-age-days', type=float, default=SESSION_LIFETIME.days,
+                        help='delete sessions untouched for longer than this')
+    parser.add_argument('--keep-per-user', type=int, default=SESSIONS_PER_USER,
+                        help='newest sessions kept for each user')
+    parser.add_argument('--batch-rows', type=int, default=SWEEP_BATCH_ROWS,
+                        help='rows deleted per transaction')
+    parser.add_argument('--interval', type=float, help='keep running, sweeping every N seconds')
+    args = parser.parse_args()
+
+    while True:
+        print(f"🧹 Sweeping sessions in {args.db}...")
+        reports = sweep_database(
+            args.db,
+            max_age=timedelta(days=args.max_age_days),
+            keep_per_user=args.keep_per_user,
+            batch_rows=args.batch_rows
+        )
+        for path, report in reports.items():
+            print(f"  {path}:")
+            for key, value in report.items():
+                print(f"    {key}: {value}")
+        reclaimed = sum(report['reclaimed'] for report in reports.values())
+        print(f"\n✅ Reclaimed {reclaimed:,} session rows")
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+iLearnHow Shard Router
+Partitions the per-user tables across N SQLite files by user_id hash
+
+users, user_preferences and lesson_variants stay in the main database.
+A user's lesson_progress, habit_formation and user_sessions rows live in
+exactly one shard file next to it, so progress writes for different users
+take different write locks. The shard count is recorded in the main
+database's storage_layout table and changes only through this tool,
+run while the app is stopped:
+    python sharding.py --db ilearnhow.db --shards 4
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import db_pool
+from write_queue import WriteQueue
+from migrations import migrate, add_stat_counters, drop_stat_triggers
+
+SHARDED_TABLES = ('lesson_progress', 'habit_formation', 'user_sessions')
+
+# Rows fetched from a source table per round while resharding
+COPY_CHUNK_ROWS = 50000
+
+def shard_index(user_id, shard_count):
+    """Stable shard for a user; Fibonacci hashing spreads any id pattern evenly"""
+    return ((user_id * 0x9E3779B1) & 0xFFFFFFFF) % shard_count
+
+def shard_path(db_path, index, shard_count):
+    """ilearnhow.db -> ilearnhow.shard2of4.db"""
+    root, ext = os.path.splitext(db_path)
+    return f'{root}.shard{index}of{shard_count}{ext or ".db"}'
+
+def read_shard_count(conn):
+    """Shard count recorded in a migrated main database"""
+    row = conn.execute('SELECT shard_count FROM storage_layout WHERE id = 1').fetchone()
+    return row[0] if row else 1
+
+def user_data_paths(db_path, shard_count=None):
+    """Every file holding per-user rows: the shards, or the main database when unsharded"""
+    if shard_count is None:
+        conn = db_pool.connect(db_path)
+        try:
+            shard_count = read_shard_count(conn)
+        finally:
+            conn.close()
+    if shard_count == 1:
+        return [db_path]
+    return [shard_path(db_path, index, shard_count) for index in range(shard_count)]
+
+def migrate_files(paths):
+    """Bring every file up to the current schema"""
+    for path in paths:
+        conn = db_pool.connect(path)
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+
+class ShardRouter:
+    """Connection pools for the main database and each shard, routed by user_id"""
+
+    def __init__(self, db_path, shard_count=1, max_size=db_pool.DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.shard_count = shard_count
+        self.pid = os.getpid()
+        self.main = db_pool.ConnectionPool(db_path, max_size=max_size)
+        if shard_count == 1:
+            # Unsharded: per-user tables live in the main database
+            self.shards = [self.main]
+        else:
+            self.shards = [
+                db_pool.ConnectionPool(shard_path(db_path, index, shard_count), max_size=max_size)
+                for index in range(shard_count)
+            ]
+        self._writers = {}
+        self._writers_lock = threading.Lock()
+
+    def index_for(self, user_id):
+        return shard_index(user_id, self.shard_count)
+
+    def pool_for(self, user_id):
+        """Pool for the file holding user_id's per-user rows"""
+        return self.shards[self.index_for(user_id)]
+
+    def pools(self):
+        """Every distinct pool, main first"""
+        return [self.main] + [pool for pool in self.shards if pool is not self.main]
+
+    def writer(self, pool):
+        """Write queue for the pool's database file, started on first use"""
+        with self._writers_lock:
+            writer = self._writers.get(pool.db_path)
+            if writer is None:
+                writer = self._writers[pool.db_path] = WriteQueue(pool.db_path)
+            return writer
+
+    def writers(self):
+        with self._writers_lock:
+            return list(self._writers.values())
+
+    def close_writers(self):
+        """Flush and stop every writer thread"""
+        with self._writers_lock:
+            writers, self._writers = self._writers, {}
+        for writer in writers.values():
+            writer.close()
+
+    def close_all(self):
+        self.close_writers()
+        for pool in self.pools():
+            pool.close_all()
+
+    def stats(self):
+        return {
+            'shard_count': self.shard_count,
+            'main': self.main.stats(),
+            'shards': [pool.stats() for pool in self.shards] if self.shard_count > 1 else []
+        }
+
+def _remove_database_file(path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def reshard(db_path, shard_count, keep_old=False, report=print):
+    """Move every per-user row into `shard_count` files (1 folds them back into the main database)"""
+    if shard_count < 1:
+        raise ValueError('shard_count must be at least 1')
+    started = time.perf_counter()
+
+    main = db_pool.connect(db_path)
+    migrate(main)
+    old_count = read_shard_count(main)
+    if old_count == shard_count:
+        main.close()
+        return {'from': old_count, 'to': shard_count, 'rows': {}, 'seconds': 0.0}
+
+    source_paths = user_data_paths(db_path, old_count)
+    target_paths = user_data_paths(db_path, shard_count)
+
+    # Leftovers from an interrupted run are incomplete; start those files over
+    for path in target_paths:
+        if path != db_path:
+            _remove_database_file(path)
+    migrate_files(target_paths)
+
+    targets = [main if path == db_path else db_pool.connect(path) for path in target_paths]
+    touched = targets if main in targets else targets + [main]
+    # Counters are recounted once per file instead of by per-row triggers
+    for conn in touched:
+        with conn:
+            drop_stat_triggers(conn.cursor())
+
+    copied = {}
+    try:
+        for source_path in source_paths:
+            source = main if source_path == db_path else db_pool.connect(source_path)
+            try:
+                for table in SHARDED_TABLES:
+                    columns = [row[1] for row in source.execute(f'PRAGMA table_info({table})')]
+                    user_column = columns.index('user_id')
+                    insert_sql = (f'INSERT INTO {table} ({", ".join(columns)}) '
+                                  f'VALUES ({", ".join("?" * len(columns))})')
+                    cursor = source.execute(f'SELECT {", ".join(columns)} FROM {table}')
+                    while True:
+                        rows = cursor.fetchmany(COPY_CHUNK_ROWS)
+                        if not rows:
+                            break
+                        routed = [[] for _ in targets]
+                        for row in rows:
+                            routed[shard_index(row[user_column], shard_count)].append(tuple(row))
+                        # change_seq travels with the row, so the cursor trigger stays idle
+                        for conn, batch in zip(targets, routed):
+                            if batch:
+                                conn.executemany(insert_sql, batch)
+                        copied[table] = copied.get(table, 0) + len(rows)
+            finally:
+                if source is not main:
+                    source.close()
+
+        for conn in targets:
+            if conn is not main:
+                conn.commit()
+
+        # Switch the layout and clear moved rows out of the main database atomically
+        if not main.in_transaction:
+            main.execute('BEGIN IMMEDIATE')
+        if old_count == 1:
+            for table in SHARDED_TABLES:
+                main.execute(f'DELETE FROM {table}')
+        main.execute('UPDATE storage_layout SET shard_count = ? WHERE id = 1', (shard_count,))
+        main.commit()
+    except BaseException:
+        main.rollback()
+        raise
+    finally:
+        for conn in touched:
+            with conn:
+                add_stat_counters(conn.cursor())
+        for conn in targets:
+            if conn is not main:
+                conn.close()
+        main.close()
+
+    if old_count > 1 and not keep_old:
+        for path in source_paths:
+            _remove_database_file(path)
+
+    for table, count in copied.items():
+        report(f"  📦 {table}: {count:,} rows")
+    return {
+        'from': old_count,
+        'to': shard_count,
+        'rows': copied,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Reshard per-user tables across SQLite files')
+    parser.add_argument('--db', default='ilearnhow.db', help='main database path')
+    parser.add_argument('--shards', type=int, required=True, help='target shard count (1 = unsharded)')
+    parser.add_argument('--keep-old', action='store_true', help='keep the previous shard files')
+    args = parser.parse_args()
+
+    print(f"🔧 Resharding {args.db} into {args.shards} shard(s)... (stop the app first)")
+    summary = reshard(args.db, args.shards, keep_old=args.keep_old)
+    if summary['from'] == summary['to']:
+        print(f"⏭️  Already using {args.shards} shard(s)")
+        return
+    print(f"\n✅ {summary['from']} -> {summary['to']} shard(s) in {summary['seconds']}s")
+
+if __name__ == '__main__':
+    main()
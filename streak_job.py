@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+iLearnHow Streak Recomputation Job
+Rebuilds streaks and goal flags for every user from lesson_progress in bulk
+
+Run nightly (e.g. from cron) to repair drift in habit_formation:
+    python streak_job.py --db ilearnhow.db [--as-of 2025-01-31]
+"""
+
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+import db_pool
+import sharding
+
+# Goal thresholds: active days needed inside the trailing window
+WEEKLY_GOAL_DAYS = 5
+WEEKLY_WINDOW_DAYS = 7
+MONTHLY_GOAL_DAYS = 20
+MONTHLY_WINDOW_DAYS = 30
+
+ACTIVITY_SQL = '''
+    SELECT DISTINCT user_id, substr(completed_at, 1, 10) AS activity_date
+    FROM lesson_progress
+    WHERE completed AND completed_at IS NOT NULL
+    ORDER BY user_id, activity_date
+'''
+
+# Recorded longest streaks survive even if the rows behind them were rewritten
+HABIT_REPAIR_SQL = '''
+    UPDATE habit_formation
+    SET streak_days = ?,
+        longest_streak = MAX(longest_streak, ?),
+        current_streak_start = ?,
+        last_activity_date = ?,
+        daily_goal_met = ?,
+        weekly_goal_met = ?,
+        monthly_goal_met = ?,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE user_id = ?
+'''
+
+HABIT_RESET_SQL = '''
+    UPDATE habit_formation
+    SET streak_days = 0,
+        current_streak_start = NULL,
+        daily_goal_met = FALSE,
+        weekly_goal_met = FALSE,
+        monthly_goal_met = FALSE,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+def compute_streaks(user_ids, days, as_of):
+    """Per-user streak stats from activity sorted by (user_id, day)
+
+    `days` are distinct day numbers per user (days since the epoch) and
+    `as_of` is the day number the current streak and goals are judged on.
+    Returns a dict of equal-length arrays, one entry per user.
+    """
+    keep = days <= as_of
+    user_ids = user_ids[keep]
+    days = days[keep]
+    n = len(days)
+    if n == 0:
+        empty = np.array([], dtype=np.int64)
+        return {key: empty for key in (
+            'user_id', 'streak_days', 'longest_streak', 'streak_start', 'last_day',
+            'daily_goal_met', 'weekly_goal_met', 'monthly_goal_met'
+        )}
+
+    # A run breaks wherever the user changes or consecutive days have a gap
+    new_user = np.ones(n, dtype=bool)
+    new_user[1:] = user_ids[1:] != user_ids[:-1]
+    new_run = new_user.copy()
+    new_run[1:] |= np.diff(days) != 1
+
+    run_starts = np.flatnonzero(new_run)
+    run_lengths = np.diff(np.append(run_starts, n))
+
+    # Index of each user's first and last run within the run arrays
+    user_first_run = np.flatnonzero(new_user[run_starts])
+    user_last_run = np.append(user_first_run[1:], len(run_starts)) - 1
+
+    user_starts = np.flatnonzero(new_user)
+    user_ends = np.append(user_starts[1:], n) - 1
+    last_day = days[user_ends]
+
+    # A streak is still alive if the last activity was today or yesterday
+    alive = last_day >= as_of - 1
+    streak_days = np.where(alive, run_lengths[user_last_run], 0)
+    streak_start = np.where(alive, days[run_starts[user_last_run]], -1)
+
+    user_index = np.cumsum(new_user) - 1
+    user_count = len(user_starts)
+
+    def active_days_within(window):
+        in_window = days > as_of - window
+        return np.bincount(user_index, weights=in_window, minlength=user_count)
+
+    return {
+        'user_id': user_ids[user_starts],
+        'streak_days': streak_days,
+        'longest_streak': np.maximum.reduceat(run_lengths, user_first_run),
+        'streak_start': streak_start,
+        'last_day': last_day,
+        'daily_goal_met': last_day == as_of,
+        'weekly_goal_met': active_days_within(WEEKLY_WINDOW_DAYS) >= WEEKLY_GOAL_DAYS,
+        'monthly_goal_met': active_days_within(MONTHLY_WINDOW_DAYS) >= MONTHLY_GOAL_DAYS
+    }
+
+def day_number(value):
+    """Days since the epoch for a date or ISO date string"""
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+def iso_day(number):
+    """ISO date string for a day number"""
+    return str(np.datetime64(int(number), 'D'))
+
+def recompute_streaks(conn, as_of=None):
+    """Recompute habit_formation for all users in one transaction"""
+    as_of = day_number(as_of or date.today())
+
+    # Read and repair under one write lock, so a completion recorded meanwhile
+    # is neither missed by the read nor overwritten by the repair
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        summary = _recompute_locked(conn, as_of)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return summary
+
+def _recompute_locked(conn, as_of):
+    """Rebuild every habit row inside the caller's write transaction"""
+    rows = conn.execute(ACTIVITY_SQL).fetchall()
+    user_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    days = np.array([row[1] for row in rows], dtype='datetime64[D]').astype(np.int64)
+
+    stats = compute_streaks(user_ids, days, as_of)
+
+    updates = [
+        (
+            int(streak), int(longest),
+            iso_day(start) if start >= 0 else None,
+            iso_day(last),
+            bool(daily), bool(weekly), bool(monthly),
+            int(user_id)
+        )
+        for user_id, streak, longest, start, last, daily, weekly, monthly in zip(
+            stats['user_id'], stats['streak_days'], stats['longest_streak'],
+            stats['streak_start'], stats['last_day'], stats['daily_goal_met'],
+            stats['weekly_goal_met'], stats['monthly_goal_met']
+        )
+    ]
+
+    # Users with no qualifying activity lose their streak and goals
+    conn.execute(HABIT_RESET_SQL)
+    conn.executemany(HABIT_REPAIR_SQL, updates)
+
+    return {
+        'activity_days': len(rows),
+        'active_users': len(updates),
+        'live_streaks': int(np.count_nonzero(stats['streak_days'])),
+        'weekly_goals_met': int(np.count_nonzero(stats['weekly_goal_met'])),
+        'monthly_goals_met': int(np.count_nonzero(stats['monthly_goal_met']))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute habit streaks from lesson progress')
+    parser.add_argument('--db', default='ilearnhow.db', help='database path')
+    parser.add_argument('--as-of', help='judge streaks and goals on this date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    print(f"🔧 Recomputing streaks in {args.db}...")
+    started = time.perf_counter()
+
+    # Progress and habits for a user always share a file, so each shard is independent
+    for path in sharding.user_data_paths(args.db):
+        conn = db_pool.connect(path)
+        try:
+            summary = recompute_streaks(conn, args.as_of)
+        finally:
+            conn.close()
+
+        print(f"  {path}:")
+        for key, value in summary.items():
+            print(f"    {key}: {value}")
+    print(f"\n✅ Streaks recomputed in {time.perf_counter() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
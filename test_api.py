@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Tests for the Flask backend, driven through the Flask test client
+"""
+
+import sqlite3
+
+import pytest
+
+import app as backend
+
+@pytest.fixture
+def client(tmp_path):
+    """Test client bound to a fresh database"""
+    backend.app.config['DATABASE'] = str(tmp_path / 'ilearnhow.db')
+    backend.init_db()
+    backend.user_cache.clear()
+    yield backend.app.test_client()
+    backend.get_db_pool().close_all()
+
+def register(client, username='learner'):
+    response = client.post('/api/auth/register', json={
+        'username': username,
+        'password': 'secret123'
+    })
+    assert response.status_code == 201
+    return response.get_json()['user_id']
+
+def test_connections_are_reused_across_requests(client):
+    register(client)
+    for _ in range(5):
+        assert client.get('/api/lessons/progress').status_code == 200
+
+    stats = backend.get_db_pool().stats()
+    assert stats['size'] == 1
+    assert stats['in_use'] == 0
+
+def test_pooled_connections_use_wal(client):
+    with backend.app.app_context():
+        conn = backend.get_db()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+
+def test_failed_request_rolls_back_before_release(client):
+    pool = backend.get_db_pool()
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO users (username, password_hash) VALUES ('ghost', 'x')")
+        assert conn.in_transaction
+
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+
+def test_batch_sync_writes_all_updates(client):
+    register(client)
+    response = client.post('/api/lessons/progress/batch', json={'updates': [
+        {'lesson_day': 1, 'phase': phase, 'completed': True, 'answers': ['A'], 'time_spent': 30}
+        for phase in range(1, 6)
+    ] + [{'lesson_day': 2, 'phase': 1, 'time_spent': 12}]})
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 6
+
+    progress = client.get('/api/lessons/progress').get_json()['progress']
+    assert [(row['lesson_day'], row['phase']) for row in progress] == (
+        [(1, phase) for phase in range(1, 6)] + [(2, 1)]
+    )
+    assert client.get('/api/habits/status').get_json()['streak_days'] == 1
+
+def test_batch_sync_rejects_invalid_entries_atomically(client):
+    register(client)
+    response = client.post('/api/lessons/progress/batch', json={'updates': [
+        {'lesson_day': 1, 'phase': 1, 'completed': True},
+        {'lesson_day': 1, 'phase': 9}
+    ]})
+    assert response.status_code == 400
+    assert 'index 1' in response.get_json()['error']
+    assert client.get('/api/lessons/progress').get_json()['progress'] == []
+
+def test_delta_sync_returns_only_rows_changed_since_cursor(client):
+    register(client)
+    client.post('/api/lessons/progress/batch', json={'updates': [
+        {'lesson_day': day, 'phase': 1, 'time_spent': 10} for day in range(1, 6)
+    ]})
+    cursor = client.get('/api/lessons/progress').get_json()['cursor']
+
+    client.post('/api/lessons/progress', json={'lesson_day': 3, 'phase': 1, 'time_spent': 99})
+    delta = client.get(f'/api/lessons/progress?since={cursor}').get_json()
+    assert [(row['lesson_day'], row['time_spent']) for row in delta['progress']] == [(3, 99)]
+    assert delta['cursor'] > cursor
+    assert not delta['has_more']
+
+    empty = client.get(f"/api/lessons/progress?since={delta['cursor']}").get_json()
+    assert empty['progress'] == [] and empty['cursor'] == delta['cursor']
+
+def test_first_sync_pages_with_keyset_cursor(client):
+    register(client)
+    client.post('/api/lessons/progress/batch', json={'updates': [
+        {'lesson_day': day, 'phase': phase} for day in range(1, 4) for phase in range(1, 6)
+    ]})
+
+    seen, cursor, has_more = [], 0, True
+    while has_more:
+        page = client.get(f'/api/lessons/progress?since={cursor}&limit=4').get_json()
+        assert len(page['progress']) <= 4
+        seen.extend((row['lesson_day'], row['phase']) for row in page['progress'])
+        cursor, has_more = page['cursor'], page['has_more']
+    assert sorted(seen) == [(day, phase) for day in range(1, 4) for phase in range(1, 6)]
+
+def test_heartbeats_are_merged_and_written_behind(client):
+    register(client)
+    for seconds in (10, 15, 5):
+        assert client.post('/api/lessons/progress/heartbeat', json={
+            'lesson_day': 1, 'phase': 2, 'seconds': seconds
+        }).status_code == 202
+    client.post('/api/lessons/progress/heartbeat', json={'lesson_day': 1, 'phase': 3, 'seconds': 7})
+    assert client.post('/api/lessons/progress/heartbeat', json={
+        'lesson_day': 1, 'phase': 2, 'seconds': 0
+    }).status_code == 400
+    assert client.get('/api/lessons/progress').get_json()['progress'] == []
+
+    # A full write for phase 3 supersedes its buffered increment
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 3, 'completed': True,
+                                               'time_spent': 40})
+    assert backend.heartbeats.flush() == 1
+    assert backend.heartbeats.flush() == 0
+
+    client.post('/api/lessons/progress/heartbeat', json={'lesson_day': 1, 'phase': 2, 'seconds': 20})
+    backend.flush_heartbeats_at_exit()
+    progress = client.get('/api/lessons/progress?day=1').get_json()['progress']
+    assert [(row['phase'], row['time_spent']) for row in progress] == [(2, 50), (3, 40)]
+
+def test_failed_heartbeat_flush_skips_keys_superseded_meanwhile(client, monkeypatch):
+    user_id = register(client)
+    for phase in (2, 3):
+        client.post('/api/lessons/progress/heartbeat', json={'lesson_day': 1, 'phase': phase, 'seconds': 30})
+    
+    def failing_write(conn, rows):
+        # A full progress write for phase 3 lands while this flush is in flight
+        backend.heartbeats.discard(user_id, 1, 3)
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(backend, 'write_heartbeats', failing_write)
+    monkeypatch.setattr(backend.heartbeats, 'max_pending', 1)
+    backend.heartbeats._wake.clear()
+    with pytest.raises(sqlite3.OperationalError):
+        backend.heartbeats.flush()
+    
+    # Only phase 2 comes back, and merging it back does not re-wake the flusher
+    assert backend.heartbeats._pending == {(user_id, 1, 2): 30}
+    assert not backend.heartbeats._wake.is_set()
+    monkeypatch.undo()
+    assert backend.heartbeats.flush() == 1
+
+def test_lesson_resolves_requested_variant(client):
+    response = client.get('/api/lessons/1?age_group=age_8&tone=fun&language=spanish')
+    assert response.status_code == 200
+    lesson = response.get_json()
+    assert lesson['content_status'] == 'available'
+    assert lesson['variant'] == {'age_group': 'age_8', 'tone': 'fun', 'language': 'spanish'}
+    assert [lesson['phases'][str(n)]['type'] for n in range(1, 6)] == [
+        'welcome', 'question_1', 'question_2', 'question_3', 'daily_fortune'
+    ]
+    assert len(lesson['phases']['2']['choices']) == 2
+
+    grandmother = client.get('/api/lessons/1?age_group=age_8&tone=grandmother').get_json()
+    assert grandmother['phases']['2']['content'] != lesson['phases']['2']['content']
+
+def test_lesson_variants_are_rendered_once(client):
+    backend.lesson_index.render.cache_clear()
+    backend.lesson_index.render_encoded.cache_clear()
+    for _ in range(3):
+        client.get('/api/lessons/1?tone=fun')
+    info = backend.lesson_index.render_encoded.cache_info()
+    assert info.misses == 1 and info.hits == 2
+    assert backend.lesson_index.render.cache_info().misses == 1
+
+def test_lesson_rejects_unknown_variant(client):
+    response = client.get('/api/lessons/1?tone=sarcastic')
+    assert response.status_code == 400
+    assert response.get_json()['allowed'] == ['grandmother', 'fun', 'neutral']
+
+def test_lesson_conditional_get_returns_304(client):
+    first = client.get('/api/lessons/1?age_group=age_5')
+    assert first.headers['ETag']
+    assert 's-maxage=' in first.headers['Cache-Control']
+
+    again = client.get('/api/lessons/1?age_group=age_5',
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+
+    other = client.get('/api/lessons/1?age_group=age_80',
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert other.status_code == 200
+    assert other.headers['ETag'] != first.headers['ETag']
+
+def test_user_reads_are_cached_until_the_user_writes(client):
+    register(client)
+    client.get('/api/habits/status')
+    client.get('/api/user/preferences')
+    before = backend.user_cache.stats()
+    assert client.get('/api/habits/status').get_json()['streak_days'] == 0
+    assert client.get('/api/user/preferences').get_json() == {}
+    assert backend.user_cache.stats()['hits'] == before['hits'] + 2
+
+    client.put('/api/user/preferences', json={'tone': 'fun'})
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 1, 'completed': True})
+    assert client.get('/api/user/preferences').get_json() == {'tone': 'fun'}
+    assert client.get('/api/habits/status').get_json()['streak_days'] == 1
+
+def test_ttl_cache_skips_set_after_concurrent_invalidation():
+    cache = backend.TTLCache(max_entries=2, ttl=60)
+    generation = cache.generation()
+    cache.invalidate(('user', 1))
+    assert not cache.set(('user', 1), 'stale', generation)
+    assert cache.get(('user', 1)) is None
+
+    for key in range(3):
+        cache.set(key, key)
+    assert cache.get(0) is None and cache.stats()['evictions'] == 1
+
+def test_bootstrap_returns_startup_state_in_one_call(client):
+    register(client)
+    client.put('/api/user/preferences', json={'tone': 'grandmother', 'age_group': 'age_8'})
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 1, 'completed': True})
+
+    data = client.get('/api/bootstrap?day=1&include_lesson=1').get_json()
+    assert data['authenticated'] and data['username'] == 'learner'
+    assert data['preferences'] == {'tone': 'grandmother', 'age_group': 'age_8'}
+    assert data['habits']['streak_days'] == 1
+    assert [row['phase'] for row in data['today']['progress']] == [1]
+    assert data['today']['cursor'] == 1
+    assert data['lesson']['variant'] == {'age_group': 'age_8', 'tone': 'grandmother', 'language': 'english'}
+    assert data['lesson_etag']
+
+def test_bootstrap_requires_login(client):
+    assert client.get('/api/bootstrap').status_code == 401
+
+def test_daily_goal_is_judged_on_today(client):
+    user_id = register(client)
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 1, 'completed': True})
+    assert client.get('/api/habits/status').get_json()['daily_goal_met'] is True
+
+    # Yesterday's activity leaves the stored flag set until the nightly job runs
+    conn = sqlite3.connect(backend.app.config['DATABASE'])
+    conn.execute("UPDATE habit_formation SET last_activity_date = date('now', 'localtime', '-1 day') "
+                 "WHERE user_id = ?", (user_id,))
+    conn.commit()
+    conn.close()
+    backend.user_cache.clear()
+    assert client.get('/api/habits/status').get_json()['daily_goal_met'] is False
+    assert client.get('/api/bootstrap').get_json()['habits']['daily_goal_met'] is False
+
+def test_metrics_reads_maintained_counters(client):
+    register(client)
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 1, 'completed': True})
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 2})
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 2, 'completed': True})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    assert 'ilearnhow_users 1\n' in body
+    assert 'ilearnhow_lesson_progress_rows 2\n' in body
+    assert 'ilearnhow_lesson_completions_total 2\n' in body
+    # The histogram is per worker process, so earlier tests add to it too
+    assert ('ilearnhow_request_duration_seconds_count'
+            '{endpoint="update_lesson_progress",method="POST",status="200"} ') in body
+
+def test_completions_today_uses_the_local_day(client, monkeypatch):
+    import time
+    from datetime import datetime, timezone
+
+    # Pick a zone whose date differs from UTC's right now
+    zone = 'Etc/GMT-14' if datetime.now(timezone.utc).hour >= 10 else 'Etc/GMT+12'
+    monkeypatch.setenv('TZ', zone)
+    time.tzset()
+    try:
+        register(client)
+        client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 1, 'completed': True})
+        body = client.get('/metrics').get_data(as_text=True)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert 'ilearnhow_lesson_completions_today 1\n' in body
+
+def test_sharded_storage_routes_per_user_rows(client):
+    import sqlite3
+    import sharding
+
+    user_ids = []
+    for n in range(6):
+        response = client.post('/api/auth/register', json={
+            'username': f'learner{n}', 'email': f'learner{n}@example.com', 'password': 'secret123'
+        })
+        user_ids.append(response.get_json()['user_id'])
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 1, 'completed': True})
+
+    db_path = backend.app.config['DATABASE']
+    backend.get_shard_router().close_all()
+    sharding.reshard(db_path, 3, report=lambda line: None)
+    backend.init_db()
+    assert backend.app.config['DB_SHARDS'] == 3
+
+    # Existing user (the last registered) keeps their progress after the move
+    response = client.get('/api/lessons/progress')
+    assert [row['phase'] for row in response.get_json()['progress']] == [1]
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 2, 'completed': True})
+    bootstrap = client.get('/api/bootstrap?day=1').get_json()
+    assert [row['phase'] for row in bootstrap['today']['progress']] == [1, 2]
+    assert bootstrap['habits']['streak_days'] == 1
+    assert bootstrap['username'] == 'learner5'
+
+    backend.get_shard_router().close_all()
+    shard_rows = {}
+    for index in range(3):
+        conn = sqlite3.connect(sharding.shard_path(db_path, index, 3))
+        for (user_id,) in conn.execute('SELECT user_id FROM habit_formation'):
+            shard_rows[user_id] = index
+        conn.close()
+    assert shard_rows == {user_id: sharding.shard_index(user_id, 3) for user_id in user_ids}
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM lesson_progress').fetchone()[0] == 0
+    conn.close()
+    assert 'ilearnhow_lesson_progress_rows 2\n' in client.get('/metrics').get_data(as_text=True)
+
+    # Folding back into one file keeps every row
+    backend.get_shard_router().close_all()
+    sharding.reshard(db_path, 1, report=lambda line: None)
+    backend.init_db()
+    assert backend.app.config['DB_SHARDS'] == 1
+    assert len(client.get('/api/lessons/progress').get_json()['progress']) == 2
+
+def test_concurrent_first_requests_share_one_shard_router(client, monkeypatch):
+    import threading
+    import time
+    import sharding
+
+    class SlowRouter(sharding.ShardRouter):
+        def __init__(self, *args, **kwargs):
+            time.sleep(0.05)  # widen the window between the check and the assignment
+            super().__init__(*args, **kwargs)
+
+    backend.get_shard_router().close_all()
+    backend._shard_router = None
+    monkeypatch.setattr(sharding, 'ShardRouter', SlowRouter)
+    start = threading.Barrier(8)
+    routers = []
+
+    def first_request():
+        start.wait()
+        routers.append(backend.get_shard_router())
+
+    threads = [threading.Thread(target=first_request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(router) for router in routers}) == 1
+
+def test_register_timed_out_behind_stalled_writer_leaves_nothing(client):
+    import threading
+
+    writer = backend.get_writer()
+    writer.ack_timeout = 0.2
+    release = threading.Event()
+    stall = writer.submit(lambda conn: release.wait(5))
+    try:
+        response = client.post('/api/auth/register', json={'username': 'late', 'password': 'secret123'})
+        assert response.status_code == 503
+    finally:
+        release.set()
+        writer.wait(stall)
+        writer.ack_timeout = 10.0
+
+    # The cancelled insert never ran, so the name is still free and fully usable
+    register(client, 'late')
+    assert client.get('/api/habits/status').status_code == 200
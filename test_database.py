@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Tests for the database setup utilities
+"""
+
+import sqlite3
+
+import pytest
+
+import database
+import streak_job
+
+def test_synthetic_data_is_consistent(tmp_path):
+    db_path = str(tmp_path / 'synthetic.db')
+    summary = database.generate_synthetic_data(db_path, users=300, days=60, seed=7)
+    assert summary['progress_rows'] > 0
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 300
+    assert conn.execute('SELECT COUNT(*) FROM lesson_progress').fetchone()[0] == summary['progress_rows']
+
+    # Loaded cursors are exactly 1..n per user, as the triggers would have made them
+    assert conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT user_id FROM lesson_progress GROUP BY user_id
+            HAVING MIN(change_seq) != 1 OR MAX(change_seq) != COUNT(*)
+        )
+    ''').fetchone()[0] == 0
+
+    # Stored streaks already match what the nightly job computes
+    before = conn.execute('SELECT * FROM habit_formation ORDER BY user_id').fetchall()
+    streak_job.recompute_streaks(conn, as_of='2025-03-01')
+    after = conn.execute('SELECT * FROM habit_formation ORDER BY user_id').fetchall()
+    strip = lambda rows: [row[:10] for row in rows]  # ignore updated_at
+    assert strip(after) == strip(before)
+    conn.close()
+
+def test_online_backup_is_consistent_and_rotated(tmp_path):
+    import gzip
+
+    db_path = str(tmp_path / 'ilearnhow.db')
+    database.generate_synthetic_data(db_path, users=20, days=10)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute("INSERT INTO users (username, password_hash) VALUES ('late', 'x')")
+    conn.commit()
+
+    backup_dir = tmp_path / 'backups'
+    backup_dir.mkdir()
+    for stamp in ('20240101_000000', '20240102_000000', '20240103_000000'):
+        (backup_dir / f'ilearnhow_backup_{stamp}.db').write_bytes(b'old')
+
+    path = database.backup_database(db_path, str(backup_dir), pages_per_step=2, step_sleep=0,
+                                    compress=True, keep=2)
+    conn.close()
+
+    assert path.endswith('.db.gz')
+    assert sorted(p.name for p in backup_dir.iterdir()) == [
+        'ilearnhow_backup_20240103_000000.db', path.rsplit('/', 1)[-1]
+    ]
+
+    restored = tmp_path / 'restored.db'
+    restored.write_bytes(gzip.decompress(open(path, 'rb').read()))
+    copy = sqlite3.connect(str(restored))
+    assert copy.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    assert copy.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert copy.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 21
+    copy.close()
+
+def test_online_backup_completes_under_steady_writes(tmp_path):
+    import threading
+    import time
+
+    db_path = str(tmp_path / 'ilearnhow.db')
+    database.generate_synthetic_data(db_path, users=200, days=30)
+    writer = sqlite3.connect(db_path, check_same_thread=False)
+    writer.execute('PRAGMA journal_mode = WAL')
+
+    backup_dir = str(tmp_path / 'backups')
+    result = {}
+    backup = threading.Thread(target=lambda: result.update(path=database.backup_database(
+        db_path, backup_dir, pages_per_step=4, step_sleep=0.005
+    )), daemon=True)
+    backup.start()
+
+    # A commit between every few backup steps used to restart the copy each time
+    deadline = time.time() + 20
+    writes = 0
+    while backup.is_alive() and time.time() < deadline:
+        writer.execute('UPDATE habit_formation SET streak_days = streak_days + 1 WHERE user_id = ?',
+                       (writes % 200 + 1,))
+        writer.commit()
+        writes += 1
+        time.sleep(0.002)
+    finished_under_load = not backup.is_alive()
+    writer.close()
+    backup.join()
+
+    assert finished_under_load and writes > 10
+    copy = sqlite3.connect(result['path'])
+    assert copy.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert copy.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 200
+    copy.close()
+
+def test_reshard_round_trip_keeps_rows_and_counters(tmp_path):
+    import sharding
+
+    db_path = str(tmp_path / 'ilearnhow.db')
+    database.generate_synthetic_data(db_path, users=40, days=20)
+    before = database.get_database_stats(db_path)
+
+    sharding.reshard(db_path, 4, report=lambda line: None)
+    assert database.get_database_stats(db_path) == before
+    for index, path in enumerate(sharding.user_data_paths(db_path)):
+        conn = sqlite3.connect(path)
+        user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM lesson_progress')]
+        assert user_ids and all(sharding.shard_index(u, 4) == index for u in user_ids)
+        conn.close()
+
+    sharding.reshard(db_path, 1, report=lambda line: None)
+    assert database.get_database_stats(db_path) == before
+    assert sharding.user_data_paths(db_path) == [db_path]
+
+def test_sharded_synthetic_load_and_backup_cover_every_shard(tmp_path):
+    import sharding
+
+    db_path = str(tmp_path / 'ilearnhow.db')
+    sharding.reshard(db_path, 2, report=lambda line: None)
+    summary = database.generate_synthetic_data(db_path, users=60, days=20)
+    stats = database.get_database_stats(db_path)
+    assert stats['users'] == 60 and stats['progress_entries'] == summary['progress_rows']
+
+    main = sqlite3.connect(db_path)
+    assert main.execute('SELECT COUNT(*) FROM lesson_progress').fetchone()[0] == 0
+    main.close()
+    for index, path in enumerate(sharding.user_data_paths(db_path)):
+        conn = sqlite3.connect(path)
+        user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM lesson_progress')]
+        assert user_ids and all(sharding.shard_index(u, 2) == index for u in user_ids)
+        conn.close()
+
+    backup_dir = tmp_path / 'backups'
+    backup_dir.mkdir()
+    for name in ('ilearnhow_backup_20240101_000000.db', 'ilearnhow_backup_20240101_000000.shard0of2.db',
+                 'ilearnhow_backup_20240101_000000.shard1of2.db'):
+        (backup_dir / name).write_bytes(b'old')
+    path = database.backup_database(db_path, str(backup_dir), keep=1)
+
+    # The old set rotates out whole; the new main backup restores with its shards beside it
+    stem = path.rsplit('/', 1)[-1][:-len('.db')]
+    assert sorted(p.name for p in backup_dir.iterdir()) == [
+        f'{stem}.db', f'{stem}.shard0of2.db', f'{stem}.shard1of2.db'
+    ]
+    assert database.get_database_stats(path) == stats
+
+def test_failed_synthetic_load_leaves_existing_data_intact(tmp_path):
+    db_path = str(tmp_path / 'ilearnhow.db')
+    database.init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('real', 'r@x', 'x')")
+    # Rows the synthetic users (ids 2..) will collide with, failing the progress load
+    conn.executemany(
+        'INSERT INTO lesson_progress (user_id, lesson_day, phase, completed) VALUES (?, ?, 1, 1)',
+        [(user_id, day) for user_id in range(2, 52) for day in range(1, 11)]
+    )
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        database.generate_synthetic_data(db_path, users=50, days=10)
+
+    # The failed transaction rolled back through its journal; earlier rows are untouched
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'real'").fetchone()[0] == 1
+    assert conn.execute('SELECT COUNT(*) FROM lesson_progress').fetchone()[0] == 500
+    conn.close()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Tests for loading lesson sources into the lesson index
+"""
+
+import os
+import shutil
+
+from lesson_index import LessonIndex
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def test_day_collisions_name_both_files(tmp_path, capsys):
+    (tmp_path / 'lessons').mkdir()
+    for name in ('puppies-lesson.json', 'puppies-lesson-fun.json'):
+        shutil.copy(os.path.join(ROOT, 'lessons', name), tmp_path / 'lessons' / name)
+
+    index = LessonIndex.from_directory(str(tmp_path))
+    warning = capsys.readouterr().out
+    assert 'Day 15 is claimed by both' in warning
+    assert 'puppies-lesson-fun.json' in warning and 'puppies-lesson.json;' in warning
+    assert index.lessons[15].source.endswith('puppies-lesson.json')
+
+    LessonIndex.from_directory(str(tmp_path), quiet=True)
+    assert capsys.readouterr().out == ''
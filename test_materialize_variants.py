@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Tests for the lesson variant materializer
+"""
+
+import os
+import sqlite3
+
+import materialize_variants
+from lesson_index import LessonIndex, AGE_GROUPS, TONES, LANGUAGES, AVATARS
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def test_materialize_day_range_then_resume_from_checkpoints(tmp_path):
+    db_path = str(tmp_path / 'fresh.db')
+    index = LessonIndex.from_directory(ROOT, quiet=True)
+    days = {day for day in index.lessons if day <= 15}
+    assert days
+
+    summary = materialize_variants.materialize(db_path, ROOT, workers=1, days=set(range(1, 16)),
+                                               transaction_rows=500, report=lambda line: None)
+
+    conn = sqlite3.connect(db_path)
+    expected = {}
+    for day in days:
+        phases = len(index.render(day, AGE_GROUPS[0], TONES[0], LANGUAGES[0])['phases'])
+        expected[day] = len(TONES) * len(LANGUAGES) * len(AVATARS) * phases
+    assert summary['units'] == len(days) * len(AGE_GROUPS)
+    assert summary['rows'] == sum(expected.values()) * len(AGE_GROUPS)
+    assert dict(conn.execute('''
+        SELECT lesson_day, COUNT(*) / COUNT(DISTINCT age_group) FROM lesson_variants
+        GROUP BY lesson_day
+    ''')) == expected
+    assert conn.execute('SELECT COUNT(*) FROM variant_materialization').fetchone()[0] == summary['units']
+    conn.close()
+
+    # Every unit is checkpointed, so a second run finds nothing left to do
+    again = materialize_variants.materialize(db_path, ROOT, workers=1, days=set(range(1, 16)),
+                                             report=lambda line: None)
+    assert again['units'] == 0 and again['rows'] == 0
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLAlchemy helpers in models.py
+"""
+
+import pytest
+
+import models
+
+@pytest.fixture
+def database_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'models.db'}"
+    models.init_database(url)
+    yield url
+    models.dispose_engines()
+
+def test_helpers_share_one_engine(database_url):
+    engine = models.get_engine(database_url)
+    user = models.create_user('learner', 'hash', database_url=database_url)
+    models.get_user_by_username('learner', database_url=database_url)
+    models.get_habit_status(user.id, database_url=database_url)
+
+    assert models.get_engine(database_url) is engine
+    assert engine.pool.checkedout() == 0
+
+def test_helpers_return_usable_snapshots(database_url):
+    user = models.create_user('learner', 'hash', email='l@example.com', database_url=database_url)
+    models.update_lesson_progress(user.id, 1, 2, completed=True, answers=['B'], database_url=database_url)
+    habit = models.update_habit_formation(user.id, 1, database_url=database_url)
+
+    progress = models.get_user_progress(user.id, database_url=database_url)
+    assert [(row.phase, row.get_answers()) for row in progress] == [(2, ['B'])]
+    assert habit.streak_days == 1
+    assert models.get_user_by_username('learner', database_url=database_url).email == 'l@example.com'
+
+def test_session_scope_rolls_back_on_error(database_url):
+    with pytest.raises(RuntimeError):
+        with models.session_scope(database_url) as session:
+            session.add(models.User(username='ghost', password_hash='x'))
+            session.flush()
+            raise RuntimeError('boom')
+
+    assert models.get_user_by_username('ghost', database_url=database_url) is None
+
+def test_bulk_upsert_inserts_then_updates(database_url):
+    user = models.create_user('learner', 'hash', database_url=database_url)
+    rows = [{'user_id': user.id, 'lesson_day': 1, 'phase': phase, 'time_spent': 10}
+            for phase in range(1, 6)]
+    assert models.bulk_upsert_progress(rows, database_url=database_url) == 5
+
+    rows[0].update(completed=True, answers=['A'], time_spent=99)
+    models.bulk_upsert_progress(rows[:1], database_url=database_url)
+
+    progress = models.get_user_progress(user.id, database_url=database_url)
+    assert len(progress) == 5
+    assert (progress[0].completed, progress[0].get_answers(), progress[0].time_spent) == (True, ['A'], 99)
+    assert progress[0].completed_at is not None
+
+def test_dashboard_loads_in_constant_queries(database_url):
+    from sqlalchemy import event
+
+    user = models.create_user('learner', 'hash', database_url=database_url)
+    models.update_habit_formation(user.id, 1, database_url=database_url)
+    models.bulk_upsert_progress([
+        {'user_id': user.id, 'lesson_day': day, 'phase': phase, 'completed': True}
+        for day in range(1, 31) for phase in range(1, 6)
+    ], database_url=database_url)
+
+    statements = []
+    engine = models.get_engine(database_url)
+    listener = lambda conn, cursor, sql, *args: statements.append(sql)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        dashboard = models.load_user_dashboard(user.id, database_url=database_url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+    assert len([sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]) == 2
+    assert dashboard.user.username == 'learner'
+    assert dashboard.habit.streak_days == 1
+    assert len(dashboard.progress) == 150
+    assert (dashboard.progress[-1].lesson_day, dashboard.progress[-1].phase) == (30, 5)
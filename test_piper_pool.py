@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the Piper worker pools, run against the stand-in piper from conftest.py
+"""
+
+import time
+
+import pytest
+
+from piper_pool import PiperPool, RawPiperPool, PiperError, PoolTimeout, wav_duration
+
+VOICES = {'kelly': 'en_US-amy-medium'}
+
+@pytest.fixture
+def pool(piper_command, tmp_path):
+    pool = PiperPool(VOICES, workers_per_voice=1, command=piper_command,
+                     acquire_timeout=0.2, health_check_interval=0, output_dir=str(tmp_path))
+    yield pool
+    pool.close()
+
+def test_pool_synthesizes_with_warm_worker(pool):
+    audio, duration = pool.synthesize('kelly', 'one two three')
+    assert audio[:4] == b'RIFF' and duration == pytest.approx(0.3)
+    assert wav_duration(audio) == duration
+
+    pool.synthesize('kelly', 'again')
+    worker = pool.stats()['voices']['kelly']['workers'][0]
+    assert (worker['requests'], worker['restarts']) == (2, 0)
+
+def test_crash_mid_utterance_restarts_worker_and_retries_once(pool):
+    audio, duration = pool.synthesize('kelly', 'crash once')
+    assert duration == pytest.approx(0.2)
+    worker = pool.stats()['voices']['kelly']['workers'][0]
+    assert (worker['failures'], worker['restarts'], worker['alive']) == (1, 1, True)
+
+    # A crash on the retry too is reported, and the next request still finds a live worker
+    with pytest.raises(PiperError):
+        pool.synthesize('kelly', 'crash')
+    assert pool.synthesize('kelly', 'fine')[1] == pytest.approx(0.1)
+
+def test_stalled_worker_times_out_and_is_replaced(pool):
+    worker = pool._workers['kelly'][0]
+    started = time.perf_counter()
+    with pytest.raises(PiperError, match='produced nothing'):
+        pool.synthesize('kelly', 'hang', timeout=0.3)
+    # Two stalls and two immediate kills: the retry and the final replacement
+    assert time.perf_counter() - started < 2
+    assert (worker.failures, worker.restarts) == (2, 2)
+
+    # The hung process is gone, so the next request is answered first time
+    assert pool.synthesize('kelly', 'two words', timeout=2)[1] == pytest.approx(0.2)
+    assert worker.failures == 2
+
+def test_health_check_restarts_killed_idle_worker(pool):
+    worker = pool._workers['kelly'][0]
+    worker.process.kill()
+    worker.process.wait()
+    assert not pool.healthy()
+
+    assert pool.check_health() == 1
+    assert pool.healthy() and worker.restarts == 1
+    assert pool.synthesize('kelly', 'back')[1] == pytest.approx(0.1)
+
+def test_busy_pool_raises_pool_timeout(pool):
+    worker = pool._idle['kelly'].get()
+    try:
+        with pytest.raises(PoolTimeout):
+            pool.synthesize('kelly', 'waiting')
+    finally:
+        pool._idle['kelly'].put(worker)
+
+def test_raw_pool_reads_pcm_and_kills_stalled_process(piper_command):
+    pool = RawPiperPool(VOICES, spares_per_voice=1, command=piper_command)
+    try:
+        audio, duration = pool.synthesize('kelly', 'one two')
+        assert duration == pytest.approx(0.2) and wav_duration(audio) == duration
+
+        with pytest.raises(PiperError, match='exited'):
+            pool.synthesize('kelly', 'crash')
+        started = time.perf_counter()
+        with pytest.raises(PiperError):
+            pool.synthesize('kelly', 'hang', timeout=0.3)
+        assert time.perf_counter() - started < 3
+
+        counters = pool.stats()['voices']['kelly']
+        assert (counters['requests'], counters['failures']) == (3, 2)
+    finally:
+        pool.close()
+
+def test_raw_pool_cold_start_burst_keeps_spares_bounded(piper_command):
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = RawPiperPool(VOICES, spares_per_voice=1, command=piper_command)
+    try:
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(lambda n: pool.synthesize('kelly', 'word'), range(16)))
+        assert all(duration == pytest.approx(0.1) for _, duration in results)
+
+        # Every request used one process; refills never pushed past the spare count
+        counters = pool.stats()['voices']['kelly']
+        assert counters['warm'] == 1
+        assert counters['spawned'] <= 16 + 1 + 1
+    finally:
+        pool.close()
+
+def test_raw_pool_health_follows_failures_and_spawning(piper_command):
+    pool = RawPiperPool(VOICES, spares_per_voice=1, command=piper_command)
+    try:
+        for _ in range(3):
+            assert pool.healthy()
+            with pytest.raises(PiperError, match='exited'):
+                pool.synthesize('kelly', 'crash')
+        assert not pool.healthy()
+        pool.synthesize('kelly', 'word')
+        assert pool.healthy()
+
+        # The warm spare still answers, but its replacement cannot start
+        pool.command = piper_command + '-missing'
+        pool.synthesize('kelly', 'word')
+        assert not pool.healthy()
+        with pytest.raises(PiperError, match='Could not start'):
+            pool.synthesize('kelly', 'word')
+
+        pool.command = piper_command
+        pool.synthesize('kelly', 'word')
+        assert pool.healthy()
+        counters = pool.stats()['voices']['kelly']
+        assert (counters['failures'], counters['spawn_failures']) == (4, 2)
+    finally:
+        pool.close()
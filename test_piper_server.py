@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the Piper TTS server, driven through the Flask test client
+with pools running the stand-in piper from conftest.py
+"""
+
+import importlib.util
+import json
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault('TTS_CACHE_DIR', tempfile.mkdtemp(prefix='ilearnhow-tts-test-'))
+
+from piper_pool import PiperPool
+
+# The file name is not importable as a module name
+_spec = importlib.util.spec_from_file_location(
+    'railway_piper_server', os.path.join(os.path.dirname(__file__), 'railway-piper-server.py')
+)
+server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(server)
+
+@pytest.fixture
+def client(piper_command, tmp_path):
+    """Test client whose Piper pool runs the stand-in, with an empty cache"""
+    server._piper_pool = PiperPool(server.VOICE_MODELS, workers_per_voice=1, command=piper_command,
+                                   acquire_timeout=0.2, health_check_interval=0,
+                                   output_dir=str(tmp_path))
+    server.tts_cache.clear()
+    yield server.app.test_client()
+    server._piper_pool.close()
+    server._piper_pool = None
+
+def stream_events(client, body):
+    response = client.post('/api/tts/stream', json=body)
+    assert response.status_code == 200
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        event, data = block.split('\n')
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+def test_split_sentences_groups_short_and_splits_long():
+    assert server.split_sentences('Hi. Yes. Today we learn about the moon! It changes shape.') == [
+        'Hi. Yes. Today we learn about the moon!', 'It changes shape.'
+    ]
+    # Wordless leftovers join the sentence before them instead of becoming silent chunks
+    assert server.split_sentences('Wait ... what is this? ...') == ['Wait ... what is this? ...']
+
+    chunks = server.split_sentences('one, ' * 100)
+    assert len(chunks) == 2 and all(len(chunk) <= server.MAX_CHUNK_CHARS for chunk in chunks)
+    assert ' '.join(chunks).split() == ('one, ' * 100).split()
+
+def test_stream_sends_chunks_in_order_then_done(client):
+    events = stream_events(client, {
+        'text': 'The moon has phases. Wait ... what is this? ... It is a crescent.',
+        'include_phonemes': True
+    })
+    assert [name for name, _ in events] == ['chunk', 'chunk', 'chunk', 'done']
+    chunks = [data for _, data in events[:-1]]
+    assert [chunk['index'] for chunk in chunks] == [0, 1, 2]
+    assert [chunk['start'] for chunk in chunks] == pytest.approx([0.0, 0.4, 0.9])
+    # "..." used to crash phoneme generation after the 200 had been sent
+    assert [len(chunk['phonemes']) for chunk in chunks] == [4 * 3, 4 * 3, 4 * 3]
+    assert events[-1][1]['duration'] == pytest.approx(1.4)
+
+def test_stream_ends_with_error_event_when_a_chunk_fails(client):
+    events = stream_events(client, {'text': 'First sentence here. crash'})
+    assert [name for name, _ in events] == ['chunk', 'error']
+    assert events[1][1]['index'] == 1
+
+def test_tts_answers_503_when_every_worker_is_busy(client):
+    idle = server._piper_pool._idle['kelly']
+    worker = idle.get()
+    try:
+        response = client.post('/api/tts', json={'text': 'Anyone there?'})
+        assert response.status_code == 503
+    finally:
+        idle.put(worker)
+    assert client.post('/api/tts', json={'text': 'Anyone there?'}).status_code == 200
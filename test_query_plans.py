@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Query plan regression tests
+Every statement the API issues must be served by an index, never a full table scan
+"""
+
+import sqlite3
+
+import pytest
+
+import app as backend
+import db_pool
+
+# Statements run inside the change_seq triggers; the trace callback does not report them
+TRIGGER_QUERIES = [
+    'SELECT COALESCE(MAX(change_seq), 0) + 1 FROM lesson_progress WHERE user_id = 1',
+]
+
+@pytest.fixture
+def traced_statements(tmp_path, monkeypatch):
+    """Fresh database whose pooled connections record every statement they run"""
+    statements = []
+    connect = db_pool.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(db_pool, 'connect', traced_connect)
+    backend.app.config['DATABASE'] = str(tmp_path / 'ilearnhow.db')
+    backend.get_db_pool().close_all()
+    backend.init_db()
+    backend.user_cache.clear()
+    del statements[:]
+    yield statements
+    backend.get_db_pool().close_all()
+
+def exercise_api(client):
+    """Hit every database-backed endpoint at least once"""
+    client.post('/api/auth/register', json={'username': 'planner', 'email': 'p@example.com',
+                                            'password': 'secret123'})
+    client.post('/api/auth/logout')
+    client.post('/api/auth/login', json={'username': 'planner', 'password': 'secret123'})
+    client.get('/api/auth/status')
+    client.post('/api/lessons/progress', json={'lesson_day': 1, 'phase': 1, 'completed': True})
+    client.post('/api/lessons/progress/batch', json={'updates': [
+        {'lesson_day': 2, 'phase': phase, 'completed': True} for phase in range(1, 6)
+    ]})
+    client.get('/api/lessons/progress')
+    client.get('/api/lessons/progress?since=1')
+    client.get('/api/habits/status')
+    client.get('/api/user/preferences')
+    client.put('/api/user/preferences', json={'tone': 'fun'})
+    backend.user_cache.clear()
+    client.get('/api/bootstrap')
+
+def full_scans(conn, sql):
+    """Tables the plan for sql reads without an index"""
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+    return [row[3] for row in plan
+            if row[3].startswith('SCAN ') and 'USING' not in row[3]]
+
+def test_api_queries_use_indexes(traced_statements):
+    exercise_api(backend.app.test_client())
+
+    queries = {
+        sql.strip() for sql in traced_statements
+        if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE', 'INSERT')
+    }
+    assert any(sql.startswith('SELECT') for sql in queries)
+
+    conn = db_pool.connect(backend.app.config['DATABASE'])
+    try:
+        offenders = {}
+        for sql in sorted(queries) + TRIGGER_QUERIES:
+            try:
+                scans = full_scans(conn, sql)
+            except sqlite3.Error:
+                continue
+            if scans:
+                offenders[sql] = scans
+    finally:
+        conn.close()
+
+    assert offenders == {}
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Tests for the expired-session sweeper
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import db_pool
+import session_sweeper
+from migrations import migrate
+
+def test_sweep_deletes_expired_and_surplus_sessions_in_batches(tmp_path):
+    conn = db_pool.connect(str(tmp_path / 'ilearnhow.db'))
+    migrate(conn)
+    now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    old = (now - timedelta(days=45)).strftime('%Y-%m-%d %H:%M:%S')
+    recent = (now - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    rows = [(1, f'old-{n}', old) for n in range(25)]
+    rows += [(2, f'busy-{n}', recent) for n in range(14)]
+    rows += [(3, 'fresh', recent)]
+    conn.executemany('INSERT INTO user_sessions (user_id, session_id, updated_at) VALUES (?, ?, ?)',
+                     [(user_id, session_id, stamp) for user_id, session_id, stamp in rows])
+    conn.commit()
+
+    report = session_sweeper.sweep_sessions(conn, keep_per_user=10, batch_rows=10, pause=0, now=now)
+    assert (report['expired'], report['over_cap'], report['remaining']) == (25, 4, 11)
+    assert report['batches'] == 4  # three expiry batches, one per-user trim
+
+    kept = [row[0] for row in conn.execute(
+        'SELECT session_id FROM user_sessions WHERE user_id = 2 ORDER BY id'
+    )]
+    assert kept == [f'busy-{n}' for n in range(4, 14)]
+    assert session_sweeper.sweep_sessions(conn, now=now)['reclaimed'] == 0
+    conn.close()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the nightly streak recomputation job
+"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+import database
+import db_pool
+import streak_job
+
+def days(*iso_dates):
+    return np.array(iso_dates, dtype='datetime64[D]').astype(np.int64)
+
+def test_compute_streaks_run_lengths_per_user():
+    user_ids = np.array([1, 1, 1, 1, 1, 2, 2, 3])
+    activity = days(
+        '2025-01-01', '2025-01-02', '2025-01-03',   # user 1: 3-day run
+        '2025-01-09', '2025-01-10',                 # user 1: current 2-day run
+        '2025-01-05', '2025-01-06',                 # user 2: lapsed
+        '2025-01-10',                               # user 3: active today
+    )
+    stats = streak_job.compute_streaks(user_ids, activity, streak_job.day_number('2025-01-10'))
+
+    assert stats['user_id'].tolist() == [1, 2, 3]
+    assert stats['streak_days'].tolist() == [2, 0, 1]
+    assert stats['longest_streak'].tolist() == [3, 2, 1]
+    assert stats['daily_goal_met'].tolist() == [True, False, True]
+    assert streak_job.iso_day(stats['streak_start'][0]) == '2025-01-09'
+
+def test_compute_streaks_goal_windows():
+    user_ids = np.ones(20, dtype=np.int64)
+    activity = np.arange(20) + streak_job.day_number('2025-03-01')
+    stats = streak_job.compute_streaks(user_ids, activity, activity[-1])
+
+    assert stats['weekly_goal_met'].tolist() == [True]
+    assert stats['monthly_goal_met'].tolist() == [True]
+    assert stats['streak_days'].tolist() == [20]
+
+def test_recompute_streaks_repairs_habit_rows(tmp_path):
+    db_path = str(tmp_path / 'ilearnhow.db')
+    database.init_database(db_path)
+    conn = db_pool.connect(db_path)
+    conn.executemany('INSERT INTO users (id, username, password_hash) VALUES (?, ?, ?)',
+                     [(1, 'a', 'x'), (2, 'b', 'x')])
+    conn.executemany('INSERT INTO habit_formation (user_id, streak_days, longest_streak) VALUES (?, 99, 99)',
+                     [(1,), (2,)])
+    conn.executemany('''
+        INSERT INTO lesson_progress (user_id, lesson_day, phase, completed, completed_at)
+        VALUES (1, ?, 1, 1, ?)
+    ''', [(day, f'2025-01-{day:02d}T08:00:00') for day in (1, 2, 3)])
+    conn.commit()
+
+    summary = streak_job.recompute_streaks(conn, '2025-01-03')
+    habits = {row['user_id']: row for row in conn.execute('SELECT * FROM habit_formation')}
+    conn.close()
+
+    assert summary['active_users'] == 1
+    assert habits[1]['streak_days'] == 3 and habits[1]['longest_streak'] == 99
+    assert habits[1]['current_streak_start'] == '2025-01-01'
+    assert habits[1]['daily_goal_met'] == 1
+    assert habits[2]['streak_days'] == 0 and habits[2]['daily_goal_met'] == 0
+
+def test_recompute_streaks_holds_the_write_lock_while_reading(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'ilearnhow.db')
+    database.init_database(db_path)
+    conn = db_pool.connect(db_path)
+    conn.execute("INSERT INTO users (id, username, password_hash) VALUES (1, 'a', 'x')")
+    conn.execute('INSERT INTO habit_formation (user_id) VALUES (1)')
+    conn.commit()
+
+    # A completion arriving between the read and the repair must wait for the job
+    compute_streaks = streak_job.compute_streaks
+    def compute_then_complete(*args):
+        other = sqlite3.connect(db_path, timeout=0)
+        try:
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                other.execute("""
+                    INSERT INTO lesson_progress (user_id, lesson_day, phase, completed, completed_at)
+                    VALUES (1, 3, 1, 1, '2025-01-03T08:00:00')
+                """)
+        finally:
+            other.close()
+        return compute_streaks(*args)
+    monkeypatch.setattr(streak_job, 'compute_streaks', compute_then_complete)
+
+    streak_job.recompute_streaks(conn, '2025-01-03')
+    assert not conn.in_transaction
+    conn.close()
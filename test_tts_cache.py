@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed TTS cache
+"""
+
+import threading
+import time
+
+import pytest
+
+from tts_cache import TTSCache, SingleFlight, cache_key, HIT_MEMORY, HIT_DISK, MISS
+
+def test_key_ignores_whitespace_but_not_voice_or_engine():
+    key = cache_key('Hello   there.\n', 'en_US-amy-medium', 'piper-1')
+    assert key == cache_key(' Hello there.', 'en_US-amy-medium', 'piper-1')
+    assert key != cache_key('Hello there.', 'en_US-ryan-medium', 'piper-1')
+    assert key != cache_key('Hello there.', 'en_US-amy-medium', 'piper-2')
+
+def test_memory_tier_falls_back_to_disk_and_disk_evicts_by_size(tmp_path):
+    cache = TTSCache(str(tmp_path), memory_bytes=800, disk_bytes=250)
+    assert cache.get('a' * 64) == (None, MISS)
+    for name in 'abc':
+        cache.set(name * 64, name.encode() * 100)
+
+    # Memory still holds all three; the disk tier only had room for two
+    assert cache.get('a' * 64) == (b'a' * 100, HIT_MEMORY)
+    stats = cache.stats()
+    assert (stats['disk_entries'], stats['disk_bytes'], stats['disk_evictions']) == (2, 200, 1)
+
+    # A worker started later adopts the files already on disk
+    fresh = TTSCache(str(tmp_path), memory_bytes=800, disk_bytes=250)
+    assert fresh.get('a' * 64) == (None, MISS)
+    assert fresh.get('b' * 64) == (b'b' * 100, HIT_DISK)
+    assert fresh.get('b' * 64) == (b'b' * 100, HIT_MEMORY)
+
+def test_workers_sharing_a_directory_hold_it_to_one_bound(tmp_path):
+    def disk_bytes():
+        return sum(f.stat().st_size for f in tmp_path.rglob('*') if f.is_file())
+
+    def tick():
+        # File times come from a coarse kernel clock; keep each step's mtime distinct
+        time.sleep(0.02)
+
+    # No memory tier, so every hit is served from the shared directory
+    first = TTSCache(str(tmp_path), memory_bytes=0, disk_bytes=250)
+    second = TTSCache(str(tmp_path), memory_bytes=0, disk_bytes=250)
+    first.set('a' * 64, b'a' * 100)
+    tick()
+    first.set('b' * 64, b'b' * 100)
+    tick()
+
+    # A read in either worker counts as use, so b is now the oldest file, not a
+    assert second.get('a' * 64) == (b'a' * 100, HIT_DISK)
+    tick()
+    second.set('c' * 64, b'c' * 100)
+    tick()
+    assert disk_bytes() <= 250
+    assert first.get('b' * 64) == (None, MISS)
+
+    # Each worker's writes count against the same directory, not a private budget
+    first.set('d' * 64, b'd' * 100)
+    assert disk_bytes() <= 250
+    assert first.get('a' * 64) == (None, MISS)
+    assert second.get('c' * 64) == (b'c' * 100, HIT_DISK)
+    assert first.stats()['disk_evictions'] + second.stats()['disk_evictions'] == 2
+
+def test_single_flight_shares_one_call_among_concurrent_callers():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def synthesize(text):
+        calls.append(text)
+        release.wait(5)
+        return text.upper()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', synthesize, 'hi')))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()['followers'] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['hi']
+    assert sorted(results) == [('HI', False)] + [('HI', True)] * 7
+    assert flight.stats() == {'in_flight': 0, 'leaders': 1, 'followers': 7}
+
+    # Nothing is remembered once the call finishes, failures included
+    with pytest.raises(ZeroDivisionError):
+        flight.do('k', lambda: 1 / 0)
+    assert flight.do('k', synthesize, 'again') == ('AGAIN', False)
+
+def test_single_flight_leader_rechecks_before_calling(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    flight = SingleFlight()
+    calls = []
+
+    def synthesize_and_store(text):
+        calls.append(text)
+        cache.set('k' * 64, text.encode())
+        return text.encode()
+
+    def recheck():
+        return cache.get('k' * 64)[0]
+
+    # Both callers missed the cache; the second only reaches the flight after the first finished
+    assert cache.get('k' * 64) == (None, MISS)
+    assert flight.do('k', synthesize_and_store, 'hi', recheck=recheck) == (b'hi', False)
+    assert flight.do('k', synthesize_and_store, 'hi', recheck=recheck) == (b'hi', True)
+    assert calls == ['hi']
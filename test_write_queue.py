@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-writer group-commit queue
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+import db_pool
+from write_queue import WriteQueue
+
+def make_db(tmp_path):
+    db_path = str(tmp_path / 'writes.db')
+    conn = db_pool.connect(db_path)
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+    conn.close()
+    return db_path
+
+def insert_item(conn, name):
+    return conn.execute('INSERT INTO items (name) VALUES (?)', (name,)).lastrowid
+
+def test_failed_operation_does_not_roll_back_its_group(tmp_path):
+    db_path = make_db(tmp_path)
+    writer = WriteQueue(db_path, batch_window=0.05)
+    futures = [writer.submit(insert_item, name) for name in ('a', 'b', 'a', 'c')]
+
+    assert writer.wait(futures[0]) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.wait(futures[2])
+    assert writer.wait(futures[3]) == 3
+    writer.close()
+
+    stats = writer.stats()
+    assert stats['operations'] == 3 and stats['failed'] == 1 and stats['batches'] == 1
+    conn = sqlite3.connect(db_path)
+    assert [row[0] for row in conn.execute('SELECT name FROM items ORDER BY id')] == ['a', 'b', 'c']
+    conn.close()
+
+def test_concurrent_callers_share_commits(tmp_path):
+    db_path = make_db(tmp_path)
+    writer = WriteQueue(db_path)
+    threads = [
+        threading.Thread(target=lambda n=n: [writer.execute(insert_item, f'{n}-{i}') for i in range(50)])
+        for n in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    stats = writer.stats()
+    assert stats['operations'] == 400 and stats['failed'] == 0
+    assert stats['batches'] < 400
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 400
+    conn.close()
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_writer_survives_connect_failure_and_restarts_after_dying(tmp_path, monkeypatch):
+    import write_queue
+
+    monkeypatch.setattr(write_queue, 'WRITER_RETRY_PAUSE', 0)
+    db_path = str(tmp_path / 'later' / 'writes.db')
+    writer = WriteQueue(db_path)
+
+    # The directory does not exist yet, so connecting fails; the caller hears it
+    with pytest.raises(sqlite3.OperationalError):
+        writer.execute(insert_item, 'a')
+    (tmp_path / 'later').mkdir()
+    make_db(tmp_path / 'later')
+    assert writer.execute(insert_item, 'a') == 1
+
+    # Something that kills the thread outright still answers its caller,
+    # and the next write brings the writer back
+    def fatal(conn):
+        raise SystemExit('writer thread killed')
+    with pytest.raises(SystemExit):
+        writer.execute(fatal)
+    writer._thread.join(5)
+    assert writer.execute(insert_item, 'b') == 2
+    writer.close()
+    assert writer.stats()['restarts'] == 1
@@ -0,0 +1,301 @@
+"""
+iLearnHow TTS Result Cache
+Content-addressed synthesis results in a byte-bounded memory LRU over a disk tier
+
+Lesson scripts are fixed, so the same sentence in the same voice is
+synthesized over and over. Results are keyed by a hash of the normalized
+text, the voice and the engine version, which means a new voice model or
+engine release never serves stale audio. The memory tier is per worker
+process; the disk tier can be shared by every worker on the host. Its
+size bound is enforced against the directory itself, with file mtimes as
+the shared recency order, so it holds for all the workers together.
+
+SingleFlight covers the gap before the first result is cached: concurrent
+misses for one key wait on a single synthesis instead of each starting one.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 1024 * 1024 * 1024
+
+# Larger results skip the memory tier so one long text cannot flush it
+MEMORY_ITEM_FRACTION = 8
+
+# Each worker re-measures the shared directory after writing 1/DISK_SCAN_FRACTION
+# of disk_bytes, after DISK_SCAN_INTERVAL seconds, or when its own writes alone
+# could have crossed the bound. Overshoot is limited to what other workers wrote
+# since the last scan. Eviction stops at the low-water mark, so the next few
+# writes do not each trigger another scan.
+DISK_SCAN_FRACTION = 16
+DISK_SCAN_INTERVAL = 10.0
+DISK_LOW_WATER = 0.9
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'ilearnhow-tts-cache')
+
+# Each server's default disk tier lives in its own subdirectory, with its own budget
+PIPER_SERVER_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'piper')
+PRODUCTION_SERVER_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'production')
+
+# Values for the X-TTS-Cache response header
+HIT_MEMORY = 'HIT-MEMORY'
+HIT_DISK = 'HIT-DISK'
+MISS = 'MISS'
+COALESCED = 'COALESCED'  # waited on an identical in-flight request
+
+
+def normalize_text(text):
+    """Unicode NFC with runs of whitespace collapsed, so trivially different inputs share audio"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def cache_key(text, voice, engine, audio_format='wav'):
+    """Hex SHA-256 over everything that changes the synthesized bytes"""
+    digest = hashlib.sha256()
+    for part in (engine, voice, audio_format, normalize_text(text)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class TTSCache:
+    """Thread-safe two-tier cache of synthesized audio (or any bytes) by content key"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, memory_bytes=DEFAULT_MEMORY_BYTES,
+                 disk_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory or None
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # key -> bytes, least recently used first
+        self._memory_used = 0
+        # The directory as of the last scan, plus what this worker has written since
+        self._disk_entries = 0
+        self._disk_used = 0
+        self._unscanned_entries = 0
+        self._unscanned_bytes = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._scan_disk()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _disk_files(self):
+        """(mtime, size, path) for every complete file, whichever worker wrote it"""
+        files = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another worker mid-scan
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _scan_disk(self):
+        """Measure the directory and delete its least recently used files while over disk_bytes"""
+        if not self._scan_lock.acquire(blocking=False):
+            return  # another thread of this worker is already scanning
+        try:
+            with self._lock:
+                # Writes from here on are either seen by this scan or counted toward the next
+                self._unscanned_entries = self._unscanned_bytes = 0
+                self._scanned_at = time.monotonic()
+            files = self._disk_files()
+            used = sum(size for _, size, _ in files)
+            evicted = 0
+            if used > self.disk_bytes:
+                for _, size, path in sorted(files):
+                    if used <= self.disk_bytes * DISK_LOW_WATER:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    used -= size
+                    evicted += 1
+            with self._lock:
+                self._disk_entries = len(files) - evicted
+                self._disk_used = used
+                self.disk_evictions += evicted
+        finally:
+            self._scan_lock.release()
+
+    def get(self, key):
+        """(value, HIT_MEMORY | HIT_DISK) for a cached key, else (None, MISS)"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value, HIT_MEMORY
+
+        if self.directory is not None:
+            # Another worker may have written it
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    value = f.read()
+            except FileNotFoundError:
+                value = None
+            if value is not None:
+                try:
+                    # The mtime is the recency every worker's eviction goes by
+                    os.utime(path)
+                except OSError:
+                    pass  # evicted since the read; the bytes are still good
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, value)
+                return value, HIT_DISK
+
+        with self._lock:
+            self.misses += 1
+        return None, MISS
+
+    def set(self, key, value):
+        """Store value in both tiers"""
+        value = bytes(value)
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename: readers in any worker see the whole file or none
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self.writes += 1
+            self._remember(key, value)
+            if self.directory is None:
+                return
+            self._unscanned_entries += 1
+            self._unscanned_bytes += len(value)
+            scan_due = (self._unscanned_bytes > self.disk_bytes // DISK_SCAN_FRACTION or
+                        self._disk_used + self._unscanned_bytes > self.disk_bytes or
+                        time.monotonic() - self._scanned_at > DISK_SCAN_INTERVAL)
+        if scan_due:
+            self._scan_disk()
+
+    def _remember(self, key, value):
+        """Put value in the memory tier; caller holds the lock"""
+        if len(value) > self.memory_bytes // MEMORY_ITEM_FRACTION:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous)
+        self._memory[key] = value
+        self._memory_used += len(value)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self.memory_evictions += 1
+
+    def clear(self):
+        """Empty both tiers; the disk tier for every worker sharing the directory"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+        if self.directory is not None:
+            for _, _, path in self._disk_files():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._scan_disk()
+
+    def stats(self):
+        """Counter snapshot"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_used,
+                'memory_max_bytes': self.memory_bytes,
+                'disk_entries': self._disk_entries + self._unscanned_entries,
+                'disk_bytes': self._disk_used + self._unscanned_bytes,
+                'disk_max_bytes': self.disk_bytes if self.directory else 0,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                'writes': self.writes,
+                'memory_evictions': self.memory_evictions,
+                'disk_evictions': self.disk_evictions
+            }
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile share its outcome"""
+
+    def __init__(self):
+        self._calls = {}  # key -> Future of the call in flight
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn, *args, timeout=None, recheck=None):
+        """(result, shared): shared is True when another caller's fn(*args) produced it
+
+        recheck() runs once this caller leads; a non-None value (say, a cache
+        entry stored by a leader that finished after this caller's own
+        lookup) is returned as shared instead of calling fn.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            # A failure is shared too, so a broken input is not retried by every waiter at once
+            return future.result(timeout=timeout), True
+
+        try:
+            # The previous leader stored its result before leaving _calls, so it is visible here
+            result = recheck() if recheck is not None else None
+            shared = result is not None
+            if not shared:
+                result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, shared
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'followers': self.followers
+            }
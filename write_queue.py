@@ -0,0 +1,202 @@
+"""
+iLearnHow Write Queue
+One writer thread per database file, committing queued writes in groups
+
+Request threads hand their writes to the queue instead of taking SQLite's
+write lock themselves. The writer drains whatever is waiting, runs each
+operation inside its own SAVEPOINT, commits the group as one transaction
+and only then resolves the callers' futures. An acknowledged write is
+committed, and a failing operation never takes its neighbours with it.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import db_pool
+
+# Most operations committed in one transaction
+WRITE_BATCH_MAX_OPS = 256
+
+# Seconds the writer lingers for more operations once the first arrives
+WRITE_BATCH_WINDOW = 0.002
+
+# Seconds a caller waits for its write to be acknowledged
+WRITE_ACK_TIMEOUT = 10.0
+
+# Seconds the writer pauses after a failed group before reconnecting
+WRITER_RETRY_PAUSE = 0.5
+
+_STOP = object()
+
+
+class WriteTimeout(Exception):
+    """Raised when a queued write is not acknowledged in time"""
+
+
+class WriteQueue:
+    """Serializes writes to one database file through a single writer thread"""
+
+    def __init__(self, db_path, max_batch=WRITE_BATCH_MAX_OPS, batch_window=WRITE_BATCH_WINDOW,
+                 ack_timeout=WRITE_ACK_TIMEOUT):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.ack_timeout = ack_timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._operations = 0
+        self._batches = 0
+        self._failed = 0
+        self._restarts = 0
+
+    def submit(self, operation, *args):
+        """Queue operation(conn, *args); the future resolves once its group commits"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f'Write queue for {self.db_path} is closed')
+            if self._thread is None or not self._thread.is_alive():
+                # Started on first use so forked workers each get their own writer,
+                # and again if it ever died, so the file is not unwritable until restart
+                if self._thread is not None:
+                    self._restarts += 1
+                    print(f"⚠️  Writer for {self.db_path} had stopped; restarting")
+                self._thread = threading.Thread(
+                    target=self._run, name=f'sqlite-writer:{os.path.basename(self.db_path)}',
+                    daemon=True
+                )
+                self._thread.start()
+            self._queue.put((operation, args, future))
+        return future
+
+    def execute(self, operation, *args):
+        """Queue a write and block until it commits; returns the operation's result"""
+        return self.wait(self.submit(operation, *args))
+
+    def wait(self, future, timeout=None):
+        """Block until a submitted write commits; returns the operation's result"""
+        timeout = self.ack_timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # A WriteTimeout must mean "never applied": a write still queued is
+            # cancelled, and one already running is moments from its outcome
+            if future.cancel():
+                raise WriteTimeout(f'Write not acknowledged after {timeout}s')
+            return future.result()
+
+    def close(self, timeout=None):
+        """Commit everything already queued, then stop the writer"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        """Writer activity snapshot"""
+        return {
+            'operations': self._operations,
+            'batches': self._batches,
+            'failed': self._failed,
+            'restarts': self._restarts,
+            'pending': self._queue.qsize()
+        }
+
+    def _run(self):
+        conn = None
+        stopping = False
+        try:
+            while not stopping:
+                batch, stopping = self._drain()
+                if not batch:
+                    continue
+                try:
+                    if conn is None:
+                        conn = db_pool.connect(self.db_path)
+                        # BEGIN, SAVEPOINT and COMMIT are issued explicitly
+                        conn.isolation_level = None
+                    self._commit(conn, batch)
+                except BaseException as e:
+                    # The group's callers hear why; later groups get a fresh connection
+                    print(f"❌ Writer for {self.db_path} failed: {e!r}")
+                    self._fail(batch, e)
+                    if conn is not None:
+                        try:
+                            conn.close()
+                        except sqlite3.Error:
+                            pass
+                        conn = None
+                    if not isinstance(e, Exception):
+                        raise
+                    time.sleep(WRITER_RETRY_PAUSE)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _fail(self, batch, error):
+        """Resolve every still-waiting future in a lost group with error"""
+        for _, _, future in batch:
+            if not future.done():
+                self._failed += 1
+                future.set_exception(error)
+
+    def _drain(self):
+        """Block for one operation, then gather whatever else arrives within the window"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, conn, batch):
+        """Run a group in one transaction, isolating each operation in a savepoint"""
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for operation, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute('SAVEPOINT queued_write')
+                try:
+                    result = operation(conn, *args)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO queued_write')
+                    conn.execute('RELEASE queued_write')
+                    self._failed += 1
+                    future.set_exception(e)
+                else:
+                    conn.execute('RELEASE queued_write')
+                    results.append((future, result))
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            # The whole group is lost; every caller still waiting hears why
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            self._fail(batch, e)
+            self._batches += 1
+            return
+
+        self._operations += len(results)
+        self._batches += 1
+        for future, result in results:
+            future.set_result(result)